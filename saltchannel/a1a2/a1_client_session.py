@@ -3,12 +3,18 @@ from . import packets
 
 
 class A1ClientSession:
-    """"""
-    def __init__(self, channel, loop=None):
+    """A1/A2 round trip over 'channel'; 'address' is the public signing key of the wanted
+    server (ADDRESS_TYPE_PUBKEY), b'' for ADDRESS_TYPE_ANY.
+    """
+    def __init__(self, channel, loop=None, address=b''):
         self.loop = loop or asyncio.get_event_loop()
 
         self.channel = channel
         self.a1 = packets.A1Packet()
+        if address:
+            self.a1.data.AddressType = packets.A1Packet.ADDRESS_TYPE_PUBKEY
+            self.a1.data.AddressSize = len(address)
+            self.a1.Address = address
         self.a2 = None
 
     async def do_a1a2(self):
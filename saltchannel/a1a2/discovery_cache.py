@@ -0,0 +1,159 @@
+"""Client-side cache of A1/A2 discovery results.
+A fresh entry lets the client go straight to M1; a stale entry is still returned at once
+while it is refreshed in the background. Concurrent lookups of the same entry share one probe.
+
+    cache = DiscoveryCache(ttl=600, path='~/.saltchannel-a2.json')
+
+    async def open_channel():
+        reader, writer = await open_saltchannel_connection(host, port, loop=loop)
+        return AsyncioChannel(reader, writer, loop=loop)
+
+    a2 = await cache.discover('{}:{}'.format(host, port), open_channel, loop=loop)
+
+discover() opens a connection for A1 only when the entry is missing or stale; lookup()
+takes any probe coroutine function instead.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+
+from .packets import A2Packet
+from .a1_client_session import A1ClientSession
+
+log = logging.getLogger(__name__)
+
+
+class DiscoveryCache:
+    """A2 results keyed by (endpoint, address) with a time to live in seconds.
+    'address' is the A1 address (public signing key), b'' for ADDRESS_TYPE_ANY.
+    With 'path', entries are loaded from and saved to that JSON file; lookup() writes it in
+    the loop's default executor, put() and invalidate() in the calling thread.
+    """
+    VERSION = 1
+
+    def __init__(self, ttl=300.0, path=None, clock=time.time):
+        self.ttl = ttl
+        self.path = os.path.expanduser(path) if path else None
+        self.clock = clock
+        self.entries = {}  # (endpoint, address) -> (serialized A2, time stored)
+        self.packets = {}  # (endpoint, address) -> A2Packet parsed from entries
+        self.refreshing = {}  # (endpoint, address) -> probe task, shared by concurrent lookups
+        self.save_lock = threading.Lock()
+        self.saves = 0  # snapshots taken
+        self.saved = 0  # newest snapshot written
+        if self.path and os.path.exists(self.path):
+            self.load()
+
+    def get(self, endpoint, address=b''):
+        """Returns (A2Packet, fresh) or (None, False) if nothing is cached.
+        The packet is parsed once and shared by all hits; do not modify it.
+        """
+        key = (endpoint, address)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None, False
+        raw, stored = entry
+        a2 = self.packets.get(key)
+        if a2 is None:
+            a2 = self.packets[key] = A2Packet(src_buf=raw)
+        return a2, self.clock() - stored < self.ttl
+
+    def put(self, endpoint, address, a2):
+        self._store(endpoint, address, a2)
+        if self.path:
+            self.save()
+
+    def _store(self, endpoint, address, a2):
+        self.entries[(endpoint, address)] = (bytes(a2), self.clock())
+        self.packets.pop((endpoint, address), None)
+
+    def invalidate(self, endpoint, address=b''):
+        self.packets.pop((endpoint, address), None)
+        if self.entries.pop((endpoint, address), None) is not None and self.path:
+            self.save()
+
+    async def lookup(self, endpoint, address, probe, loop=None):
+        """Returns A2Packet for endpoint/address.
+        probe - coroutine function doing the A1/A2 round trip and returning A2Packet.
+        Only a missing entry waits for probe(); a stale one is refreshed in the background.
+        """
+        a2, fresh = self.get(endpoint, address)
+        if a2 is None:
+            return await asyncio.shield(self._probe(endpoint, address, probe, loop))
+        if not fresh:
+            self._probe(endpoint, address, probe, loop)
+        return a2
+
+    async def discover(self, endpoint, open_channel, address=b'', loop=None):
+        """Returns A2Packet for endpoint/address like lookup(), probing with an A1/A2 round trip
+        over the ByteChannel returned by coroutine function 'open_channel' (closed afterwards).
+        """
+        async def probe():
+            channel = await open_channel()
+            try:
+                session = A1ClientSession(channel, loop=loop, address=address)
+                await session.do_a1a2()
+                return session.a2
+            finally:
+                channel.close()
+        return await self.lookup(endpoint, address, probe, loop=loop)
+
+    def _probe(self, endpoint, address, probe, loop):
+        """Returns the task probing endpoint/address, started unless one is running."""
+        task = self.refreshing.get((endpoint, address))
+        if task is None:
+            loop = loop or asyncio.get_event_loop()
+            task = loop.create_task(self.refresh(endpoint, address, probe, loop=loop))
+            self.refreshing[(endpoint, address)] = task
+            task.add_done_callback(lambda t: self._refreshed(endpoint, address, t))
+        return task
+
+    async def refresh(self, endpoint, address, probe, loop=None):
+        a2 = await probe()
+        self._store(endpoint, address, a2)
+        if self.path:
+            await self.save_async(loop=loop)
+        return a2
+
+    def _refreshed(self, endpoint, address, task):
+        self.refreshing.pop((endpoint, address), None)
+        if not task.cancelled() and task.exception() is not None:
+            log.warning('A2 refresh of {} failed: {!r}'.format(endpoint, task.exception()))
+
+    def load(self):
+        with open(self.path) as f:
+            d = json.load(f)
+        if d.get('version') != self.VERSION:
+            return
+        for e in d['entries']:
+            self.entries[(e['endpoint'], bytes.fromhex(e['address']))] = (bytes.fromhex(e['a2']), e['time'])
+
+    def save(self):
+        self._write(*self._snapshot())
+
+    async def save_async(self, loop=None):
+        """Like save(), but the file is written in the loop's default executor."""
+        loop = loop or asyncio.get_event_loop()
+        await loop.run_in_executor(None, self._write, *self._snapshot())
+
+    def _snapshot(self):
+        self.saves += 1
+        return self.saves, {
+            'version': self.VERSION,
+            'entries': [{'endpoint': endpoint, 'address': address.hex(), 'a2': raw.hex(), 'time': stored}
+                        for (endpoint, address), (raw, stored) in sorted(self.entries.items())],
+        }
+
+    def _write(self, seq, d):
+        """Atomically replaces the file with snapshot 'd', unless a newer one was written already."""
+        with self.save_lock:
+            if seq < self.saved:
+                return
+            tmp = '{}.tmp{}'.format(self.path, os.getpid())
+            with open(tmp, 'w') as f:
+                json.dump(d, f, indent=1)
+            os.replace(tmp, self.path)
+            self.saved = seq
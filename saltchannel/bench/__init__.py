@@ -0,0 +1,9 @@
+"""End-to-end benchmarks of the Salt Channel v2 protocol stack.
+Run 'python -m saltchannel.bench --help' for options.
+"""
+from .suite import BenchSuite, compare
+from .sync_stack import SyncStackBench
+from .packets import PacketBench
+from .compression import CompressionBench
+from .replay import ReplayBench
+from .transports import InProcessPair, TcpPair, UnixPair, SocketpairPair, NetemPair, TRANSPORTS
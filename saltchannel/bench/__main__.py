@@ -0,0 +1,109 @@
+import sys
+import json
+import time
+import asyncio
+import platform
+import argparse
+
+from ..saltlib.saltlib import LibType
+from .suite import BenchSuite, compare, wanted
+from .sync_stack import SyncStackBench
+from .packets import PacketBench
+from .compression import CompressionBench
+from .replay import ReplayBench
+from ..dev.trace import read_trace
+from .transports import TRANSPORTS, NetemPair
+from ..dev.netem_channel import NETEM_PROFILES
+
+LIBS = {
+    'best': LibType.LIB_TYPE_BEST,
+    'native': LibType.LIB_TYPE_NATIVE,
+    'pynacl': LibType.LIB_TYPE_PYNACL,
+    'tweetnacl': LibType.LIB_TYPE_TWEETNACL_EXT,
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m saltchannel.bench',
+                                     description='End-to-end Salt Channel v2 benchmarks.')
+    parser.add_argument('--transport', choices=sorted(TRANSPORTS) + ['all'], default='all')
+    parser.add_argument('--lib', choices=sorted(LIBS) + ['all'], default='best',
+                        help="SaltLib backend, 'all' runs every backend")
+    parser.add_argument('--only', nargs='*', metavar='BENCH',
+                        help='run only benchmarks with these name prefixes, e.g. handshake multiapp sync_stack multiapp_packet compression')
+    parser.add_argument('--netem', choices=sorted(NETEM_PROFILES),
+                        help='emulate link conditions between client and server')
+    parser.add_argument('--replay', metavar='TRACE',
+                        help='replay a trace captured with dev.trace.TraceChannel through every transport instead')
+    parser.add_argument('--replay-speed', type=float, default=1.0,
+                        help="pace of the replay against the trace, 'inf' as fast as possible (default: 1.0)")
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplier for iteration counts')
+    parser.add_argument('--output', metavar='FILE', help='write JSON results to FILE instead of stdout')
+    parser.add_argument('--baseline', metavar='FILE', help='compare against JSON results stored earlier')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='allowed relative slowdown against baseline (default: 0.1)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    transports = sorted(TRANSPORTS) if args.transport == 'all' else [args.transport]
+    libs = [LIBS[name] for name in sorted(LIBS) if name != 'best'] if args.lib == 'all' else [LIBS[args.lib]]
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    records = list(read_trace(args.replay)) if args.replay else None
+
+    results = {}
+    for transport in transports:
+        for lib_type in libs:
+            pair = TRANSPORTS[transport](loop)
+            if args.netem:
+                pair = NetemPair(pair, args.netem)
+            if records is not None:
+                suite = ReplayBench(pair, records, speed=args.replay_speed, lib_type=lib_type)
+            else:
+                suite = BenchSuite(pair, lib_type=lib_type, scale=args.scale)
+            results.update(suite.run(only=args.only))
+    loop.close()
+    if records is None:
+        for lib_type in libs:  # transport independent, no event loop
+            results.update(SyncStackBench(lib_type=lib_type, scale=args.scale).run(only=args.only))
+        results.update(PacketBench(scale=args.scale).run(only=args.only))
+        if wanted(CompressionBench.NAME, args.only):  # before training its dictionary
+            results.update(CompressionBench.synthetic().run(only=args.only))
+
+    report = {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'scale': args.scale,
+            'netem': args.netem,
+            'replay': args.replay,
+        },
+        'results': results,
+    }
+
+    out = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(out)
+    else:
+        print(out)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline['results'], tolerance=args.tolerance)
+        for name, metric, old, new in regressions:
+            print("REGRESSION {} {}: {:.1f} -> {:.1f}".format(name, metric, old, new), file=sys.stderr)
+        if regressions:
+            return 1
+        print("No regressions against {}".format(args.baseline), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
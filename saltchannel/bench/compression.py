@@ -0,0 +1,93 @@
+"""Compression ratio and speed of CompressedChannel per message size, with and without dictionary."""
+import json
+import time
+import random
+import asyncio
+
+from ..v2.compressed_channel import CompressedChannel
+from ..v2.compression_dict import train_dictionary
+from .suite import wanted
+
+
+def synthetic_readings(count, seed=1):
+    """Returns JSON sensor readings of 50..300 bytes, a stand-in for captured app traffic."""
+    rng = random.Random(seed)
+    kinds = [('temperature', 'celsius'), ('humidity', 'percent'), ('pressure', 'hPa'), ('voltage', 'V')]
+    samples = []
+    for i in range(count):
+        kind, unit = rng.choice(kinds)
+        reading = {'sensor': kind, 'unit': unit, 'id': 'node-{:04d}'.format(rng.randrange(2000)),
+                   'seq': i, 'value': round(rng.uniform(-40, 1100), 2), 'status': 'ok'}
+        if rng.random() < 0.3:
+            reading['history'] = [round(rng.uniform(0, 100), 1) for _ in range(rng.randrange(5, 25))]
+        samples.append(json.dumps(reading).encode())
+    return samples
+
+
+class CompressionBench:
+    """Results are keyed 'compression/<bucket>' where bucket is the upper message size bound;
+    'ratio' is wire bytes / message bytes without dictionary, 'dict_ratio' with 'zdict',
+    throughputs are of the dictionary case in message bytes.
+    """
+    NAME = 'compression'
+    BUCKETS = (64, 128, 256, 1024, 65536)
+
+    def __init__(self, samples, zdict, level=6, repeat=3):
+        self.samples = samples
+        self.zdict = zdict
+        self.level = level
+        self.repeat = repeat
+
+    @classmethod
+    def synthetic(cls, count=4000, dict_size=4096, **kwargs):
+        """Bench with a dictionary trained on half of synthetic readings, measured on the other half."""
+        samples = synthetic_readings(count)
+        zdict = train_dictionary(samples[:count // 2], size=dict_size)
+        return cls(samples[count // 2:], zdict, **kwargs)
+
+    def _ratio(self, channel, msgs):
+        return sum(len(channel.compress(msg)) for msg in msgs) / sum(len(msg) for msg in msgs)
+
+    def bench_bucket(self, msgs, loop):
+        plain = CompressedChannel(None, level=self.level, min_size=0, loop=loop)
+        with_dict = CompressedChannel(None, level=self.level, zdict=self.zdict, min_size=0, loop=loop)
+        nbytes = sum(len(msg) for msg in msgs)
+        packed = [with_dict.compress(msg) for msg in msgs]
+        encode = decode = float('inf')
+        for _ in range(self.repeat):  # best of
+            t0 = time.perf_counter()
+            for msg in msgs:
+                with_dict.compress(msg)
+            encode = min(encode, time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            for raw in packed:
+                with_dict.decompress(raw)
+            decode = min(decode, time.perf_counter() - t0)
+        return {'msgs': len(msgs),
+                'ratio': self._ratio(plain, msgs),
+                'dict_ratio': sum(len(raw) for raw in packed) / nbytes,
+                'encode_mbytes_per_sec': nbytes / encode / 1000000,
+                'decode_mbytes_per_sec': nbytes / decode / 1000000}
+
+    def run(self, only=None):
+        """Returns {'compression/<bucket>': {metric: value}}."""
+        if not wanted(self.NAME, only):
+            return {}
+        loop = asyncio.new_event_loop()  # only compress()/decompress() are used
+        results = {}
+        low = 0
+        for high in self.BUCKETS:
+            msgs = [s for s in self.samples if low < len(s) <= high]
+            if msgs:
+                results['{}/{}'.format(self.NAME, high)] = self.bench_bucket(msgs, loop)
+            low = high
+        loop.close()
+        return results
+
+    def print_report(self):
+        print("{:<20}{:>8}{:>10}{:>12}{:>14}{:>14}".format('size', 'msgs', 'ratio', 'dict_ratio',
+                                                           'encode MB/s', 'decode MB/s'))
+        for name, r in self.run().items():
+            print("{:<20}{:>8}{:>10.3f}{:>12.3f}{:>14.1f}{:>14.1f}".format(
+                '<= ' + name.split('/')[-1], r['msgs'], r['ratio'], r['dict_ratio'],
+                r['encode_mbytes_per_sec'], r['decode_mbytes_per_sec']))
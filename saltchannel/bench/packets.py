@@ -0,0 +1,52 @@
+"""Cost of building and parsing MultiAppPackets of growing batch sizes; no crypto, no transport."""
+import time
+
+from ..v2.packets import MultiAppPacket
+from .suite import wanted
+
+
+class PacketBench:
+    """Results are keyed 'packets/multiapp_packet/<size>x<batch>'; 'build_us' covers filling a
+    MultiAppPacket and serializing it, 'parse_us' decoding it again. The '_msg_us' metrics
+    are per message and should stay flat as the batch grows.
+    """
+    NAME = 'packets'
+    SIZE = 16
+    BATCHES = (1, 10, 100, 1000)
+
+    def __init__(self, scale=1.0):
+        self.scale = scale
+
+    def _n(self, count):
+        return max(1, int(count * self.scale))
+
+    @staticmethod
+    def build(msgs):
+        mp = MultiAppPacket()
+        mp.data.Count = len(msgs)
+        mp.create_opt_fields(msgs=msgs)
+        return bytes(mp)
+
+    def bench_multiapp(self, size, batch, total=200000, repeat=3):
+        count = max(1, self._n(total) // batch)
+        msgs = [bytes(size)] * batch
+        raw = self.build(msgs)
+        build = parse = float('inf')
+        for _ in range(repeat):  # best of
+            t0 = time.perf_counter()
+            for _ in range(count):
+                self.build(msgs)
+            build = min(build, (time.perf_counter() - t0) / count * 1000000)
+            t0 = time.perf_counter()
+            for _ in range(count):
+                MultiAppPacket(src_buf=raw)
+            parse = min(parse, (time.perf_counter() - t0) / count * 1000000)
+        return {'build_us': build, 'parse_us': parse,
+                'build_msg_us': build / batch, 'parse_msg_us': parse / batch}
+
+    def run(self, only=None):
+        """Returns {'packets/multiapp_packet/<size>x<batch>': {metric: value}}."""
+        if not wanted('multiapp_packet', only):
+            return {}
+        return {'{}/multiapp_packet/{}x{}'.format(self.NAME, self.SIZE, batch): self.bench_multiapp(self.SIZE, batch)
+                for batch in self.BATCHES}
@@ -0,0 +1,28 @@
+"""Replay of captured app traffic (see dev/trace.py) through a new session of every transport."""
+from ..dev.trace import replay
+from .suite import BenchSuite, wanted
+
+
+class ReplayBench(BenchSuite):
+    """Results are keyed '<transport>/<lib>/replay', metrics as returned by dev.trace.replay().
+    speed - pace of the trace, float('inf') as fast as possible
+    """
+    def __init__(self, pair, records, speed=1.0, **kwargs):
+        super().__init__(pair, **kwargs)
+        self.records = records
+        self.speed = speed
+
+    async def bench_replay(self):
+        client, server = await self._sessions()
+        result = await replay(self.records, client.app_channel, server.app_channel, speed=self.speed, loop=self.loop)
+        self._close(client, server)
+        return result
+
+    async def _run(self, only=None):
+        if not wanted('replay', only):
+            return {}
+        await self.pair.start()
+        try:
+            return {'replay': await self.bench_replay()}
+        finally:
+            await self.pair.stop()
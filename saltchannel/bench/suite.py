@@ -0,0 +1,226 @@
+import os
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ..saltlib import SaltLib
+from ..saltlib.saltlib import LibType
+from ..a1a2.a1_client_session import A1ClientSession
+from ..util.crypto_test_data import CryptoTestData
+from ..util.metrics import Histogram
+from ..v2.salt_client_session import SaltClientSession
+from ..v2.salt_server_session import SaltServerSession
+
+
+def wanted(name, only):
+    """Returns whether bench 'name' is selected by the name prefixes in 'only' (None: all are)."""
+    return not only or any(name.startswith(o) for o in only)
+
+
+class BenchSuite:
+    """End-to-end benchmarks of one transport with one SaltLib backend.
+    Every bench_*() coroutine returns a flat dict of metrics; names ending with
+    '_per_sec' are better when higher, names ending with '_us' when lower.
+    """
+    SIZES = (16, 128, 1024, 8192, 65536)
+    BATCHES = (1, 10, 100)
+
+    def __init__(self, pair, lib_type=LibType.LIB_TYPE_BEST, scale=1.0):
+        self.pair = pair
+        self.loop = pair.loop
+        self.lib_type = lib_type
+        self.scale = scale
+
+    def _n(self, count):
+        return max(1, int(count * self.scale))
+
+    async def _sessions(self):
+        """Returns (client, server) sessions after a completed handshake."""
+        client_ch, server_ch = await self.pair.connect()
+        client = SaltClientSession(CryptoTestData.aSig, client_ch, loop=self.loop)
+        client.enc_keypair = CryptoTestData.aEnc
+        server = SaltServerSession(CryptoTestData.bSig, server_ch, loop=self.loop)
+        server.enc_keypair = CryptoTestData.bEnc
+        await asyncio.gather(client.handshake(), server.handshake())
+        return client, server
+
+    @staticmethod
+    def _close(*sessions):
+        for s in sessions:
+            s.clear_channel.close()
+
+    @staticmethod
+    def _latency(hist, prefix=''):
+        return {prefix + 'p50_us': hist.percentile(50),
+                prefix + 'p90_us': hist.percentile(90),
+                prefix + 'p99_us': hist.percentile(99)}
+
+    async def bench_handshake(self, count=200):
+        count = self._n(count)
+        hist = Histogram()
+        t_start = time.perf_counter()
+        for _ in range(count):
+            t0 = time.perf_counter()
+            client, server = await self._sessions()
+            hist.record((time.perf_counter() - t0) * 1000000)
+            self._close(client, server)
+        elapsed = time.perf_counter() - t_start
+        result = {'handshakes_per_sec': count / elapsed}
+        result.update(self._latency(hist))
+        return result
+
+    async def bench_a1a2(self, count=1000):
+        """A1/A2 discovery exchanges, a new connection each."""
+        count = self._n(count)
+        t0 = time.perf_counter()
+        for _ in range(count):
+            client_ch, server_ch = await self.pair.connect()
+            server = SaltServerSession(CryptoTestData.bSig, server_ch, loop=self.loop)
+            server.enc_keypair = CryptoTestData.bEnc
+            await asyncio.gather(A1ClientSession(client_ch, loop=self.loop).do_a1a2(), server.handshake())
+            client_ch.close()
+            server_ch.close()
+        return {'exchanges_per_sec': count / (time.perf_counter() - t0)}
+
+    async def bench_app_throughput(self, size, count=2000):
+        """One-way stream of AppPackets, one message per write."""
+        count = self._n(count)
+        client, server = await self._sessions()
+        msg = bytes(size)
+
+        async def produce():
+            for _ in range(count):
+                await client.app_channel.write(msg)
+
+        async def consume():
+            for _ in range(count):
+                await server.app_channel.read()
+
+        t0 = time.perf_counter()
+        await asyncio.gather(produce(), consume())
+        elapsed = time.perf_counter() - t0
+        self._close(client, server)
+        return {'msgs_per_sec': count / elapsed, 'mbytes_per_sec': count * size / elapsed / 1000000}
+
+    async def bench_app_latency(self, size, count=500):
+        """Echo round trips, client -> server -> client."""
+        count = self._n(count)
+        client, server = await self._sessions()
+        msg = bytes(size)
+        hist = Histogram()
+
+        async def echo():
+            for _ in range(count):
+                await server.app_channel.write(await server.app_channel.read())
+
+        echo_task = self.loop.create_task(echo())
+        for _ in range(count):
+            t0 = time.perf_counter()
+            await client.app_channel.write(msg)
+            await client.app_channel.read()
+            hist.record((time.perf_counter() - t0) * 1000000)
+        await echo_task
+        self._close(client, server)
+        return self._latency(hist, prefix='rtt_')
+
+    async def bench_multiapp(self, size, batch, count=4000):
+        """One-way stream of 'count' messages written 'batch' at a time (MultiAppPacket if batch > 1)."""
+        count = self._n(count) // batch * batch or batch
+        client, server = await self._sessions()
+        msgs = [bytes(size)] * batch
+
+        async def produce():
+            for _ in range(count // batch):
+                await client.app_channel.write(*msgs)
+
+        async def consume():
+            for _ in range(count):
+                await server.app_channel.read()
+
+        t0 = time.perf_counter()
+        await asyncio.gather(produce(), consume())
+        elapsed = time.perf_counter() - t0
+        self._close(client, server)
+        return {'msgs_per_sec': count / elapsed}
+
+    async def bench_bulk(self, size, parallel, batch=16, count=800):
+        """One-way stream of large messages written 'batch' at a time; with 'parallel'
+        both EncryptedChannelV2 ends encrypt/decrypt in a thread pool."""
+        count = self._n(count) // batch * batch or batch
+        client, server = await self._sessions()
+        executor = None
+        if parallel:
+            executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+            client.enc_channel.executor = executor
+            server.enc_channel.executor = executor
+        msgs = [bytes(size)] * batch
+
+        async def produce():
+            for _ in range(count // batch):
+                await client.app_channel.write(*msgs)
+
+        async def consume():
+            for _ in range(count):
+                await server.app_channel.read()
+
+        t0 = time.perf_counter()
+        await asyncio.gather(produce(), consume())
+        elapsed = time.perf_counter() - t0
+        self._close(client, server)
+        if executor:
+            executor.shutdown()
+        return {'msgs_per_sec': count / elapsed, 'mbytes_per_sec': count * size / elapsed / 1000000}
+
+    async def _run(self, only=None):
+        results = {}
+        await self.pair.start()
+        try:
+            if wanted('handshake', only):
+                results['handshake'] = await self.bench_handshake()
+            if wanted('a1a2', only):
+                results['a1a2'] = await self.bench_a1a2()
+            for size in self.SIZES:
+                if wanted('app_throughput', only):
+                    results['app_throughput/{}'.format(size)] = await self.bench_app_throughput(size)
+                if wanted('app_latency', only):
+                    results['app_latency/{}'.format(size)] = await self.bench_app_latency(size)
+            if wanted('multiapp', only):
+                single = None
+                for batch in self.BATCHES:
+                    r = await self.bench_multiapp(16, batch)
+                    single = single or r['msgs_per_sec']
+                    r['gain'] = r['msgs_per_sec'] / single
+                    results['multiapp/16x{}'.format(batch)] = r
+            if wanted('bulk', only):
+                for parallel in (False, True):
+                    name = 'bulk/65536' + ('/parallel' if parallel else '')
+                    results[name] = await self.bench_bulk(65536, parallel)
+        finally:
+            await self.pair.stop()
+        return results
+
+    def run(self, only=None):
+        """Returns {'<transport>/<lib>/<bench>': {metric: value}}."""
+        saltlib = SaltLib()
+        saltlib.set_lib(self.lib_type)
+        prefix = '{}/{}/'.format(self.pair.NAME, type(saltlib.api).__name__)
+        results = self.loop.run_until_complete(self._run(only=only))
+        return {prefix + name: r for name, r in results.items()}
+
+
+def compare(current, baseline, tolerance=0.1):
+    """Returns list of (name, metric, baseline_value, current_value) regressions larger than 'tolerance'."""
+    regressions = []
+    for name, metrics in sorted(current.items()):
+        base = baseline.get(name)
+        if not base:
+            continue
+        for metric, value in sorted(metrics.items()):
+            old = base.get(metric)
+            if not old:
+                continue
+            if metric.endswith('_per_sec') and value < old * (1 - tolerance):
+                regressions.append((name, metric, old, value))
+            elif metric.endswith('_us') and value > old * (1 + tolerance):
+                regressions.append((name, metric, old, value))
+    return regressions
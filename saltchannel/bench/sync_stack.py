@@ -0,0 +1,74 @@
+"""Per-message cost of the blocking channel stack against the Syncizer (*_sync via event loop) path."""
+import asyncio
+import socket
+import time
+
+from ..channel import SocketChannel
+from ..saltlib import SaltLib
+from ..saltlib.saltlib import LibType
+from ..util.time import NullTimeChecker, NullTimeKeeper
+from ..v2.app_channel_v2 import AppChannelV2, AppChannelV2Sync
+from ..v2.encrypted_channel_v2 import EncryptedChannelV2, EncryptedChannelV2Sync, Role
+from .suite import wanted
+
+
+class SyncStackBench:
+    """SocketChannel -> EncryptedChannelV2 -> AppChannelV2 over a socket pair, both peers in one thread.
+    Results are keyed 'socketpair/<lib>/sync_stack/<size>'; 'syncizer_us' and 'sync_us' are
+    the costs of one write_sync() + read_sync() round, 'speedup' is their ratio.
+    """
+    NAME = 'socketpair'
+    SIZES = (16, 1024)
+
+    def __init__(self, lib_type=LibType.LIB_TYPE_BEST, scale=1.0):
+        self.lib_type = lib_type
+        self.scale = scale
+
+    def _n(self, count):
+        return max(1, int(count * self.scale))
+
+    @staticmethod
+    def _stacks(sync):
+        sock1, sock2 = socket.socketpair()
+        stacks = []
+        for sock, role in ((sock1, Role.CLIENT), (sock2, Role.SERVER)):
+            if sync:
+                enc = EncryptedChannelV2Sync(SocketChannel(sock), bytes(32), role)
+                stacks.append(AppChannelV2Sync(enc, NullTimeKeeper(), NullTimeChecker()))
+            else:
+                loop = asyncio.new_event_loop()
+                enc = EncryptedChannelV2(SocketChannel(sock), bytes(32), role, loop=loop)
+                stacks.append(AppChannelV2(enc, NullTimeKeeper(), NullTimeChecker(), loop=loop))
+        return stacks, (sock1, sock2)
+
+    def bench_once(self, sync, size, count):
+        (writer, reader), socks = self._stacks(sync)
+        msg = bytes(size)
+        t0 = time.perf_counter()
+        for _ in range(count):
+            writer.write_sync(msg)
+            reader.read_sync()
+        elapsed = time.perf_counter() - t0
+        for s in socks:
+            s.close()
+        if not sync:
+            writer.loop.close()
+            reader.loop.close()
+        return elapsed / count * 1000000
+
+    def bench_sync_stack(self, size, count=5000, repeat=5):
+        count = self._n(count)
+        syncizer = sync = float('inf')
+        for _ in range(repeat):  # interleaved, best of each
+            syncizer = min(syncizer, self.bench_once(False, size, count))
+            sync = min(sync, self.bench_once(True, size, count))
+        return {'syncizer_us': syncizer, 'sync_us': sync, 'speedup': syncizer / sync}
+
+    def run(self, only=None):
+        """Returns {'socketpair/<lib>/sync_stack/<size>': {metric: value}}."""
+        if not wanted('sync_stack', only):
+            return {}
+        saltlib = SaltLib()
+        saltlib.set_lib(self.lib_type)
+        prefix = '{}/{}/'.format(self.NAME, type(saltlib.api).__name__)
+        return {prefix + 'sync_stack/{}'.format(size): self.bench_sync_stack(size) for size in self.SIZES}
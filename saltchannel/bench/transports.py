@@ -0,0 +1,125 @@
+"""Client/server ByteChannel pairs used by the benchmarks."""
+import os
+import shutil
+import socket
+import asyncio
+import tempfile
+
+from ..channel import AsyncioChannel
+from ..dev.tunnel import AsyncTunnel
+from ..dev.netem_channel import NetemChannel, NETEM_PROFILES
+from ..streams import (open_saltchannel_connection, start_saltchannel_server, open_saltchannel_unix_connection,
+                       start_saltchannel_unix_server, open_saltchannel_socket)
+
+
+class InProcessPair:
+    """Both peers in one event loop, connected with an AsyncTunnel; no sockets involved."""
+    NAME = 'inproc'
+
+    def __init__(self, loop):
+        self.loop = loop
+
+    async def start(self):
+        pass
+
+    async def connect(self):
+        """Returns (client_channel, server_channel)."""
+        tunnel = AsyncTunnel(loop=self.loop)
+        return tunnel.channel1, tunnel.channel2
+
+    async def stop(self):
+        pass
+
+
+class TcpPair:
+    """Both peers in one event loop, connected over loopback TCP."""
+    NAME = 'tcp'
+
+    def __init__(self, loop, host='127.0.0.1'):
+        self.loop = loop
+        self.host = host
+        self.server = None
+        self.accepted = None
+
+    async def start(self):
+        self.accepted = asyncio.Queue()
+
+        def on_client(reader, writer):
+            self.accepted.put_nowait(AsyncioChannel(reader, writer, loop=self.loop))
+
+        self.server = await start_saltchannel_server(on_client, self.host, 0, loop=self.loop)
+
+    async def connect(self):
+        port = self.server.sockets[0].getsockname()[1]
+        reader, writer = await open_saltchannel_connection(self.host, port, loop=self.loop)
+        return AsyncioChannel(reader, writer, loop=self.loop), await self.accepted.get()
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+class UnixPair(TcpPair):
+    """Both peers in one event loop, connected over a Unix domain stream socket."""
+    NAME = 'unix'
+
+    def __init__(self, loop):
+        super().__init__(loop)
+        self.path = None
+
+    async def start(self):
+        self.accepted = asyncio.Queue()
+
+        def on_client(reader, writer):
+            self.accepted.put_nowait(AsyncioChannel(reader, writer, loop=self.loop))
+
+        self.path = os.path.join(tempfile.mkdtemp(), 'bench.sock')
+        self.server = await start_saltchannel_unix_server(on_client, self.path, loop=self.loop)
+
+    async def connect(self):
+        reader, writer = await open_saltchannel_unix_connection(self.path, loop=self.loop)
+        return AsyncioChannel(reader, writer, loop=self.loop), await self.accepted.get()
+
+    async def stop(self):
+        await super().stop()
+        shutil.rmtree(os.path.dirname(self.path))
+
+
+class SocketpairPair(InProcessPair):
+    """Both peers in one event loop, connected with socket.socketpair() as parent and child would be."""
+    NAME = 'socketpair'
+
+    async def connect(self):
+        channels = []
+        for sock in socket.socketpair():
+            reader, writer = await open_saltchannel_socket(sock, loop=self.loop)
+            channels.append(AsyncioChannel(reader, writer, loop=self.loop))
+        return tuple(channels)
+
+
+class NetemPair:
+    """Another pair with emulated link conditions (NETEM_PROFILES 'profile') in both directions;
+    the client channel is wrapped in a NetemChannel.
+    """
+    def __init__(self, pair, profile, seed=1):
+        self.pair = pair
+        self.loop = pair.loop
+        self.NAME = '{}+{}'.format(pair.NAME, profile)
+        self.profile = NETEM_PROFILES[profile]
+        self.seed = seed
+        self.connections = 0
+
+    async def start(self):
+        await self.pair.start()
+
+    async def connect(self):
+        client, server = await self.pair.connect()
+        self.connections += 1  # different, but reproducible, delays per connection
+        return NetemChannel(client, tx=self.profile, rx=self.profile, seed='{}/{}'.format(self.seed, self.connections),
+                            loop=self.loop), server
+
+    async def stop(self):
+        await self.pair.stop()
+
+
+TRANSPORTS = {cls.NAME: cls for cls in (InProcessPair, TcpPair, UnixPair, SocketpairPair)}
@@ -24,6 +24,17 @@ class ByteChannel(metaclass=ABCMeta):
     async def write(self, msg, *args, is_last=False):
         pass
 
+    async def read_available(self):
+        """Reads one message; returns list of it and any further messages readable without waiting."""
+        return [await self.read()]
+
+    def pause_reading(self):
+        """Stop taking data from the peer until resume_reading(); backpressure from the reader above."""
+        pass
+
+    def resume_reading(self):
+        pass
+
 #    @abstractmethod
     def read_sync(self):
         pass
@@ -36,8 +47,8 @@ class ByteChannel(metaclass=ABCMeta):
 class AsyncioChannel(ByteChannel, metaclass=util.Syncizer):
     def __init__(self, reader, writer, loop=None):
         """
-        reader - instance of dev/client_server_a/SaltChannelStreamReader()
-        writer - instance of dev/client_server_a/SaltChannelStreamWriter()
+        reader - instance of streams/SaltChannelStreamReader()
+        writer - instance of streams/SaltChannelStreamWriter()
         """
         super().__init__(loop=loop)
         self.reader = reader
@@ -46,9 +57,20 @@ class AsyncioChannel(ByteChannel, metaclass=util.Syncizer):
     async def read(self):
         return await self.reader.read_msg()
 
+    async def read_available(self):
+        return await self.reader.read_msgs()
+
+    def pause_reading(self):
+        self.reader.pause_reading()
+
+    def resume_reading(self):
+        self.reader.resume_reading()
+
     async def write(self, msg, *args, is_last=False):
-        for m in (msg,) + args:
-            self.writer.write_msg(m)
+        if args:
+            self.writer.write_msgs(msg, *args)  # one vectored frame, e.g. M2+M3
+        else:
+            self.writer.write_msg(msg)
         await self.writer.drain()
 
     def close(self):
@@ -1,62 +1,10 @@
-import struct
 import logging
 import asyncio
-import asyncio.events as events
-import asyncio.streams as streams
-import asyncio.coroutines as coroutines
 from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from abc import ABCMeta, abstractmethod
 
-####### place for now here - later move to separate module
-
-class SaltChannelStreamWriter(streams.StreamWriter):
-    def write_msg(self, msg):
-        self.write(b''.join([struct.pack('<i', len(msg)), bytes(msg)]))
-
-class SaltChannelStreamReader(streams.StreamReader):
-    async def read_msg(self):
-        msg_len = struct.unpack('<i', await self.readexactly(4))
-        return b'' if not msg_len else await self.readexactly(msg_len[0])
-
-
-class SaltChannelStreamReaderProtocol(streams.StreamReaderProtocol):
-    def connection_made(self, transport):
-        self._stream_reader.set_transport(transport)
-        if self._client_connected_cb is not None:
-            self._stream_writer = SaltChannelStreamWriter(transport, self,
-                                                  self._stream_reader,
-                                                  self._loop)
-            res = self._client_connected_cb(self._stream_reader,
-                                            self._stream_writer)
-            if coroutines.iscoroutine(res):
-                self._loop.create_task(res)
-
-    def data_received(self, data):
-        self._stream_reader.feed_data(data)
-
-async def open_saltchannel_connection(host=None, port=None, *, loop=None, limit=streams._DEFAULT_LIMIT, **kwds):
-    if loop is None:
-        loop = events.get_event_loop()
-    reader = SaltChannelStreamReader(limit=limit, loop=loop)
-    protocol = SaltChannelStreamReaderProtocol(reader, loop=loop)
-    transport, _ = await loop.create_connection(lambda: protocol, host, port, **kwds)
-    writer = SaltChannelStreamWriter(transport, protocol, reader, loop)
-    return reader, writer
-
-async def start_saltchannel_server(client_connected_cb, host=None, port=None, *,
-                                   loop=None, limit=streams._DEFAULT_LIMIT, **kwds):
-    if loop is None:
-        loop = events.get_event_loop()
-
-    def factory():
-        reader = SaltChannelStreamReader(limit=limit, loop=loop)
-        protocol = SaltChannelStreamReaderProtocol(reader, client_connected_cb,
-                                        loop=loop)
-        return protocol
-
-    return await loop.create_server(factory, host, port, **kwds)
-
-#######
+from ..streams import (SaltChannelStreamWriter, SaltChannelStreamReader, SaltChannelStreamReaderProtocol,
+                       open_saltchannel_connection, start_saltchannel_server)  # moved, imported from here too
 
 
 class SessionA(metaclass=ABCMeta):
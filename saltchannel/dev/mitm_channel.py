@@ -17,6 +17,7 @@ class MitmEventType(Enum):
 
 class MitmChannel(ByteChannel):
     """Man-in-the-Middle log/delay/manipulation class. Decorator pattern.
+    Delays are emulated by netem_channel.NetemChannel.
     """
     class LogRecord(namedtuple('LogRecord', ['time', 'type', 'data'])):
         __slots__ = ()
@@ -85,6 +86,11 @@ class MitmChannel(ByteChannel):
             for m in args:
                 self._log_event(MitmChannel.LogRecord(time=time.perf_counter(), type=MitmEventType.WRITE_WITH_PREVIOUS, data=m))
 
+    def pause_reading(self):
+        self.orig.pause_reading()
+
+    def resume_reading(self):
+        self.orig.resume_reading()
 
     def close(self):
         self.orig.close()
@@ -0,0 +1,232 @@
+"""Network emulation for benchmarks on one machine, like Linux netem/tbf but per ByteChannel.
+
+    profile = NETEM_PROFILES['lte']
+    channel = NetemChannel(AsyncioChannel(reader, writer, loop=loop), tx=profile, rx=profile, seed=1, loop=loop)
+
+Messages written to 'channel' reach the peer after the 'tx' link conditions, messages from the
+peer are readable after the 'rx' ones; wrapping one end of a connection in both directions
+gives the round trip time of two one-way delays. The link is a reliable stream, as TCP is:
+messages are never lost nor reordered, so jitter only delays a message (and those after it)
+beyond its turn. With a fixed 'seed' the delays are the same in every run.
+Timers of the event loop wake up with about millisecond resolution (epoll), so shorter
+delays come out longer than set.
+"""
+import asyncio
+import random
+from collections import deque, namedtuple
+
+import saltchannel.util as util
+from ..channel import ByteChannel
+
+
+class NetemProfile(namedtuple('NetemProfile', ['delay', 'jitter', 'bandwidth', 'chunk_size'])):
+    """One-way link conditions.
+    delay      - seconds
+    jitter     - seconds, every message (or chunk) is delayed by delay +- uniform(jitter)
+    bandwidth  - bytes per second, None is unlimited
+    chunk_size - the link moves data in chunks of this many bytes (radio frames, segments);
+                 a message arrives with the chunk holding its last byte, and every chunk
+                 takes its full transmission time even when not filled. None sends messages as they are.
+    """
+    __slots__ = ()
+
+    def __new__(cls, delay=0.0, jitter=0.0, bandwidth=None, chunk_size=None):
+        return super().__new__(cls, delay, jitter, bandwidth, chunk_size)
+
+
+NETEM_PROFILES = {
+    'lan': NetemProfile(delay=0.0002, jitter=0.00005, bandwidth=125000000),
+    'wan': NetemProfile(delay=0.040, jitter=0.004, bandwidth=12500000),
+    'lte': NetemProfile(delay=0.035, jitter=0.010, bandwidth=2500000, chunk_size=1460),
+    '3g': NetemProfile(delay=0.100, jitter=0.030, bandwidth=125000, chunk_size=1460),
+}
+
+
+class NetemLink:
+    """One direction of a NetemChannel. send() returns at once; deliver(items) is awaited with
+    the items which arrived at the same time, in order.
+    """
+    def __init__(self, profile, rng, deliver, loop):
+        self.profile = profile
+        self.rng = rng
+        self.deliver = deliver
+        self.loop = loop
+        self.queue = deque()  # (arrival time, item)
+        self.busy_until = 0.0  # when the link finishes transmitting what it has
+        self.last_arrival = 0.0
+        self.task = None
+        self.error = None
+
+    def _arrival(self, sent):
+        p = self.profile
+        delay = p.delay + (self.rng.uniform(-p.jitter, p.jitter) if p.jitter else 0.0)
+        self.last_arrival = max(self.last_arrival, sent + max(0.0, delay))
+        return self.last_arrival
+
+    def send(self, items, sizes):
+        """Queues 'items' of 'sizes' bytes (0 for items which take no transmission time)."""
+        p = self.profile
+        start = max(self.loop.time(), self.busy_until)
+        if p.chunk_size:
+            offset = 0
+            chunk_end = None
+            chunks_sent = 0
+            for item, size in zip(items, sizes):
+                offset += size
+                chunks = -(-offset // p.chunk_size)
+                if chunks != chunks_sent or chunk_end is None:
+                    chunks_sent = chunks
+                    sent = start + (chunks * p.chunk_size / p.bandwidth if p.bandwidth else 0.0)
+                    chunk_end = self._arrival(sent)
+                self.queue.append((chunk_end, item))
+            start = start + (chunks_sent * p.chunk_size / p.bandwidth if p.bandwidth else 0.0)
+        else:
+            for item, size in zip(items, sizes):
+                if p.bandwidth:
+                    start += size / p.bandwidth
+                self.queue.append((self._arrival(start), item))
+        self.busy_until = start
+        if self.task is None or self.task.done():
+            self.task = self.loop.create_task(self._run())
+
+    async def _run(self):
+        try:
+            while self.queue:
+                wait = self.queue[0][0] - self.loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                now = self.loop.time()
+                due = []
+                while self.queue and self.queue[0][0] <= now:
+                    due.append(self.queue.popleft()[1])
+                await self.deliver(due)
+        except Exception as e:
+            self.queue.clear()
+            self.error = e
+
+    @property
+    def pending(self):
+        return len(self.queue)
+
+    async def drain(self):
+        while self.task is not None and not self.task.done():
+            await asyncio.wait([self.task])
+
+    def cancel(self):
+        if self.task is not None:
+            self.task.cancel()
+        self.queue.clear()
+
+
+class NetemChannel(ByteChannel, metaclass=util.Syncizer):
+    """Decorates ByteChannel 'orig' with emulated link conditions: NetemProfile 'tx' for written,
+    'rx' for read messages (None passes them through). write() does not wait for the link,
+    as it would not for a socket buffer; drain() waits until everything written reached 'orig'.
+    The link queues are unbounded: a writer faster than 'tx' bandwidth grows the queue (see
+    NetemLink.pending) without backpressure, so benchmarks which write in bulk should drain().
+    Messages due at the same time reach 'orig' with one write(), with is_last passed on
+    for the last message of a write().
+    """
+    _CLOSE = object()
+
+    def __init__(self, orig, tx=None, rx=None, seed=0, loop=None):
+        super().__init__(loop=loop)
+        self.orig = orig
+        rng = random.Random(seed)
+        self.tx = NetemLink(tx, rng, self._deliver_tx, self.loop) if tx else None
+        self.rx = NetemLink(rx, rng, self._deliver_rx, self.loop) if rx else None
+        self.received = deque()  # messages or the exception from orig
+        self.received_event = asyncio.Event()
+        self.reader_task = None
+        self.closed = False
+
+    async def _deliver_tx(self, items):
+        msgs = []
+        for item in items:
+            if item is self._CLOSE:
+                break
+            msg, is_last = item
+            msgs.append(msg)
+            if is_last:
+                await self.orig.write(*msgs, is_last=True)
+                msgs = []
+        if msgs:
+            await self.orig.write(*msgs)
+        if items and items[-1] is self._CLOSE:
+            self.orig.close()
+
+    async def _deliver_rx(self, items):
+        self.received.extend(items)
+        self.received_event.set()
+
+    async def _read_orig(self):
+        while True:
+            try:
+                msgs = await self.orig.read_available()
+            except Exception as e:
+                self.rx.send([e], [0])
+                return
+            self.rx.send(msgs, [len(m) for m in msgs])
+
+    async def _next(self):
+        while not self.received:
+            if self.reader_task is None:
+                self.reader_task = self.loop.create_task(self._read_orig())
+            self.received_event.clear()
+            await self.received_event.wait()
+        item = self.received.popleft()
+        if isinstance(item, Exception):
+            self.received.appendleft(item)  # every further read fails too
+            raise item
+        return item
+
+    async def read(self):
+        if self.rx is None:
+            return await self.orig.read()
+        return await self._next()
+
+    async def read_available(self):
+        if self.rx is None:
+            return await self.orig.read_available()
+        msgs = [await self._next()]
+        while self.received and not isinstance(self.received[0], Exception):
+            msgs.append(self.received.popleft())
+        return msgs
+
+    async def write(self, msg, *args, is_last=False):
+        if self.tx is None:
+            return await self.orig.write(msg, *args, is_last=is_last)
+        if self.tx.error is not None:
+            raise self.tx.error
+        if self.closed:
+            raise ConnectionResetError("channel closed")
+        msgs = (msg,) + args
+        last = len(msgs) - 1
+        self.tx.send([(m, is_last and i == last) for i, m in enumerate(msgs)], [len(m) for m in msgs])
+
+    async def drain(self):
+        """Waits until all written messages were written to 'orig'."""
+        if self.tx is not None:
+            await self.tx.drain()
+            if self.tx.error is not None:
+                raise self.tx.error
+
+    def pause_reading(self):
+        self.orig.pause_reading()
+
+    def resume_reading(self):
+        self.orig.resume_reading()
+
+    def close(self):
+        """Closes 'orig' once the messages written so far have been delivered."""
+        if self.closed:
+            return
+        self.closed = True
+        if self.reader_task is not None:
+            self.reader_task.cancel()
+        if self.rx is not None:
+            self.rx.cancel()
+        if self.tx is not None and (self.tx.pending or (self.tx.task and not self.tx.task.done())):
+            self.tx.send([self._CLOSE], [0])
+        else:
+            self.orig.close()
@@ -0,0 +1,238 @@
+"""Binary traffic traces: capture with TraceChannel, replay with replay().
+
+    writer = TraceWriter('app.sctr', loop=loop)
+    channel = TraceChannel(session.app_channel, writer, loop=loop)
+    ...
+    await writer.close()
+
+    records = list(read_trace('app.sctr'))
+    stats = await replay(records, client.app_channel, server.app_channel, speed=10, loop=loop)
+
+A trace file is a header (magic, version, wall clock start time) followed by records of
+nanoseconds since start, MitmEventType value and message length, each followed by the message.
+WRITE_WITH_PREVIOUS marks messages written together with the record before, so batches
+(MultiAppPacket) are replayed as batches. Decorate the AppChannelV2 level to replay
+through a new session; traces of the clear channel hold encrypted frames, which only
+serve for inspection.
+"""
+import time
+import struct
+import asyncio
+from collections import deque, namedtuple
+
+import saltchannel.util as util
+from ..channel import ByteChannel
+from ..util.metrics import Histogram
+from .mitm_channel import MitmEventType
+
+MAGIC = b'SCTR'
+VERSION = 1
+FILE_HEADER = struct.Struct('<4sBxxxd')  # magic, version, time.time() of start
+RECORD_HEADER = struct.Struct('<QBI')  # nanoseconds since start, MitmEventType, length
+
+
+class TraceRecord(namedtuple('TraceRecord', ['time', 'type', 'data'])):
+    """time in seconds since start of the trace, type MitmEventType."""
+    __slots__ = ()
+
+
+class TraceWriter:
+    """Collects records in memory and writes them to 'f' (path or binary file) in a background
+    task, once 'flush_size' bytes are pending or 'flush_interval' seconds after the first of them.
+    The file is written in 'executor' (None is the loop's default), off the event loop.
+    """
+    FLUSH_SIZE = 1 << 16
+    FLUSH_INTERVAL = 1.0
+
+    def __init__(self, f, loop=None, flush_size=FLUSH_SIZE, flush_interval=FLUSH_INTERVAL, executor=None):
+        self.loop = util.force_event_loop(loop=loop)
+        self.file = open(f, 'wb') if isinstance(f, str) else f
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.executor = executor
+        self.t0 = time.perf_counter_ns()
+        self.records = []
+        self.pending_bytes = 0
+        self.timer = None
+        self.task = None
+        self.error = None
+        self.written_records = 0
+        self.written_bytes = FILE_HEADER.size
+        self.file.write(FILE_HEADER.pack(MAGIC, VERSION, time.time()))
+
+    def record(self, event_type, data):
+        """Adds a record of 'data' (copied) now; called on the hot path."""
+        self.records.append((time.perf_counter_ns() - self.t0, event_type.value, bytes(data)))
+        self.pending_bytes += RECORD_HEADER.size + len(data)
+        if self.pending_bytes >= self.flush_size:
+            self._start_flush()
+        elif self.timer is None:
+            self.timer = self.loop.call_later(self.flush_interval, self._start_flush)
+
+    def _start_flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.task is None or self.task.done():
+            self.task = self.loop.create_task(self._flush())
+
+    async def _flush(self):
+        while self.records:
+            records, self.records, self.pending_bytes = self.records, [], 0
+            try:
+                await self.loop.run_in_executor(self.executor, self._write, records)
+            except Exception as e:
+                self.error = e
+                return
+
+    def _write(self, records):
+        out = bytearray()
+        for t, event_type, data in records:
+            out += RECORD_HEADER.pack(t, event_type, len(data))
+            out += data
+        self.file.write(out)
+        self.written_records += len(records)
+        self.written_bytes += len(out)
+
+    async def flush(self):
+        """Writes all records collected so far."""
+        self._start_flush()
+        await self.task
+        if self.error is not None:
+            raise self.error
+        await self.loop.run_in_executor(self.executor, self.file.flush)
+
+    async def close(self):
+        await self.flush()
+        self.file.close()
+
+
+def read_trace(f):
+    """Yields TraceRecords of trace file 'f' (path or binary file)."""
+    if isinstance(f, str):
+        with open(f, 'rb') as file:
+            yield from read_trace(file)
+        return
+    header = f.read(FILE_HEADER.size)
+    if len(header) != FILE_HEADER.size:
+        raise ValueError("not a trace file")
+    magic, version, _ = FILE_HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a trace file or unsupported version")
+    while True:
+        header = f.read(RECORD_HEADER.size)
+        if not header:
+            return
+        if len(header) != RECORD_HEADER.size:
+            raise ValueError("truncated trace record")
+        t, event_type, size = RECORD_HEADER.unpack(header)
+        data = f.read(size)
+        if len(data) != size:
+            raise ValueError("truncated trace record")
+        yield TraceRecord(t / 1e9, MitmEventType(event_type), data)
+
+
+class TraceChannel(ByteChannel, metaclass=util.Syncizer):
+    """Records messages read from and written to 'orig' with TraceWriter 'writer'. Decorator pattern."""
+
+    def __init__(self, orig, writer, loop=None):
+        super().__init__(loop=loop)
+        self.orig = orig
+        self.writer = writer
+
+    @property
+    def last(self):
+        return self.orig.last
+
+    async def read(self):
+        msg = await self.orig.read()
+        self.writer.record(MitmEventType.READ, msg)
+        return msg
+
+    async def read_available(self):
+        msgs = await self.orig.read_available()
+        for msg in msgs:
+            self.writer.record(MitmEventType.READ, msg)
+        return msgs
+
+    async def write(self, msg, *args, is_last=False):
+        await self.orig.write(msg, *args, is_last=is_last)
+        self.writer.record(MitmEventType.WRITE, msg)
+        for m in args:
+            self.writer.record(MitmEventType.WRITE_WITH_PREVIOUS, m)
+
+    def pause_reading(self):
+        self.orig.pause_reading()
+
+    def resume_reading(self):
+        self.orig.resume_reading()
+
+    def close(self):
+        self.orig.close()
+
+
+def _batches(records):
+    """Yields (time, is_write, [msgs]) of records, WRITE_WITH_PREVIOUS joined to the batch before."""
+    batch = None
+    for r in records:
+        if r.type == MitmEventType.WRITE_WITH_PREVIOUS and batch is not None and batch[1]:
+            batch[2].append(r.data)
+            continue
+        if batch is not None:
+            yield batch
+        if r.type in (MitmEventType.WRITE, MitmEventType.WRITE_WITH_PREVIOUS):
+            batch = (r.time, True, [r.data])
+        elif r.type == MitmEventType.READ:
+            batch = (r.time, False, [r.data])
+        else:
+            batch = None
+    if batch is not None:
+        yield batch
+
+
+async def replay(records, local, remote, speed=1.0, loop=None):
+    """Plays TraceRecords captured at one end of a session: WRITE records are written to 'local',
+    READ records (what the peer had sent) to 'remote'; both are read back on the other side.
+    'speed' scales the pace of the trace, float('inf') writes as fast as possible.
+    Returns metrics: messages per second, delivery latency and how late the writes were
+    against the schedule of the trace.
+    """
+    if not speed > 0:
+        raise ValueError("speed must be positive, got {}".format(speed))
+    loop = util.force_event_loop(loop=loop)
+    batches = list(_batches(records))
+    sent = {True: deque(), False: deque()}  # per direction, time every message was written
+    counts = {True: 0, False: 0}
+    for _, is_write, msgs in batches:
+        counts[is_write] += len(msgs)
+    latency = Histogram()
+    lag = Histogram()
+
+    async def receive(channel, is_write):
+        for _ in range(counts[is_write]):
+            await channel.read()
+            latency.record((loop.time() - sent[is_write].popleft()) * 1000000)
+
+    async def play():
+        start = loop.time()
+        t_first = batches[0][0] if batches else 0.0
+        for t, is_write, msgs in batches:
+            due = start + (t - t_first) / speed
+            wait = due - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            now = loop.time()
+            lag.record(max(0.0, now - due) * 1000000)
+            sent[is_write].extend([now] * len(msgs))
+            await (local if is_write else remote).write(*msgs)
+
+    t0 = loop.time()
+    await asyncio.gather(play(), receive(remote, True), receive(local, False))
+    elapsed = loop.time() - t0
+    count = counts[True] + counts[False]
+    return {'msgs': count,
+            'bytes': sum(len(m) for _, _, msgs in batches for m in msgs),
+            'msgs_per_sec': count / elapsed if elapsed else 0.0,
+            'latency_p50_us': latency.percentile(50),
+            'latency_p99_us': latency.percentile(99),
+            'lag_p99_us': lag.percentile(99)}
@@ -1,5 +1,8 @@
+import asyncio
 from collections import deque
 from multiprocessing import Pipe
+
+import saltchannel.util as util
 from saltchannel.channel import ByteChannel
 
 
@@ -18,7 +21,7 @@ class Tunnel:
                 return in_queue.popleft()
 
             def write(self, msg, *args, is_last=False):
-                for m in msg + args:
+                for m in (msg,) + args:
                     out_queue.append(m)
         return _Channel()
 
@@ -36,6 +39,88 @@ class TunnelMP:
                 return endpoint.recv_bytes()
 
             def write(self, msg, *args, is_last=False):
-                for m in msg + args:
+                for m in (msg,) + args:
                     endpoint.send_bytes(m)
-        return _Channel()
\ No newline at end of file
+        return _Channel()
+
+
+class AsyncTunnelChannel(ByteChannel, metaclass=util.Syncizer):
+    """One end of an AsyncTunnel."""
+    _EOF = object()
+
+    def __init__(self, in_queue, out_queue, loop=None):
+        super().__init__(loop=loop)
+        self.in_queue = in_queue
+        self.out_queue = out_queue
+        self.peer = None
+        self.closed = False
+        self.puts = set()  # writes waiting for room in a full 'out_queue'
+
+    async def read(self):
+        if self.in_queue.empty() and self.peer.closed:
+            raise asyncio.IncompleteReadError(b'', None)
+        msg = await self.in_queue.get()
+        if msg is self._EOF:
+            raise asyncio.IncompleteReadError(b'', None)
+        return msg
+
+    async def read_available(self):
+        msgs = [await self.read()]
+        while not self.in_queue.empty():
+            msg = self.in_queue.get_nowait()
+            if msg is self._EOF:
+                break
+            msgs.append(msg)
+        return msgs
+
+    async def write(self, msg, *args, is_last=False):
+        if self.closed or self.peer.closed:
+            raise ConnectionResetError("tunnel closed")
+        if self.out_queue.maxsize:
+            for m in (msg,) + args:
+                if self.out_queue.full():
+                    await self._put(m)
+                else:
+                    self.out_queue.put_nowait(m)
+        else:
+            self.out_queue.put_nowait(msg)
+            for m in args:
+                self.out_queue.put_nowait(m)
+
+    async def _put(self, msg):
+        put = self.loop.create_task(self.out_queue.put(msg))
+        self.puts.add(put)
+        try:
+            await put
+        except asyncio.CancelledError:
+            if put.cancelled() and (self.closed or self.peer.closed):  # cancelled by close()
+                raise ConnectionResetError("tunnel closed") from None
+            raise
+        finally:
+            self.puts.discard(put)
+
+    def close(self):
+        """The peer reads what was written so far, then gets IncompleteReadError like on a closed socket.
+        Writes waiting for room on either end fail with ConnectionResetError.
+        """
+        if not self.closed:
+            self.closed = True
+            for put in self.puts | self.peer.puts:
+                put.cancel()
+            if not self.out_queue.full():  # otherwise the peer sees 'closed' once it drained the queue
+                self.out_queue.put_nowait(self._EOF)
+
+
+class AsyncTunnel:
+    """Two connected ByteChannels for one event loop, e.g. a SaltClientSession and a SaltServerSession
+    running against each other without sockets. Written buffers are handed to the peer as they are,
+    without a copy; do not modify them afterwards.
+    maxsize - capacity in messages of each direction, 0 is unbounded; write() waits while it is full.
+    """
+    def __init__(self, maxsize=0, loop=None):
+        self._q1 = asyncio.Queue(maxsize)
+        self._q2 = asyncio.Queue(maxsize)
+        self.channel1 = AsyncTunnelChannel(self._q1, self._q2, loop=loop)
+        self.channel2 = AsyncTunnelChannel(self._q2, self._q1, loop=loop)
+        self.channel1.peer = self.channel2
+        self.channel2.peer = self.channel1
@@ -0,0 +1,235 @@
+"""Load generator: many concurrent Salt Channel v2 clients spread over several processes.
+Each process runs its share of the clients as asyncio tasks in a single event loop.
+
+    python -m saltchannel.loadgen --serve --port 8888                  # echo server to test against
+    python -m saltchannel.loadgen --serve --port 8888 --workers 4      # same, pre-forked (SO_REUSEPORT)
+    python -m saltchannel.loadgen --port 8888 --clients 2000 --processes 4 --rate 500 --duration 10
+
+Note: thousands of clients need a matching open files limit (ulimit -n).
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from .channel import AsyncioChannel
+from .exceptions import ComException
+from .saltlib import SaltLib
+from .util.crypto_test_data import CryptoTestData
+from .util.metrics import MetricsRegistry, Histogram
+from .v2.salt_client_session import SaltClientSession
+from .v2.salt_server_session import SaltServerSession
+from .prefork import PreforkServer
+from .streams import open_saltchannel_connection, start_saltchannel_server
+
+
+class LoadClient:
+    """Runs sessions of one simulated client; everything is recorded into a shared MetricsRegistry.
+    Any exception ends the session and is counted as a failure, so a run always has its metrics.
+    """
+
+    def __init__(self, cfg, sig_keypair, metrics, loop):
+        self.cfg = cfg
+        self.sig_keypair = sig_keypair
+        self.metrics = metrics
+        self.loop = loop
+        self.saltlib = SaltLib()
+        self.msg = os.urandom(cfg.msg_size)
+
+    async def run(self, deadline):
+        while True:
+            await self.run_session()
+            if self.loop.time() >= deadline:
+                return
+
+    async def run_session(self):
+        cfg = self.cfg
+        channel = None
+        in_handshake = True
+        t0 = time.perf_counter()
+        try:
+            reader, writer = await asyncio.wait_for(
+                open_saltchannel_connection(cfg.host, cfg.port, loop=self.loop), cfg.timeout)
+            channel = AsyncioChannel(reader, writer, loop=self.loop)
+            session = SaltClientSession(self.sig_keypair, channel, loop=self.loop)
+            session.enc_keypair = self.saltlib.create_enc_keys()
+            session.metrics = self.metrics
+            await asyncio.wait_for(session.handshake(), cfg.timeout)
+            in_handshake = False
+            self.metrics.record('connect+handshake', time.perf_counter() - t0)
+            await self.send_messages(session.app_channel)
+        except Exception as e:
+            if not (in_handshake and isinstance(e, ComException)):  # those are counted by the session
+                self.metrics.count_failure(e)
+        finally:
+            if channel:
+                channel.close()
+
+    async def send_messages(self, app_channel):
+        cfg = self.cfg
+        interval = 1.0 / cfg.msg_rate if cfg.msg_rate else 0
+        end = self.loop.time() + cfg.duration
+        next_time = self.loop.time()
+        while self.loop.time() < end:
+            t0 = time.perf_counter()
+            await app_channel.write(self.msg)
+            if cfg.echo:
+                await asyncio.wait_for(app_channel.read(), self.cfg.timeout)
+            self.metrics.record('message', time.perf_counter() - t0)
+            if interval:
+                next_time += interval
+                await asyncio.sleep(max(0, next_time - self.loop.time()))
+
+
+def run_process(cfg, index):
+    """Runs the clients of process 'index'; returns a MetricsRegistry snapshot."""
+    clients = cfg.clients // cfg.processes + (1 if index < cfg.clients % cfg.processes else 0)
+    rate = cfg.rate / cfg.processes if cfg.rate else 0
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    metrics = MetricsRegistry()
+    sig_keypair = SaltLib().create_sig_keys()
+
+    async def main():
+        deadline = loop.time() + cfg.time
+        tasks = []
+        for _ in range(clients):
+            tasks.append(loop.create_task(LoadClient(cfg, sig_keypair, metrics, loop).run(deadline)))
+            if rate:
+                await asyncio.sleep(1.0 / rate)
+        await asyncio.gather(*tasks)
+
+    loop.run_until_complete(main())
+    loop.close()
+    return metrics.snapshot()
+
+
+def run_load(cfg):
+    t0 = time.perf_counter()
+    metrics = MetricsRegistry()
+    with ProcessPoolExecutor(max_workers=cfg.processes) as executor:
+        for snapshot in executor.map(run_process, [cfg] * cfg.processes, range(cfg.processes)):
+            metrics.merge_snapshot(snapshot)
+    return metrics, time.perf_counter() - t0
+
+
+def report(cfg, metrics, elapsed):
+    handshakes = metrics.stages.get('connect+handshake', Histogram()).count
+    messages = metrics.stages.get('message', Histogram()).count
+    failures = sum(metrics.failures.values())
+    result = {
+        'clients': cfg.clients,
+        'processes': cfg.processes,
+        'elapsed_sec': elapsed,
+        'handshakes': handshakes,
+        'handshakes_per_sec': handshakes / elapsed,
+        'messages': messages,
+        'messages_per_sec': messages / elapsed,
+        'errors': dict(metrics.failures),
+        'error_rate': failures / (handshakes + failures) if handshakes + failures else 0.0,
+        'metrics': metrics.snapshot(),
+    }
+    return result
+
+
+def print_report(result):
+    print("clients: {clients}, processes: {processes}, elapsed: {elapsed_sec:.2f} s".format(**result))
+    print("handshakes: {handshakes} ({handshakes_per_sec:.1f}/s), messages: {messages} ({messages_per_sec:.1f}/s)"
+          .format(**result))
+    print("errors: {} (rate {:.4f})".format(result['errors'] or 0, result['error_rate']))
+    print("{:<20}{:>10}{:>10}{:>10}{:>10}{:>10}  [{}]".format('stage', 'count', 'p50', 'p90', 'p99', 'max',
+                                                             result['metrics']['unit']))
+    for name, h in sorted(result['metrics']['stages'].items()):
+        print("{:<20}{:>10}{:>10}{:>10}{:>10}{:>10}".format(name, h['count'], h['p50'], h['p90'], h['p99'], h['max']))
+
+
+async def echo(session):
+    """Every app message is written back."""
+    while True:
+        await session.app_channel.write(await session.app_channel.read())
+
+
+async def serve(cfg, loop):
+    """Echo server in this process."""
+    async def handle(reader, writer):
+        channel = AsyncioChannel(reader, writer, loop=loop)
+        session = SaltServerSession(CryptoTestData.bSig, channel, loop=loop)
+        session.enc_keypair = SaltLib().create_enc_keys()
+        try:
+            await session.handshake()
+            await echo(session)
+        except (ComException, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            channel.close()
+
+    server = await start_saltchannel_server(handle, cfg.host, cfg.port, loop=loop, backlog=cfg.backlog)
+    logging.info('Serving on {}'.format(server.sockets[0].getsockname()))
+    return server
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m saltchannel.loadgen', description=__doc__.split('\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8888)
+    parser.add_argument('--clients', type=int, default=100, help='number of concurrent clients')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--rate', type=float, default=0, help='new connections per second, 0 = no limit')
+    parser.add_argument('--msg-size', type=int, default=64, help='app message size, bytes')
+    parser.add_argument('--msg-rate', type=float, default=10, help='messages per second per client, 0 = no limit')
+    parser.add_argument('--duration', type=float, default=5, help='session duration after handshake, seconds')
+    parser.add_argument('--time', type=float, default=0,
+                        help='keep reconnecting clients until TIME seconds passed, 0 = one session per client')
+    parser.add_argument('--no-echo', dest='echo', action='store_false',
+                        help='do not wait for echoed replies (server does not echo)')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--json', metavar='FILE', help='also write results as JSON to FILE')
+    parser.add_argument('--serve', action='store_true', help='run an echo server instead of clients')
+    parser.add_argument('--backlog', type=int, default=1024)
+    parser.add_argument('--workers', type=int, default=0,
+                        help='with --serve: number of pre-forked server processes, 0 = serve in this process')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    cfg = parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if cfg.serve and cfg.workers:
+        server = PreforkServer(echo, CryptoTestData.bSig, cfg.host, cfg.port, workers=cfg.workers,
+                               backlog=cfg.backlog)
+        server.start()
+        logging.info('Serving on {}:{} with {} workers'.format(cfg.host, server.port, cfg.workers))
+        server.serve_forever()
+        print(json.dumps(server.metrics().snapshot(), indent=2, sort_keys=True))
+        return 0
+
+    if cfg.serve:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        server = loop.run_until_complete(serve(cfg, loop))
+        try:
+            loop.run_forever()
+        except KeyboardInterrupt:
+            pass
+        server.close()
+        loop.run_until_complete(server.wait_closed())
+        loop.close()
+        return 0
+
+    metrics, elapsed = run_load(cfg)
+    result = report(cfg, metrics, elapsed)
+    print_report(result)
+    if cfg.json:
+        with open(cfg.json, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+    return 1 if result['error_rate'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
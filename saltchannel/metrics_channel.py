@@ -0,0 +1,187 @@
+"""Low-overhead counting ByteChannel decorator for production use.
+Unlike dev/mitm_channel.py nothing is logged; only plain integer counters are updated
+and optionally one of every N operations is timed.
+"""
+import time
+
+from .channel import ByteChannel
+from .exceptions import BadPeer
+from .util.metrics import Histogram
+
+
+class ChannelStats:
+    """Counters of a single channel.
+    Updated only from the event loop which owns the channel, so no locking is needed.
+    When the decorated channel is an EncryptedChannelV2, read/written messages are
+    decryptions/encryptions and BadPeer errors on read are MAC failures.
+    To keep the single-message write path short, only messages beyond the first one
+    of a batch are counted separately (batched_msgs); see write_msgs.
+    """
+    COUNTERS = ('read_msgs', 'read_bytes', 'write_batches', 'write_bytes',
+                'batched_msgs', 'max_batch', 'mac_failures')
+
+    __slots__ = COUNTERS + ('read_latency', 'write_latency')
+
+    def __init__(self, precision=5):
+        for name in self.COUNTERS:
+            setattr(self, name, 0)
+        self.read_latency = Histogram(precision=precision)  # microseconds, sampled
+        self.write_latency = Histogram(precision=precision)  # microseconds, sampled
+
+    @property
+    def write_msgs(self):
+        return self.write_batches + self.batched_msgs
+
+    def merge(self, other):
+        for name in self.COUNTERS:
+            if name == 'max_batch':
+                self.max_batch = max(self.max_batch, other.max_batch)
+            else:
+                setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.read_latency.merge(other.read_latency)
+        self.write_latency.merge(other.write_latency)
+        return self
+
+    def snapshot(self):
+        snapshot = {name: getattr(self, name) for name in self.COUNTERS}
+        snapshot['write_msgs'] = self.write_msgs
+        snapshot['max_batch'] = max(self.max_batch, 1) if self.write_batches else 0
+        snapshot['mean_batch'] = self.write_msgs / self.write_batches if self.write_batches else 0.0
+        snapshot['read_latency'] = self.read_latency.snapshot()
+        snapshot['write_latency'] = self.write_latency.snapshot()
+        return snapshot
+
+
+class StatsAggregator:
+    """Aggregates ChannelStats of all sessions of a server.
+    Live sessions are summed on snapshot(); release() folds a finished session into the totals.
+    """
+    def __init__(self, precision=5):
+        self.precision = precision
+        self.live = set()
+        self.totals = ChannelStats(precision=precision)
+        self.sessions = 0
+
+    def new_stats(self):
+        stats = ChannelStats(precision=self.precision)
+        self.live.add(stats)
+        self.sessions += 1
+        return stats
+
+    def release(self, stats):
+        if stats in self.live:
+            self.live.remove(stats)
+            self.totals.merge(stats)
+
+    def snapshot(self):
+        stats = ChannelStats(precision=self.precision).merge(self.totals)
+        for s in self.live:
+            stats.merge(s)
+        snapshot = stats.snapshot()
+        snapshot['sessions'] = self.sessions
+        snapshot['live_sessions'] = len(self.live)
+        return snapshot
+
+
+class MetricsChannel(ByteChannel):
+    """Counting decorator for any ByteChannel.
+    sample_every=N times one of every N reads/writes, 0 disables latency sampling.
+    """
+    def __init__(self, orig, stats=None, sample_every=0, loop=None):
+        super().__init__(loop=loop)
+        self.orig = orig
+        self.stats = stats if stats is not None else ChannelStats()
+        self.sample_every = sample_every
+        self._ops = 0
+
+    @property
+    def last_flag(self):
+        return self.orig.last_flag
+
+    @property
+    def read_ahead(self):
+        """(messages, bytes) read ahead by the decorated channel, see AppChannelV2 watermarks."""
+        return getattr(self.orig, 'read_ahead', (0, 0))
+
+    def _sample(self):
+        self._ops += 1
+        if self._ops < self.sample_every:
+            return False
+        self._ops = 0
+        return True
+
+    async def read(self):
+        stats = self.stats
+        t0 = time.perf_counter() if self.sample_every and self._sample() else 0
+        try:
+            data = await self.orig.read()
+        except BadPeer:
+            stats.mac_failures += 1
+            raise
+        if t0:
+            stats.read_latency.record((time.perf_counter() - t0) * 1000000)
+        stats.read_msgs += 1
+        stats.read_bytes += len(data)
+        return data
+
+    def write(self, msg, *args, is_last=False):
+        """Returns the decorated channel's write() awaitable; a plain function saves
+        one coroutine frame per write. Messages are counted when the write is issued.
+        """
+        stats = self.stats
+        stats.write_batches += 1
+        if args:
+            self._count_batch(msg, args)
+        else:
+            stats.write_bytes += len(msg)
+        if self.sample_every and self._sample():
+            return self._timed_write(msg, args, is_last)
+        return self.orig.write(msg, *args, is_last=is_last)
+
+    async def _timed_write(self, msg, args, is_last):
+        t0 = time.perf_counter()
+        await self.orig.write(msg, *args, is_last=is_last)
+        self.stats.write_latency.record((time.perf_counter() - t0) * 1000000)
+
+    def read_sync(self):
+        try:
+            data = self.orig.read_sync()
+        except BadPeer:
+            self.stats.mac_failures += 1
+            raise
+        self.stats.read_msgs += 1
+        self.stats.read_bytes += len(data)
+        return data
+
+    def write_sync(self, msg, *args, is_last=False):
+        self.orig.write_sync(msg, *args, is_last=is_last)
+        self.stats.write_batches += 1
+        if args:
+            self._count_batch(msg, args)
+        else:
+            self.stats.write_bytes += len(msg)
+
+    def _count_batch(self, msg, args):
+        stats = self.stats
+        stats.batched_msgs += len(args)
+        if len(args) >= stats.max_batch:
+            stats.max_batch = len(args) + 1
+        stats.write_bytes += len(msg) + sum(map(len, args))
+
+    def pause_reading(self):
+        self.orig.pause_reading()
+
+    def resume_reading(self):
+        self.orig.resume_reading()
+
+    def close(self):
+        self.orig.close()
+
+
+def instrument_session(session, stats=None, sample_every=0):
+    """Puts a MetricsChannel between AppChannelV2 and EncryptedChannelV2 of a session.
+    Call after handshake(); returns the MetricsChannel.
+    """
+    channel = MetricsChannel(session.enc_channel, stats=stats, sample_every=sample_every, loop=session.loop)
+    session.app_channel.channel = channel
+    return channel
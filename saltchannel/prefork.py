@@ -0,0 +1,277 @@
+"""Pre-forked multi-process Salt Channel v2 server.
+Every worker process binds the same port with SO_REUSEPORT (the kernel spreads incoming
+connections over them) and runs its own event loop, so handshakes scale with cores.
+The supervisor restarts workers which die and aggregates their metrics.
+
+    server = PreforkServer(handler, sig_keypair, port=8888, workers=4)
+    server.start()
+    server.serve_forever()  # until stop(), KeyboardInterrupt, SIGTERM or SIGHUP
+"""
+import os
+import time
+import signal
+import socket
+import asyncio
+import logging
+import threading
+import multiprocessing
+import multiprocessing.connection
+
+from .channel import AsyncioChannel
+from .exceptions import ComException
+from .saltlib import SaltLib
+from .util.metrics import MetricsRegistry
+from .v2.salt_server_session import SaltServerSession
+from .streams import start_saltchannel_server
+
+log = logging.getLogger(__name__)
+
+
+def reuseport_socket(host, port, backlog=None):
+    """Returns TCP socket bound to host:port with SO_REUSEPORT, listening if 'backlog' is given."""
+    family = socket.AF_INET6 if host and ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    if backlog is not None:
+        sock.listen(backlog)
+    sock.setblocking(False)
+    return sock
+
+
+class Worker:
+    """Runs in the forked process: accepts connections, does handshakes and calls the handler.
+    Sends None to the supervisor once it listens, then cumulative MetricsRegistry snapshots
+    every 'interval' seconds and once more on exit.
+    """
+    def __init__(self, index, handler, sig_keypair, host, port, conn, interval=1.0, backlog=1024):
+        self.index = index
+        self.handler = handler
+        self.sig_keypair = sig_keypair
+        self.host = host
+        self.port = port
+        self.conn = conn
+        self.interval = interval
+        self.backlog = backlog
+        self.loop = None
+        self.metrics = MetricsRegistry()
+        self.saltlib = SaltLib()
+
+    async def handle(self, reader, writer):
+        channel = AsyncioChannel(reader, writer, loop=self.loop)
+        session = SaltServerSession(self.sig_keypair, channel, loop=self.loop)
+        session.enc_keypair = self.saltlib.create_enc_keys()
+        session.metrics = self.metrics
+        try:
+            await session.handshake()
+            await self.handler(session)
+        except (ComException, asyncio.IncompleteReadError, ConnectionError) as e:
+            self.metrics.count_failure(e)
+        finally:
+            channel.close()
+
+    async def serve(self):
+        stop = asyncio.Event()
+        self.loop.add_signal_handler(signal.SIGTERM, stop.set)
+        sock = reuseport_socket(self.host, self.port, backlog=self.backlog)
+        server = await start_saltchannel_server(self.handle, loop=self.loop, sock=sock)
+        self.conn.send(None)  # ready
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self.conn.send(self.metrics.snapshot())
+        server.close()
+        await server.wait_closed()
+
+    def run(self):
+        signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C is handled by the supervisor
+        for signum in (signal.SIGTERM, signal.SIGHUP):
+            signal.signal(signum, signal.SIG_DFL)  # not the supervisor's handlers
+        signal.set_wakeup_fd(-1)
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self.serve())
+        finally:
+            tasks = asyncio.all_tasks(self.loop)
+            for task in tasks:
+                task.cancel()  # sessions still open
+            self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self.loop.close()
+            self.conn.close()
+
+
+def _worker_main(*args, **kwargs):
+    Worker(*args, **kwargs).run()
+
+
+class PreforkServer:
+    """Supervisor of 'workers' forked Worker processes sharing one port.
+    handler - coroutine function called as handler(session) with each SaltServerSession
+              after a successful handshake; the connection is closed when it returns.
+    Port 0 picks a free port, see 'port' after start().
+    """
+    RESTART_DELAY = 1.0  # seconds; minimum time between restarts of one worker
+    START_TIMEOUT = 10.0  # seconds; start() waits that long for workers to listen
+
+    def __init__(self, handler, sig_keypair, host='127.0.0.1', port=0, workers=None,
+                 interval=1.0, backlog=1024):
+        self.handler = handler
+        self.sig_keypair = sig_keypair
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.interval = interval
+        self.backlog = backlog
+        self.ctx = multiprocessing.get_context('fork')
+        self.procs = {}  # index -> (process, conn, start time)
+        self.snapshots = {}  # index -> last metrics snapshot of the running worker
+        self.retired = MetricsRegistry()  # metrics of workers which are gone
+        self.restarts = 0
+        self.restart_at = {}  # index -> time.monotonic() when the dead worker is started again
+        self.stopping = False
+        self.reserved = None
+
+    def start(self):
+        # keep the port bound (not listening) so it stays ours and workers can join it
+        self.reserved = reuseport_socket(self.host, self.port)
+        self.port = self.reserved.getsockname()[1]
+        try:
+            for index in range(self.workers):
+                self.spawn(index)
+            for index, (proc, conn, _) in self.procs.items():
+                if not conn.poll(self.START_TIMEOUT):
+                    raise RuntimeError("worker {} did not start".format(index))
+                self.collect(index, conn)
+        except BaseException:
+            self.stop()  # reap the workers started so far
+            raise
+
+    def spawn(self, index):
+        conn, child_conn = self.ctx.Pipe(duplex=False)
+        proc = self.ctx.Process(target=_worker_main, name='saltchannel-worker-{}'.format(index),
+                                args=(index, self.handler, self.sig_keypair, self.host, self.port, child_conn),
+                                kwargs={'interval': self.interval, 'backlog': self.backlog}, daemon=True)
+        proc.start()
+        child_conn.close()
+        self.procs[index] = (proc, conn, time.monotonic())
+
+    def retire(self, index):
+        proc, conn, _ = self.procs.pop(index)
+        self.collect(index, conn)
+        conn.close()
+        proc.join()
+        snapshot = self.snapshots.pop(index, None)
+        if snapshot:
+            self.retired.merge_snapshot(snapshot)
+        return proc
+
+    def collect(self, index, conn):
+        try:
+            while conn.poll():
+                snapshot = conn.recv()
+                if snapshot is not None:
+                    self.snapshots[index] = snapshot
+        except (EOFError, OSError):
+            pass
+
+    def poll(self, timeout=None, wakeup_fd=None):
+        """Collects metrics and restarts dead workers; returns after at most 'timeout' seconds,
+        or earlier when 'wakeup_fd' gets readable.
+        """
+        now = time.monotonic()
+        for index, due in list(self.restart_at.items()):
+            if due <= now and not self.stopping:
+                del self.restart_at[index]
+                self.restarts += 1
+                self.spawn(index)
+        if self.restart_at:
+            first = max(0, min(self.restart_at.values()) - now)
+            timeout = first if timeout is None else min(timeout, first)
+        waitables = {}
+        for index, (proc, conn, _) in self.procs.items():
+            waitables[conn] = index
+            waitables[proc.sentinel] = index
+        if wakeup_fd is not None:
+            waitables[wakeup_fd] = None
+        for ready in multiprocessing.connection.wait(list(waitables), timeout):
+            index = waitables[ready]
+            if index is None:
+                try:
+                    os.read(wakeup_fd, 512)
+                except BlockingIOError:
+                    pass
+                continue
+            if index not in self.procs:
+                continue
+            proc, conn, started = self.procs[index]
+            self.collect(index, conn)
+            if proc.is_alive():
+                continue
+            self.retire(index)
+            if self.stopping:
+                continue
+            log.warning('worker {} exited with code {}, restarting'.format(index, proc.exitcode))
+            self.restart_at[index] = started + self.RESTART_DELAY  # by poll(), the others stay supervised
+            if self.restart_at[index] <= time.monotonic():
+                del self.restart_at[index]
+                self.restarts += 1
+                self.spawn(index)
+
+    def _on_signal(self, signum, frame):
+        log.info('signal {}, stopping'.format(signum))
+        self.stopping = True
+
+    def serve_forever(self):
+        """Supervises the workers until stop(), KeyboardInterrupt, SIGTERM or SIGHUP (the latter two
+        only when called in the main thread, where signal handlers can be installed).
+        """
+        handlers = {}
+        wakeup = None
+        if threading.current_thread() is threading.main_thread():
+            wakeup = os.pipe()
+            for fd in wakeup:
+                os.set_blocking(fd, False)
+            old_wakeup_fd = signal.set_wakeup_fd(wakeup[1])  # interrupts poll() for the handler
+            for signum in (signal.SIGTERM, signal.SIGHUP):
+                handlers[signum] = signal.signal(signum, self._on_signal)
+        try:
+            while not self.stopping:
+                self.poll(timeout=self.interval, wakeup_fd=wakeup[0] if wakeup else None)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+            if wakeup:
+                signal.set_wakeup_fd(old_wakeup_fd)
+                for fd in wakeup:
+                    os.close(fd)
+            self.stop()
+
+    def stop(self, timeout=5.0):
+        self.stopping = True
+        self.restart_at.clear()
+        for proc, _, _ in self.procs.values():
+            if proc.is_alive():
+                proc.terminate()  # SIGTERM, worker sends its last snapshot
+        deadline = time.monotonic() + timeout
+        for index in list(self.procs):
+            proc = self.procs[index][0]
+            proc.join(max(0, deadline - time.monotonic()))
+            if proc.is_alive():
+                proc.kill()
+            self.retire(index)
+        if self.reserved:
+            self.reserved.close()
+            self.reserved = None
+
+    def metrics(self):
+        """Returns MetricsRegistry with metrics of all workers, including restarted ones."""
+        registry = MetricsRegistry().merge_snapshot(self.retired.snapshot())
+        for snapshot in self.snapshots.values():
+            registry.merge_snapshot(snapshot)
+        return registry
@@ -43,8 +43,12 @@ class SaltLib(metaclass=Singleton):
                     return api
                 else:
                     raise NoSuchLibException
-            else:
-                return SaltLib.lib_map[lib_type]
+        else:
+            return SaltLib.lib_map[lib_type.value]
+
+    def set_lib(self, lib_type):
+        """Switches crypto API used by all SaltLib() users, e.g. for benchmarking."""
+        self.api = SaltLib.getLib(lib_type)
 
     @staticmethod
     def random_bytes(n):
@@ -0,0 +1,315 @@
+"""ByteChannel between two local processes over shared memory (multiprocessing.shared_memory).
+Each direction is a single-producer/single-consumer ring buffer of length-prefixed frames;
+messages are copied into and out of the ring once, with no system call per message.
+A consumer which finds its ring empty (or a producer finding it full) flags that it sleeps
+and waits on an eventfd (a pipe where there is none); the other side signals it only then.
+
+    pipe = ShmPipe(capacity=1 << 20)
+    if os.fork() == 0:
+        channel = pipe.channel(1, loop=child_loop)  # child
+        ...
+    channel = pipe.channel(0, loop=loop)  # parent
+    ...
+    pipe.close()
+    pipe.unlink()  # by the creator, once both ends are done
+
+Ring positions are 64-bit counters published with single aligned stores and there are no
+memory barriers, so correctness relies on the total store order of x86: a consumer which
+sees the new head also sees the frame written before it. On CPUs with weaker ordering (ARM,
+POWER) it could read a frame before its bytes arrive, so ShmRing refuses to run there, see
+supported(). x86 may still let a load pass an earlier store; that only loses a wakeup (the
+waiting flag is raised while the other side already checked it), and sleepers re-check every
+IDLE_TIMEOUT seconds, so it costs latency, never data.
+
+A ring attached by name in another process needs the wakeup descriptors of the one which
+created it (ShmRing.wakeup_fds), inherited over fork() or passed with pass_fds/SCM_RIGHTS.
+"""
+import os
+import struct
+import asyncio
+import platform
+from multiprocessing import shared_memory
+
+import saltchannel.util as util
+from .channel import ByteChannel
+
+STORE_ORDERED_MACHINES = ('x86_64', 'amd64', 'i386', 'i686', 'x86')
+
+
+def supported():
+    """Returns whether this CPU keeps stores in order, as ShmRing needs, see module docs."""
+    return platform.machine().lower() in STORE_ORDERED_MACHINES
+
+
+class Wakeup:
+    """Signal from one process to another: eventfd on Linux, otherwise a pipe.
+    'fds' (rfd, wfd) of an existing Wakeup, e.g. inherited from another process, are reused.
+    """
+    def __init__(self, fds=None):
+        if fds is not None:
+            self.rfd, self.wfd = fds
+        elif hasattr(os, 'eventfd'):
+            self.rfd = self.wfd = os.eventfd(0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+        else:
+            self.rfd, self.wfd = os.pipe()
+            os.set_blocking(self.rfd, False)
+            os.set_blocking(self.wfd, False)
+
+    @property
+    def fds(self):
+        return self.rfd, self.wfd
+
+    def signal(self):
+        try:
+            if hasattr(os, 'eventfd'):
+                os.eventfd_write(self.wfd, 1)
+            else:
+                os.write(self.wfd, b'\0')
+        except BlockingIOError:
+            pass  # a signal is pending anyway
+
+    def drain(self):
+        try:
+            os.read(self.rfd, 4096)
+        except BlockingIOError:
+            pass
+
+    async def wait(self, loop, timeout):
+        """Waits until signalled or 'timeout' seconds passed."""
+        fut = loop.create_future()
+        loop.add_reader(self.rfd, lambda: fut.done() or fut.set_result(None))
+        try:
+            await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            loop.remove_reader(self.rfd)
+        self.drain()
+
+    def close(self):
+        os.close(self.rfd)
+        if self.wfd != self.rfd:
+            os.close(self.wfd)
+
+
+class ShmRing:
+    """Ring buffer of frames (4-byte length + message) in a SharedMemory block.
+    Header fields are 64 bytes apart, so producer and consumer do not share cache lines.
+    Positions only grow; the index into the data area is position % capacity.
+    """
+    U64 = struct.Struct('<Q')
+    U32 = struct.Struct('<I')
+    HEAD = 0  # written by the producer
+    TAIL = 64  # written by the consumer
+    READER_WAITING = 128
+    WRITER_WAITING = 192
+    CLOSED = 256
+    CAPACITY = 320
+    DATA = 384
+
+    def __init__(self, capacity=None, name=None, wakeup_fds=None):
+        """Creates a ring with 'capacity' data bytes (a power of two) or attaches to 'name';
+        attaching needs 'wakeup_fds' of the creator's ring.
+        """
+        if not supported():
+            raise RuntimeError("ShmRing needs x86 store ordering, not available on {!r}".format(platform.machine()))
+        if name is not None and wakeup_fds is None:
+            raise ValueError("attaching to a ring needs the wakeup_fds of the ring which created it")
+        if name is None:
+            if capacity < 64 or capacity & (capacity - 1):
+                raise ValueError("capacity must be a power of two of at least 64")
+            self.shm = shared_memory.SharedMemory(create=True, size=self.DATA + capacity)
+            self.shm.buf[:self.DATA] = bytes(self.DATA)
+            self.U64.pack_into(self.shm.buf, self.CAPACITY, capacity)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.buf = self.shm.buf
+        self.capacity = self.U64.unpack_from(self.buf, self.CAPACITY)[0]
+        self.mask = self.capacity - 1
+        self.data = self.buf[self.DATA:self.DATA + self.capacity]
+        data_fds, space_fds = wakeup_fds or (None, None)
+        self.data_ready = Wakeup(data_fds)
+        self.space_ready = Wakeup(space_fds)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def wakeup_fds(self):
+        """Descriptors another process needs to attach, see __init__()."""
+        return self.data_ready.fds, self.space_ready.fds
+
+    def _get(self, offset, field=U64):
+        return field.unpack_from(self.buf, offset)[0]
+
+    def _set(self, offset, value, field=U64):
+        field.pack_into(self.buf, offset, value)
+
+    def _copy_in(self, pos, raw):
+        i = pos & self.mask
+        n = min(len(raw), self.capacity - i)
+        self.data[i:i + n] = raw[:n]
+        if n < len(raw):  # wraps around
+            self.data[:len(raw) - n] = raw[n:]
+
+    def _copy_out(self, pos, size):
+        i = pos & self.mask
+        if i + size <= self.capacity:
+            return bytes(self.data[i:i + size])
+        n = self.capacity - i
+        return bytes(self.data[i:]) + bytes(self.data[:size - n])
+
+    def put(self, msgs):
+        """Producer: appends as many of 'msgs' as fit; returns how many."""
+        head = self._get(self.HEAD)
+        free = self.capacity - (head - self._get(self.TAIL))
+        count = 0
+        for msg in msgs:
+            size = 4 + len(msg)
+            if size > free:
+                break
+            i = head & self.mask
+            if i + size <= self.capacity:
+                self.U32.pack_into(self.data, i, len(msg))
+                self.data[i + 4:i + size] = msg
+            else:
+                self._copy_in(head, self.U32.pack(len(msg)))
+                self._copy_in(head + 4, memoryview(msg))
+            head += size
+            free -= size
+            count += 1
+        if count:
+            self._set(self.HEAD, head)  # publish
+            if self._get(self.READER_WAITING, self.U32):
+                self._set(self.READER_WAITING, 0, self.U32)
+                self.data_ready.signal()
+        return count
+
+    def get(self, max_count=None):
+        """Consumer: returns list of the messages available, at most 'max_count'."""
+        tail = self._get(self.TAIL)
+        head = self._get(self.HEAD)
+        msgs = []
+        while tail < head and (max_count is None or len(msgs) < max_count):
+            i = tail & self.mask
+            if i + 4 <= self.capacity:
+                size = self.U32.unpack_from(self.data, i)[0]
+            else:
+                size = self.U32.unpack(self._copy_out(tail, 4))[0]
+            if i + 4 + size <= self.capacity:
+                msgs.append(bytes(self.data[i + 4:i + 4 + size]))
+            else:
+                msgs.append(self._copy_out(tail + 4, size))
+            tail += 4 + size
+        if msgs:
+            self._set(self.TAIL, tail)  # release
+            if self._get(self.WRITER_WAITING, self.U32):
+                self._set(self.WRITER_WAITING, 0, self.U32)
+                self.space_ready.signal()
+        return msgs
+
+    def is_empty(self):
+        return self._get(self.TAIL) == self._get(self.HEAD)
+
+    @property
+    def closed(self):
+        return bool(self._get(self.CLOSED, self.U32))
+
+    def close_producer(self):
+        self._set(self.CLOSED, 1, self.U32)
+        self.data_ready.signal()
+
+    def close(self):
+        self.data.release()
+        self.buf = self.data = None
+        self.shm.close()
+        self.data_ready.close()
+        self.space_ready.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+class ShmChannel(ByteChannel, metaclass=util.Syncizer):
+    """One end of a ShmPipe; write to 'tx' ring, read from 'rx' ring. Only one task may read
+    and one task may write at a time.
+    """
+    IDLE_TIMEOUT = 0.05  # seconds; re-check interval while sleeping, see module docs
+
+    def __init__(self, tx, rx, loop=None):
+        super().__init__(loop=loop)
+        self.tx = tx
+        self.rx = rx
+        self.pending = []  # messages taken from the ring, not read yet
+
+    async def read(self):
+        if not self.pending:
+            self.pending = await self._take()
+            self.pending.reverse()
+        return self.pending.pop()
+
+    async def read_available(self):
+        msgs = self.pending[::-1] if self.pending else await self._take()
+        self.pending = []
+        return msgs
+
+    async def _take(self):
+        rx = self.rx
+        while True:
+            msgs = rx.get()
+            if msgs:
+                return msgs
+            if rx.closed:
+                msgs = rx.get()  # written between get() and close_producer()
+                if msgs:
+                    return msgs
+                raise asyncio.IncompleteReadError(b'', None)
+            rx._set(rx.READER_WAITING, 1, rx.U32)
+            if rx.is_empty() and not rx.closed:  # re-check after raising the flag
+                await rx.data_ready.wait(self.loop, self.IDLE_TIMEOUT)
+
+    async def write(self, msg, *args, is_last=False):
+        tx = self.tx
+        msgs = (msg,) + args
+        for m in msgs:
+            if 4 + len(m) > tx.capacity:
+                raise ValueError("message of {} bytes does not fit ring of {}".format(len(m), tx.capacity))
+        while msgs:
+            if tx.closed or self.rx.closed:  # this end or the peer closed
+                raise ConnectionResetError("channel closed")
+            count = tx.put(msgs)
+            msgs = msgs[count:]
+            if msgs:
+                tx._set(tx.WRITER_WAITING, 1, tx.U32)
+                if not tx.put(msgs[:1]):  # re-check after raising the flag
+                    await tx.space_ready.wait(self.loop, self.IDLE_TIMEOUT)
+                else:
+                    msgs = msgs[1:]
+
+    def close(self):
+        """The peer reads what was written so far, then gets IncompleteReadError;
+        its writes fail with ConnectionResetError, also those waiting for room.
+        """
+        self.tx.close_producer()
+        self.rx.space_ready.signal()  # wakes the peer's writer
+
+
+class ShmPipe:
+    """Two ShmRings, one per direction, with their wakeup descriptors. Create it before forking;
+    the parent uses channel(0), the child channel(1).
+    """
+    def __init__(self, capacity=1 << 20):
+        self.rings = (ShmRing(capacity), ShmRing(capacity))
+
+    def channel(self, end, loop=None):
+        tx, rx = self.rings if end == 0 else self.rings[::-1]
+        return ShmChannel(tx, rx, loop=loop)
+
+    def close(self):
+        for ring in self.rings:
+            ring.close()
+
+    def unlink(self):
+        for ring in self.rings:
+            ring.unlink()
@@ -0,0 +1,150 @@
+"""asyncio streams of length-prefixed messages (4-byte little endian length + message) for
+AsyncioChannel, over TCP, Unix domain stream sockets or any connected stream socket.
+
+    # TCP
+    server = await start_saltchannel_server(on_client, '127.0.0.1', 2033, loop=loop)
+    reader, writer = await open_saltchannel_connection('127.0.0.1', 2033, loop=loop)
+
+    # Unix domain socket, for services on the same host
+    server = await start_saltchannel_unix_server(on_client, '/run/app/salt.sock', loop=loop)
+    reader, writer = await open_saltchannel_unix_connection('/run/app/salt.sock', loop=loop)
+
+    # parent and child process, socket.socketpair() created before fork()
+    parent_sock, child_sock = socket.socketpair()
+    reader, writer = await open_saltchannel_socket(parent_sock, loop=loop)
+    # the child may as well use SocketChannel(child_sock) without an event loop
+"""
+import struct
+import socket
+import asyncio.events as events
+import asyncio.streams as streams
+import asyncio.coroutines as coroutines
+
+
+class SaltChannelStreamWriter(streams.StreamWriter):
+    def write_msg(self, msg):
+        self.write(b''.join([struct.pack('<i', len(msg)), bytes(msg)]))
+
+    def write_msgs(self, *msgs):
+        """Writes all msgs as a single transport write."""
+        raw = bytearray()
+        for msg in msgs:
+            raw.extend(struct.pack('<i', len(msg)))
+            raw.extend(msg)
+        self.write(raw)
+
+
+class SaltChannelStreamReader(streams.StreamReader):
+    """StreamReader reading length-prefixed messages.
+    Besides the StreamReader's own buffer limit, the transport is kept paused between
+    pause_reading() and resume_reading() calls of the consumer.
+    """
+    app_paused = False
+    pause_count = 0
+
+    def pause_reading(self):
+        if not self.app_paused:
+            self.app_paused = True
+            self.pause_count += 1
+            if self._transport is not None and not self._paused:
+                self._transport.pause_reading()
+
+    def resume_reading(self):
+        if self.app_paused:
+            self.app_paused = False
+            if self._transport is None:
+                return
+            if self._paused:
+                self._maybe_resume_transport()  # paused for the buffer limit too
+            else:
+                self._transport.resume_reading()
+
+    def _maybe_resume_transport(self):
+        if not self.app_paused:
+            super()._maybe_resume_transport()
+
+    async def read_msg(self):
+        msg_len = struct.unpack('<i', await self.readexactly(4))
+        return b'' if not msg_len else await self.readexactly(msg_len[0])
+
+    async def read_msgs(self):
+        """Reads one msg; returns it together with all complete msgs already buffered."""
+        msgs = [await self.read_msg()]
+        buf = self._buffer
+        pos = 0
+        while len(buf) - pos >= 4:
+            (msg_len,) = struct.unpack_from('<i', buf, pos)
+            if len(buf) - pos - 4 < msg_len:
+                break
+            msgs.append(bytes(buf[pos + 4:pos + 4 + msg_len]))
+            pos += 4 + msg_len
+        if pos:
+            del buf[:pos]
+            self._maybe_resume_transport()
+        return msgs
+
+
+class SaltChannelStreamReaderProtocol(streams.StreamReaderProtocol):
+    def connection_made(self, transport):
+        self._stream_reader.set_transport(transport)
+        if self._client_connected_cb is not None:
+            self._stream_writer = SaltChannelStreamWriter(transport, self,
+                                                  self._stream_reader,
+                                                  self._loop)
+            res = self._client_connected_cb(self._stream_reader,
+                                            self._stream_writer)
+            if coroutines.iscoroutine(res):
+                self._loop.create_task(res)
+
+    def data_received(self, data):
+        self._stream_reader.feed_data(data)
+
+
+def _server_factory(client_connected_cb, loop, limit):
+    def factory():
+        reader = SaltChannelStreamReader(limit=limit, loop=loop)
+        return SaltChannelStreamReaderProtocol(reader, client_connected_cb, loop=loop)
+    return factory
+
+
+async def _open(create, loop, limit, *args, **kwds):
+    reader = SaltChannelStreamReader(limit=limit, loop=loop)
+    protocol = SaltChannelStreamReaderProtocol(reader, loop=loop)
+    transport, _ = await create(lambda: protocol, *args, **kwds)
+    writer = SaltChannelStreamWriter(transport, protocol, reader, loop)
+    return reader, writer
+
+
+async def open_saltchannel_connection(host=None, port=None, *, loop=None, limit=streams._DEFAULT_LIMIT, **kwds):
+    if loop is None:
+        loop = events.get_event_loop()
+    return await _open(loop.create_connection, loop, limit, host, port, **kwds)
+
+
+async def start_saltchannel_server(client_connected_cb, host=None, port=None, *,
+                                   loop=None, limit=streams._DEFAULT_LIMIT, **kwds):
+    if loop is None:
+        loop = events.get_event_loop()
+    return await loop.create_server(_server_factory(client_connected_cb, loop, limit), host, port, **kwds)
+
+
+async def open_saltchannel_unix_connection(path=None, *, loop=None, limit=streams._DEFAULT_LIMIT, **kwds):
+    if loop is None:
+        loop = events.get_event_loop()
+    return await _open(loop.create_unix_connection, loop, limit, path, **kwds)
+
+
+async def start_saltchannel_unix_server(client_connected_cb, path=None, *,
+                                        loop=None, limit=streams._DEFAULT_LIMIT, **kwds):
+    if loop is None:
+        loop = events.get_event_loop()
+    return await loop.create_unix_server(_server_factory(client_connected_cb, loop, limit), path, **kwds)
+
+
+async def open_saltchannel_socket(sock, *, loop=None, limit=streams._DEFAULT_LIMIT):
+    """Returns (reader, writer) over connected stream socket 'sock', e.g. one end of socket.socketpair()."""
+    if loop is None:
+        loop = events.get_event_loop()
+    if sock.family == socket.AF_UNIX:
+        return await _open(loop.create_unix_connection, loop, limit, sock=sock)
+    return await _open(loop.create_connection, loop, limit, sock=sock)
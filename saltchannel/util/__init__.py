@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
 
+import os
 import ctypes
-from abc import ABCMeta
 import asyncio
+import threading
+import weakref
+from abc import ABCMeta
+from concurrent.futures import ThreadPoolExecutor
 
 def cbytes(src):
     """Convert bytes-like array to ctypes array of c_uint8."""
@@ -18,6 +22,88 @@ def force_event_loop(loop=None):
     return loop2
 
 
+def _running_loop():
+    """Returns event loop running in the calling thread or None."""
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def run_sync(coro, loop):
+    """Runs coroutine 'coro' on 'loop' and returns its result; for use from synchronous code.
+    On background_loop() the coroutine is submitted to the loop's thread and the calling
+    thread blocks until it is done; any number of threads may do so at once.
+    Any other loop is run with run_until_complete(), so it must not be running already
+    (RuntimeError). If the calling thread runs an event loop of its own, 'loop' is run
+    in a worker thread kept for it.
+    """
+    if BackgroundLoop.owns(loop):
+        if _running_loop() is loop:
+            coro.close()
+            raise RuntimeError("sync API called from its own event loop thread, await the coroutine instead")
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+    if loop.is_running():
+        coro.close()
+        raise RuntimeError("This event loop is already running; use background_loop() for *_sync "
+                           "calls from several threads")
+    if _running_loop() is not None:
+        return LoopRunner.get(loop).submit(loop.run_until_complete, coro).result()
+    return loop.run_until_complete(coro)
+
+
+class BackgroundLoop:
+    """Event loop running forever in a daemon thread; one per process (restarted after fork)."""
+    _lock = threading.Lock()
+    _loop = None
+    _pid = None
+
+    @classmethod
+    def get(cls):
+        with cls._lock:
+            if cls._loop is None or cls._pid != os.getpid():
+                cls._loop = asyncio.new_event_loop()
+                cls._pid = os.getpid()
+                started = threading.Event()
+                cls._loop.call_soon_threadsafe(started.set)
+                threading.Thread(target=cls._loop.run_forever, name='saltchannel-loop', daemon=True).start()
+                started.wait()  # is_running() must be true before anything is submitted
+            return cls._loop
+
+    @classmethod
+    def owns(cls, loop):
+        return loop is cls._loop and cls._pid == os.getpid()
+
+
+def background_loop():
+    """Returns shared event loop running in its own thread.
+    Objects created with loop=background_loop() have *_sync methods which may be
+    called from any number of threads, including threads running their own event loop.
+    """
+    return BackgroundLoop.get()
+
+
+class LoopRunner:
+    """One worker thread per event loop, for run_sync() called from a thread which runs
+    another loop; calls for the same loop run one after the other.
+    """
+    _lock = threading.Lock()
+    _runners = weakref.WeakKeyDictionary()  # loop -> ThreadPoolExecutor
+    _pid = None
+
+    @classmethod
+    def get(cls, loop):
+        with cls._lock:
+            if cls._pid != os.getpid():  # threads do not survive fork()
+                cls._runners = weakref.WeakKeyDictionary()
+                cls._pid = os.getpid()
+            runner = cls._runners.get(loop)
+            if runner is None:
+                runner = ThreadPoolExecutor(max_workers=1, thread_name_prefix='saltchannel-run-sync')
+                cls._runners[loop] = runner
+            return runner
+
+
 class Singleton(type):
     _instances = {}
     def __call__(cls, *args, **kwargs):
@@ -39,13 +125,14 @@ class Syncizer(ABCMeta):
 
     This metaclass finds all coroutine functions defined on a class
     and adds a synchronous version with a '_sync' suffix appended to the
-    original function name.
+    original function name. See run_sync() for how the coroutine is run.
+    Special methods (e.g. __anext__) get no sync version.
     """
     def __new__(cls, clsname, bases, dct, **kwargs):
         new_dct = {}
         for name,val in dct.items():
             # Make a sync version of all coroutine functions
-            if asyncio.iscoroutinefunction(val):
+            if asyncio.iscoroutinefunction(val) and not (name.startswith('__') and name.endswith('__')):
                 meth = cls.sync_maker(name)
                 syncname = '{}_sync'.format(name)
                 meth.__name__ = syncname
@@ -58,5 +145,5 @@ class Syncizer(ABCMeta):
     def sync_maker(func):
         def sync_func(self, *args, **kwargs):
             meth = getattr(self, func)
-            return self.loop.run_until_complete(meth(*args, **kwargs))
+            return run_sync(meth(*args, **kwargs), self.loop)
         return sync_func
@@ -0,0 +1,157 @@
+import math
+from abc import ABCMeta, abstractmethod
+from collections import Counter
+
+from . import SingletonABCMeta
+
+
+class Histogram:
+    """HDR-style histogram of non-negative integer values.
+    Values are grouped in power-of-two ranges, each split into 2**precision linear
+    sub-buckets, so the relative error of any reported value is below 2**-precision.
+    Buckets are kept sparse, histograms can be merged and exported as a snapshot dict.
+    """
+    def __init__(self, precision=5):
+        self.precision = precision
+        self.buckets = Counter()  # bucket index -> count
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+
+    def _index(self, value):
+        sub = 1 << self.precision
+        if value < 2 * sub:
+            return value
+        shift = value.bit_length() - self.precision - 1
+        return ((shift + 1) << self.precision) + (value >> shift) - sub
+
+    def _highest_value(self, index):
+        """Highest value which falls into bucket 'index'."""
+        sub = 1 << self.precision
+        if index < 2 * sub:
+            return index
+        shift = (index >> self.precision) - 1
+        mantissa = index - ((shift + 1) << self.precision) + sub
+        return ((mantissa + 1) << shift) - 1
+
+    def record(self, value, count=1):
+        value = int(value)
+        if value < 0:
+            raise ValueError("negative value: ", value)
+        if not self.count or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.buckets[self._index(value)] += count
+        self.count += count
+        self.total += value * count
+
+    def percentile(self, p):
+        if not self.count:
+            return 0
+        rank = max(1, math.ceil(p / 100.0 * self.count))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(self._highest_value(index), self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("precision mismatch: ", self.precision, other.precision)
+        if other.count:
+            self.min = min(self.min, other.min) if self.count else other.min
+            self.max = max(self.max, other.max)
+        self.buckets.update(other.buckets)
+        self.count += other.count
+        self.total += other.total
+        return self
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.mean,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'p999': self.percentile(99.9),
+            'precision': self.precision,
+            'total': self.total,
+            'buckets': {str(k): v for k, v in sorted(self.buckets.items())},
+        }
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        h = cls(precision=snapshot['precision'])
+        h.buckets.update({int(k): v for k, v in snapshot['buckets'].items()})
+        h.count = snapshot['count']
+        h.total = snapshot['total']
+        h.min = snapshot['min']
+        h.max = snapshot['max']
+        return h
+
+
+class Metrics(metaclass=ABCMeta):
+    """Receives per-stage durations and failures from sessions."""
+
+    """Records 'seconds' spent in handshake stage 'stage'."""
+    @abstractmethod
+    def record(self, stage, seconds): pass
+
+    """Counts a failure; 'exc' is the exception instance raised."""
+    @abstractmethod
+    def count_failure(self, exc): pass
+
+
+class NullMetrics(Metrics, metaclass=SingletonABCMeta):
+    """Metrics implementation which drops everything."""
+
+    def record(self, stage, seconds): pass
+
+    def count_failure(self, exc): pass
+
+
+class MetricsRegistry(Metrics):
+    """Keeps a Histogram (in microseconds) per stage and failure counters by exception type.
+    A single registry may be shared by all sessions of a server.
+    """
+    UNIT = 'us'
+
+    def __init__(self, precision=5):
+        self.precision = precision
+        self.stages = {}
+        self.failures = Counter()
+
+    def histogram(self, stage):
+        h = self.stages.get(stage)
+        if h is None:
+            h = self.stages[stage] = Histogram(precision=self.precision)
+        return h
+
+    def record(self, stage, seconds):
+        self.histogram(stage).record(seconds * 1000000)
+
+    def count_failure(self, exc):
+        self.failures[type(exc).__name__] += 1
+
+    def snapshot(self):
+        return {
+            'unit': self.UNIT,
+            'stages': {name: h.snapshot() for name, h in sorted(self.stages.items())},
+            'failures': dict(self.failures),
+        }
+
+    def merge_snapshot(self, snapshot):
+        """Adds data from another registry's snapshot(), e.g. one taken in another process."""
+        for name, h in snapshot['stages'].items():
+            self.histogram(name).merge(Histogram.from_snapshot(h))
+        self.failures.update(snapshot['failures'])
+        return self
@@ -14,6 +14,14 @@ class TimeKeeper(metaclass=SingletonABCMeta):
     @abstractmethod
     def get_time(self): pass
 
+    def export_state(self):
+        """Returns clock state as JSON-compatible value, for moving a session to another process."""
+        return None
+
+    def import_state(self, state):
+        """Restores clock state from export_state()."""
+        pass
+
 
 class TimeChecker(metaclass=SingletonABCMeta):
     """"""
@@ -26,6 +34,14 @@ class TimeChecker(metaclass=SingletonABCMeta):
     @abstractmethod
     def check_time(self, time): pass
 
+    def export_state(self):
+        """Returns clock state as JSON-compatible value, for moving a session to another process."""
+        return None
+
+    def import_state(self, state):
+        """Restores clock state from export_state()."""
+        pass
+
 
 class NullTimeKeeper(TimeKeeper):
     """A TimeKeeper implementation that does not keep time.
@@ -1,45 +1,175 @@
+import math
 from collections import deque
+from itertools import islice
 
 import saltchannel.util as util
 from ..channel import ByteChannel
 from .packets import PacketType, AppPacket, MultiAppPacket
+from .encrypted_channel_v2 import EncryptedChannelV2
 
 
 class AppChannelV2(ByteChannel, metaclass=util.Syncizer):
     """An app message channel on top of an underlying ByteChannel (EncryptedChannelV2).
     Adds small header to messages.
     Asyncio-friendly implementation
+
+    Messages of a MultiAppPacket wait in readQ. With set_read_queue_limits(), reading from
+    the channel below is paused while readQ, together with the messages EncryptedChannelV2
+    decrypted ahead, is above a high watermark, see pause_reading().
+
+    'async for msg in app_channel' reads until the message with LastFlag; read_batch() hands
+    out all messages of a MultiAppPacket in one call.
+
+    With zero_copy, read() returns memoryview slices of the decrypted packet instead of bytes;
+    call .tobytes() on messages which are kept around.
     """
-    def __init__(self, channel, time_keeper, time_checker, loop=None):
+    def __init__(self, channel, time_keeper, time_checker, loop=None, zero_copy=False):
         super().__init__(loop=loop)
+        self._init_state(channel, time_keeper, time_checker)
+        self.zero_copy = zero_copy
+
+    def _init_state(self, channel, time_keeper, time_checker):
         self.channel = channel
         self.time_keeper = time_keeper
         self.time_checker = time_checker
         self.buffered_m4 = None
         self.readQ = deque()
+        self.readQ_bytes = 0
+        self.read_high_msgs = self.read_high_bytes = math.inf
+        self.read_low_msgs = self.read_low_bytes = math.inf
+        self.reading_paused = False
+        self.pause_count = 0  # how often backpressure engaged
+        self.zero_copy = False
+
+    def set_read_queue_limits(self, high_msgs=None, high_bytes=None, low_msgs=None, low_bytes=None):
+        """Reading pauses when readQ and the channel below (its read_ahead, if any) hold at least
+        'high_msgs' messages or 'high_bytes' bytes and resumes when they are back at or below
+        both low watermarks (default: half of high). None means no limit.
+        """
+        self.read_high_msgs = math.inf if high_msgs is None else high_msgs
+        self.read_high_bytes = math.inf if high_bytes is None else high_bytes
+        self.read_low_msgs = self.read_high_msgs / 2 if low_msgs is None else low_msgs
+        self.read_low_bytes = self.read_high_bytes / 2 if low_bytes is None else low_bytes
 
     @property
     def last(self):
         return self.channel.last_flag
 
+    def export_state(self):
+        """Returns session state (EncryptedChannelV2 and time state) as a JSON-compatible dict."""
+        if self.readQ or self.buffered_m4:
+            raise ValueError("unread messages or buffered M4 pending, cannot export state")
+        return {
+            'channel': self.channel.export_state(),
+            'time_keeper': self.time_keeper.export_state(),
+            'time_checker': self.time_checker.export_state(),
+        }
+
+    @classmethod
+    def import_state(cls, clear_channel, state, time_keeper, time_checker, loop=None):
+        """Returns AppChannelV2 continuing a session from export_state() over 'clear_channel'."""
+        time_keeper.import_state(state['time_keeper'])
+        time_checker.import_state(state['time_checker'])
+        enc_channel = EncryptedChannelV2.import_state(clear_channel, state['channel'], loop=loop)
+        return cls(enc_channel, time_keeper, time_checker, loop=loop)
+
     async def read(self):
         if len(self.readQ):
-            return self.readQ.popleft()
+            return self._pop()
+
+        return self.decode(await self.channel.read())
+
+    def unread(self, msg):
+        """Puts 'msg' back, the next read() returns it."""
+        self.readQ.appendleft(msg)
+        self.readQ_bytes += len(msg)
+
+    async def read_batch(self, max_count=None, max_bytes=None):
+        """Returns list of the messages already decoded or, if there are none, of the next packet;
+        only waits in the latter case. At most 'max_count' messages and 'max_bytes' bytes are
+        returned (but at least one message), the rest stays queued for the next call.
+        """
+        self._check_batch(max_count)
+        first = self._pop() if self.readQ else self.decode(await self.channel.read())
+        return self._batch(first, max_count, max_bytes)
+
+    @staticmethod
+    def _check_batch(max_count):
+        if max_count is not None and max_count < 1:
+            raise ValueError("max_count must be at least 1, got {}".format(max_count))
+
+    def _batch(self, first, max_count, max_bytes):
+        readQ = self.readQ
+        count = len(readQ) if max_count is None else min(len(readQ), max_count - 1)
+        if max_bytes is not None:
+            room = max_bytes - len(first)
+            for i, msg in enumerate(islice(readQ, count)):
+                room -= len(msg)
+                if room < 0:
+                    count = i
+                    break
+        msgs = [first]
+        if count == len(readQ):
+            msgs.extend(readQ)
+            readQ.clear()
+        else:
+            msgs.extend(readQ.popleft() for _ in range(count))
+        self.readQ_bytes -= sum(map(len, msgs)) - len(first)
+        self._check_watermarks()
+        return msgs
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.readQ and self.last:
+            raise StopAsyncIteration
+        return await self.read()
+
+    def _pop(self):
+        msg = self.readQ.popleft()
+        self.readQ_bytes -= len(msg)
+        self._check_watermarks()
+        return msg
+
+    def _check_watermarks(self):
+        ahead_msgs, ahead_bytes = getattr(self.channel, 'read_ahead', (0, 0))
+        msgs = len(self.readQ) + ahead_msgs
+        size = self.readQ_bytes + ahead_bytes
+        if self.reading_paused:
+            if msgs <= self.read_low_msgs and size <= self.read_low_bytes:
+                self.reading_paused = False
+                self.channel.resume_reading()
+        elif msgs >= self.read_high_msgs or size >= self.read_high_bytes:
+            self.reading_paused = True
+            self.pause_count += 1
+            self.channel.pause_reading()
 
-        raw_chunk = await self.channel.read()
-        ap = AppPacket(src_buf=raw_chunk, validate=False)
-        if ap.data.Header.PacketType == PacketType.TYPE_APP_PACKET.value:  # AppPacket detected
-            ap.validate()
+    def _queue(self, msgs):
+        self.readQ.extend(msgs)
+        self.readQ_bytes += sum(len(msg) for msg in msgs)
+
+    async def write(self, message, *args, is_last=False):
+        rawmsg_list = self.encode((message,) + args)
+        await self.channel.write(rawmsg_list[0], *(rawmsg_list[1:]), is_last=is_last)
+
+    def decode(self, raw_chunk):
+        """Parses AppPacket or MultiAppPacket; returns first message, queues the rest."""
+        if not raw_chunk or raw_chunk[0] == PacketType.TYPE_APP_PACKET.value:  # AppPacket detected
+            ap = AppPacket(src_buf=raw_chunk, validate=True)
             self.time_checker.check_time(ap.data.Time)
-            return ap.Data
+            msg = memoryview(raw_chunk)[ap.data.size:] if self.zero_copy else ap.Data
         else:
-            map = MultiAppPacket(src_buf=raw_chunk, validate=True)  # MultiAppPacket detected if no exception
+            # MultiAppPacket detected if no exception
+            map = MultiAppPacket(src_buf=raw_chunk, validate=True, zero_copy=self.zero_copy)
             self.time_checker.check_time(map.data.Time)
-            self.readQ.extend(map.opt.Message[1:])  # add all msgs but first to fifo (if more then one exists)
-            return map.opt.Message[0]
+            self._queue(map.opt.Message[1:])  # add all msgs but first to fifo (if more then one exists)
+            msg = map.opt.Message[0]
+        self._check_watermarks()  # the channel below may have read ahead, too
+        return msg
 
-    async def write(self, message, *args, is_last=False):
-        msgs = (message,) + args
+    def encode(self, msgs):
+        """Returns list of raw packets for 'msgs': buffered M4 if any, then AppPacket(s) or one MultiAppPacket."""
         current_time = self.time_keeper.get_time()
         rawmsg_list = []
 
@@ -60,5 +190,56 @@ class AppChannelV2(ByteChannel, metaclass=util.Syncizer):
                 ap.data.Time = current_time
                 ap.Data = msg
                 rawmsg_list.append(bytes(ap))
+        return rawmsg_list
 
-        await self.channel.write(rawmsg_list[0], *(rawmsg_list[1:]), is_last=is_last)
+    async def read_many(self, count):
+        """Reads exactly 'count' messages; read_many_sync() amortizes the thread hop over all of them."""
+        msgs = []
+        while len(msgs) < count:
+            msgs.append(await self.read())
+        return msgs
+
+    async def write_many(self, msgs, is_last=False):
+        """Writes all 'msgs' at once, see write()."""
+        msgs = list(msgs)
+        if not msgs:
+            raise ValueError("no messages to write")
+        await self.write(msgs[0], *msgs[1:], is_last=is_last)
+
+
+class AppChannelV2Sync(AppChannelV2):
+    """Blocking AppChannelV2 on top of EncryptedChannelV2Sync; never touches an event loop."""
+    def __init__(self, channel, time_keeper, time_checker):
+        self.loop = None
+        self._init_state(channel, time_keeper, time_checker)
+
+    def read_sync(self):
+        if len(self.readQ):
+            return self._pop()
+        return self.decode(self.channel.read_sync())
+
+    def read_batch_sync(self, max_count=None, max_bytes=None):
+        self._check_batch(max_count)
+        first = self._pop() if self.readQ else self.decode(self.channel.read_sync())
+        return self._batch(first, max_count, max_bytes)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.readQ and self.last:
+            raise StopIteration
+        return self.read_sync()
+
+    def write_sync(self, message, *args, is_last=False):
+        rawmsg_list = self.encode((message,) + args)
+        self.channel.write_sync(rawmsg_list[0], *(rawmsg_list[1:]), is_last=is_last)
+
+    def read_many_sync(self, count):
+        return [self.read_sync() for _ in range(count)]
+
+    def write_many_sync(self, msgs, is_last=False):
+        msgs = list(msgs)
+        if not msgs:
+            raise ValueError("no messages to write")
+        self.write_sync(msgs[0], *msgs[1:], is_last=is_last)
@@ -0,0 +1,227 @@
+"""Optional zlib compression of app messages, between AppChannelV2 and the application.
+Servers advertise it in A2 with P2 protocol strings (see compression_prot()). A client which
+finds one it supports sends HELLO and that P2 as its first app message and compresses from
+then on; the server turns compression on only for sessions starting with such a hello.
+Other sessions stay plain, so plain clients work with the same server.
+
+    # server
+    session.a2 = compression_a2(zdict=ZDICT)
+    ...
+    channel = await accept_compression(session.app_channel, supported_prots(ZDICT), loop=loop)
+
+    # client, 'a2' from A1ClientSession or DiscoveryCache
+    channel = await start_compression(session.app_channel, a2, supported_prots(ZDICT), loop=loop)
+
+accept_compression() waits for the client's first app message, so it suits protocols where
+the client speaks first. A plain client's first message must not start with HELLO.
+
+Every message gets a one byte flag: FLAG_RAW messages are sent as they are (small messages
+and those which do not get smaller), FLAG_DEFLATE and FLAG_DEFLATE_DICT ones are raw deflate
+streams, the latter with the preset dictionary. With a versioned CompressionDictionary
+(see compression_dict.py) FLAG_DEFLATE_DICT_ID and the dictionary id precede the stream.
+Messages are compressed independently, so a dictionary of typical content is what makes
+small messages shrink.
+"""
+import zlib
+import asyncio
+
+import saltchannel.util as util
+from ..channel import ByteChannel
+from ..exceptions import BadPeer
+from ..a1a2.packets import A2Packet
+from .compression_dict import CompressionDictionary
+
+PROT_PREFIX = b'zlib.'
+HELLO = b'\x00SC2-zlib-hello\x00'  # first app message of a client which selected compression, then its P2
+
+
+def compression_prot(zdict=None):
+    """Returns P2 protocol string of compression without or with preset dictionary 'zdict'
+    (bytes or CompressionDictionary).
+    """
+    if not zdict:
+        return PROT_PREFIX + b'-----'
+    if isinstance(zdict, CompressionDictionary):
+        zdict = zdict.data
+    return PROT_PREFIX + '{:05x}'.format(zlib.adler32(zdict) & 0xfffff).encode()
+
+
+def supported_prots(zdict=None, plain=True):
+    """Returns {P2: zdict} of compression with 'zdict' if given and, with 'plain', also without
+    dictionary; the preferred one first.
+    """
+    prots = {compression_prot(zdict): zdict or None}
+    if zdict and plain:
+        prots[compression_prot()] = None
+    return prots
+
+
+def compression_a2(zdict=None, plain=True):
+    """Returns A2Packet offering compression (with 'zdict' if given) and, with 'plain',
+    also compression without dictionary.
+    """
+    prots = list(supported_prots(zdict, plain))
+    a2 = A2Packet()
+    a2.data.Count = len(prots)
+    a2.create_opt_fields(prot_count=len(prots))
+    for i, p2 in enumerate(prots):
+        a2.Prot[i].P1 = util.cbytes(A2Packet.SC2_PROT_STRING)
+        a2.Prot[i].P2 = util.cbytes(p2)
+    return a2
+
+
+def select_prot(a2, supported):
+    """Returns the first P2 of 'supported' that A2Packet 'a2' offers with Salt Channel v2, or None."""
+    offered = {bytes(prot.P2) for prot in a2.Prot if bytes(prot.P1) == A2Packet.SC2_PROT_STRING}
+    for p2 in supported:
+        if p2 in offered:
+            return p2
+    return None
+
+
+async def start_compression(app_channel, a2, supported, loop=None, **kwargs):
+    """Client: if A2Packet 'a2' offers a P2 of 'supported' (see supported_prots()), sends the
+    hello for it and returns a CompressedChannel over 'app_channel' (further arguments are
+    passed on); otherwise returns 'app_channel' itself.
+    """
+    p2 = select_prot(a2, list(supported))
+    if p2 is None:
+        return app_channel
+    await app_channel.write(HELLO + p2)
+    return CompressedChannel(app_channel, zdict=supported[p2], loop=loop, **kwargs)
+
+
+async def accept_compression(app_channel, supported, loop=None, **kwargs):
+    """Server: reads the first app message of the session from 'app_channel' (AppChannelV2).
+    After a hello for a P2 of 'supported' returns a CompressedChannel over 'app_channel';
+    otherwise puts the message back (AppChannelV2.unread()) and returns 'app_channel' itself.
+    Raises BadPeer if the hello names a P2 which is not supported.
+    """
+    msg = await app_channel.read()
+    if bytes(msg[:len(HELLO)]) != HELLO:
+        app_channel.unread(msg)
+        return app_channel
+    p2 = bytes(msg[len(HELLO):])
+    if p2 not in supported:
+        raise BadPeer("client selected unsupported compression: {!r}".format(p2))
+    return CompressedChannel(app_channel, zdict=supported[p2], loop=loop, **kwargs)
+
+
+class CompressedChannel(ByteChannel, metaclass=util.Syncizer):
+    """Compresses messages written to and decompresses messages read from 'channel' (AppChannelV2).
+    level      - zlib compression level
+    zdict      - preset dictionary (bytes or CompressionDictionary), must be the same on both ends
+    dictionaries - further CompressionDictionary versions accepted from the peer
+    min_size   - smaller messages are sent raw
+    max_size   - larger decompressed messages are refused (BadPeer)
+    executor   - messages of at least 'executor_threshold' bytes are (de)compressed there,
+                 zlib releases the GIL while working
+    raw_bytes/wire_bytes count written messages before/after compression; they are updated
+    by write() on the event loop, compress() itself only computes (and may run in the executor).
+    """
+    FLAG_RAW = 0
+    FLAG_DEFLATE = 1
+    FLAG_DEFLATE_DICT = 2
+    FLAG_DEFLATE_DICT_ID = 3
+
+    MIN_SIZE = 32
+    MAX_SIZE = 1 << 20
+    EXECUTOR_THRESHOLD = 65536
+
+    def __init__(self, channel, level=6, zdict=None, min_size=MIN_SIZE, max_size=MAX_SIZE,
+                 executor=None, executor_threshold=EXECUTOR_THRESHOLD, loop=None, dictionaries=()):
+        super().__init__(loop=loop)
+        self.channel = channel
+        self.level = level
+        self.dictionaries = {d.dict_id: d.data for d in dictionaries}  # id -> data
+        if isinstance(zdict, CompressionDictionary):
+            self.dictionaries[zdict.dict_id] = zdict.data
+            self.dict_prefix = bytes([self.FLAG_DEFLATE_DICT_ID]) + CompressionDictionary.ID.pack(zdict.dict_id)
+            zdict = zdict.data
+        else:
+            self.dict_prefix = bytes([self.FLAG_DEFLATE_DICT])
+        self.zdict = zdict
+        self.min_size = min_size
+        self.max_size = max_size
+        self.executor = executor
+        self.executor_threshold = executor_threshold
+        self.raw_bytes = 0
+        self.wire_bytes = 0
+
+    @property
+    def last(self):
+        return self.channel.last
+
+    def pause_reading(self):
+        self.channel.pause_reading()
+
+    def resume_reading(self):
+        self.channel.resume_reading()
+
+    async def read(self):
+        raw = await self.channel.read()
+        if self.executor is not None and len(raw) >= self.executor_threshold:
+            return await self.loop.run_in_executor(self.executor, self.decompress, raw)
+        return self.decompress(raw)
+
+    async def write(self, message, *args, is_last=False):
+        msgs = (message,) + args
+        if self.executor is not None and any(len(msg) >= self.executor_threshold for msg in msgs):
+            packed = await asyncio.gather(*[self._compress_async(msg) for msg in msgs])
+        else:
+            packed = [self.compress(msg) for msg in msgs]
+        self.raw_bytes += sum(len(msg) for msg in msgs)
+        self.wire_bytes += sum(len(p) for p in packed)
+        await self.channel.write(*packed, is_last=is_last)
+
+    async def _compress_async(self, msg):
+        if len(msg) < self.executor_threshold:
+            return self.compress(msg)
+        return await self.loop.run_in_executor(self.executor, self.compress, msg)
+
+    def compress(self, msg):
+        """Returns 'msg' with flag byte, compressed if that pays off."""
+        packed = None
+        if len(msg) >= self.min_size:
+            if self.zdict:
+                c = zlib.compressobj(self.level, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=self.zdict)
+                prefix = self.dict_prefix
+            else:
+                c = zlib.compressobj(self.level, zlib.DEFLATED, -zlib.MAX_WBITS)
+                prefix = bytes([self.FLAG_DEFLATE])
+            body = c.compress(msg) + c.flush()
+            if len(prefix) + len(body) <= len(msg):
+                packed = prefix + body
+        if packed is None:
+            packed = bytes([self.FLAG_RAW]) + msg
+        return packed
+
+    def decompress(self, raw):
+        """Returns message from flag byte and body."""
+        if not raw:
+            raise BadPeer("empty compressed message")
+        flag = raw[0]
+        start = 1
+        if flag == self.FLAG_RAW:
+            return bytes(raw[1:])
+        if flag == self.FLAG_DEFLATE:
+            d = zlib.decompressobj(-zlib.MAX_WBITS)
+        elif flag == self.FLAG_DEFLATE_DICT and self.zdict:
+            d = zlib.decompressobj(-zlib.MAX_WBITS, zdict=self.zdict)
+        elif flag == self.FLAG_DEFLATE_DICT_ID and len(raw) >= 1 + CompressionDictionary.ID.size:
+            dict_id, = CompressionDictionary.ID.unpack_from(raw, 1)
+            if dict_id not in self.dictionaries:
+                raise BadPeer("unknown compression dictionary: {}".format(dict_id))
+            d = zlib.decompressobj(-zlib.MAX_WBITS, zdict=self.dictionaries[dict_id])
+            start += CompressionDictionary.ID.size
+        else:
+            raise BadPeer("unsupported compression flag: {}".format(flag))
+        try:
+            msg = d.decompress(memoryview(raw)[start:], self.max_size)
+        except zlib.error as e:
+            raise BadPeer("bad compressed message: {}".format(e))
+        if d.unconsumed_tail:
+            raise BadPeer("decompressed message larger than {} bytes".format(self.max_size))
+        if not d.eof:
+            raise BadPeer("truncated compressed message")
+        return msg
@@ -0,0 +1,145 @@
+"""Versioned zlib preset dictionaries for CompressedChannel, trained from captured app messages.
+
+    python -m saltchannel.v2.compression_dict mitm.log --size 4096 --id 3 --output readings-3.scd
+
+reads a MitmChannel log (the channel should decorate the AppChannelV2 level, so that the
+logged messages are clear app payloads), trains a dictionary and reports how well it does
+on the same messages. Load it on both ends with CompressionDictionary.load().
+"""
+import re
+import sys
+import heapq
+import struct
+import argparse
+from collections import Counter
+
+MITM_LOG_RE = re.compile(r"(?:MitmEventType\.)?(\w+), len\(msg\):(\d+), msg: b'([0-9a-f]*)'")
+
+
+class CompressionDictionary:
+    """zlib preset dictionary with an id. The id goes with every message compressed with it,
+    so peers can roll out a new version while still reading the old one.
+    """
+    MAGIC = b'SCZD'
+    HEADER = struct.Struct('<4sHI')  # magic, id, data size
+    ID = struct.Struct('<H')  # in-band id, see CompressedChannel.FLAG_DEFLATE_DICT_ID
+
+    def __init__(self, dict_id, data):
+        if not 0 < dict_id <= 0xffff:
+            raise ValueError("dictionary id out of range: {}".format(dict_id))
+        self.dict_id = dict_id
+        self.data = bytes(data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return '<CompressionDictionary id={} size={}>'.format(self.dict_id, len(self.data))
+
+    def to_bytes(self):
+        return self.HEADER.pack(self.MAGIC, self.dict_id, len(self.data)) + self.data
+
+    @classmethod
+    def from_bytes(cls, raw):
+        if len(raw) < cls.HEADER.size:
+            raise ValueError("not a compression dictionary")
+        magic, dict_id, size = cls.HEADER.unpack_from(raw)
+        if magic != cls.MAGIC or len(raw) != cls.HEADER.size + size:
+            raise ValueError("not a compression dictionary")
+        return cls(dict_id, raw[cls.HEADER.size:])
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+
+def samples_from_mitm_log(lines, types=('READ', 'WRITE', 'WRITE_WITH_PREVIOUS')):
+    """Yields messages of event 'types' from MitmChannel log lines."""
+    for line in lines:
+        m = MITM_LOG_RE.search(line)
+        if m and m.group(1) in types:
+            msg = bytes.fromhex(m.group(3))
+            if len(msg) == int(m.group(2)):
+                yield msg
+
+
+def _kmers(seg, k):
+    return {seg[i:i + k] for i in range(len(seg) - k + 1)}
+
+
+def train_dictionary(samples, size=4096, dict_id=1, k=6, segment=48, max_samples=20000):
+    """Returns CompressionDictionary of at most 'size' bytes built from 'samples' (iterable of bytes).
+    Segments of 'segment' bytes are scored by how many other samples share their 'k' byte n-grams
+    and picked greedily; n-grams already covered by a picked segment no longer count.
+    The most valuable segments go to the end, where deflate reaches them with the shortest distances.
+    """
+    samples = [bytes(s) for s in samples if len(s) >= k][:max_samples]
+    freq = Counter()
+    for s in samples:
+        freq.update(_kmers(s, k))
+
+    def score(seg):
+        return sum(freq[kmer] - 1 for kmer in _kmers(seg, k))  # n-grams of one sample do not help
+
+    candidates = set()
+    step = max(1, segment // 2)
+    for s in samples:
+        for start in range(0, max(1, len(s) - segment + step), step):
+            candidates.add(s[start:start + segment])
+    heap = [(-score(seg), seg) for seg in candidates]
+    heapq.heapify(heap)
+
+    chosen, total = [], 0
+    while heap and total < size:
+        _, seg = heapq.heappop(heap)
+        current = score(seg)  # lazy greedy: scores only go down as n-grams get covered
+        if current <= 0:
+            continue
+        if heap and current < -heap[0][0]:
+            heapq.heappush(heap, (-current, seg))
+            continue
+        chosen.append(seg)
+        total += len(seg)
+        for kmer in _kmers(seg, k):
+            freq[kmer] = 1
+    return CompressionDictionary(dict_id, b''.join(reversed(chosen))[-size:])
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m saltchannel.v2.compression_dict',
+                                     description='Train a compression dictionary from MitmChannel logs.')
+    parser.add_argument('logs', nargs='+', metavar='LOG')
+    parser.add_argument('--output', '-o', required=True, metavar='FILE')
+    parser.add_argument('--id', type=int, default=1, help='dictionary id (version), 1..65535')
+    parser.add_argument('--size', type=int, default=4096, help='dictionary size, bytes')
+    parser.add_argument('--level', type=int, default=6, help='zlib level for the report')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from ..bench.compression import CompressionBench
+    from . import compression_dict  # not __main__, CompressedChannel checks for its CompressionDictionary
+
+    args = parse_args(argv)
+    samples = []
+    for path in args.logs:
+        with open(path, errors='replace') as f:
+            samples.extend(samples_from_mitm_log(f))
+    if not samples:
+        print("no messages found", file=sys.stderr)
+        return 1
+    zdict = compression_dict.train_dictionary(samples, size=args.size, dict_id=args.id)
+    zdict.save(args.output)
+    print("{} messages, dictionary id {} of {} bytes written to {}".format(
+        len(samples), zdict.dict_id, len(zdict), args.output))
+    CompressionBench(samples, zdict, level=args.level).print_report()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,3 +1,5 @@
+import asyncio
+from collections import deque
 from enum import Enum
 
 from ..saltlib import SaltLib
@@ -32,53 +34,193 @@ class Nonce:
         return b''.join([self.value.to_bytes(8, 'little'), self.session_nonce, bytes(8)])
 
 
+def split_chunks(jobs, chunk_size):
+    """Splits list of (data, nonce) into contiguous lists of at least 'chunk_size' data bytes (but the last)."""
+    chunks, chunk, size = [], [], 0
+    for job in jobs:
+        chunk.append(job)
+        size += len(job[0])
+        if size >= chunk_size:
+            chunks.append(chunk)
+            chunk, size = [], 0
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
 class EncryptedChannelV2(ByteChannel):
     """An implementation of an encrypted channel using a shared symmetric session key.
     The read/write methods throws ComException for low-level IO errors
     and BadPeer if the data format is not OK or if the data is not
     encrypted properly.
     Asyncio-friendly implementation
+
+    With an 'executor' (e.g. ThreadPoolExecutor), read() takes all frames already received
+    from the channel at once and, if they hold at least 'parallel_threshold' bytes, decrypts
+    them concurrently in chunks of 'parallel_chunk' bytes. Nonces follow from the message order,
+    so messages are still returned in order. Libsodium releases the GIL while decrypting.
+    write() does the same for messages to send: nonces are assigned up front, chunks are
+    encrypted in the executor and all frames go out in nonce order with one channel write.
     """
-    def __init__(self, channel, key, role, session_nonce=bytes(TTPacket.SESSION_NONCE_SIZE), loop=None):
+    PARALLEL_THRESHOLD = 65536
+    PARALLEL_CHUNK = 16384
+
+    def __init__(self, channel, key, role, session_nonce=bytes(TTPacket.SESSION_NONCE_SIZE), loop=None,
+                 executor=None, parallel_threshold=PARALLEL_THRESHOLD, parallel_chunk=PARALLEL_CHUNK):
         super().__init__(loop=loop)
-        self.saltlib = SaltLib().getLib()  # refactor to self.salt ?
+        self._init_state(channel, key, role, session_nonce)
+        self.executor = executor
+        self.parallel_threshold = parallel_threshold
+        self.parallel_chunk = parallel_chunk
+        self.write_lock = asyncio.Lock()  # frames of concurrent writes must not overtake each other
+
+    def _init_state(self, channel, key, role, session_nonce):
+        self.saltlib = SaltLib().api  # refactor to self.salt ?
 
         if len(key) != self.saltlib.crypto_box_SECRETKEYBYTES:
             raise ValueError("bad key size, should be " + self.saltlib.crypto_box_SECRETKEYBYTES)
 
         self.key = key
+        self.role = role
+        self.session_nonce = session_nonce
         self.channel = channel
         self.pushback_msg = b''  # used for Resume feature when happens just read chunk is encrypted
         self.last_flag = False   # LastFlag from EncryptedPacket obtained in last unwrap call
+        self.readQ = deque()  # (clear, last_flag) decrypted ahead by read()
+        self.readQ_bytes = 0
+        self.executor = None
 
         self.read_nonce = Nonce(NonceType.READ, session_nonce, value= 2 if role == Role.CLIENT else 1)
         self.write_nonce = Nonce(NonceType.WRITE, session_nonce, value= 1 if role == Role.CLIENT else 2)
 
+    def pause_reading(self):
+        self.channel.pause_reading()
+
+    def resume_reading(self):
+        self.channel.resume_reading()
+
+    @property
+    def read_ahead(self):
+        """(messages, bytes) decrypted ahead and not read yet."""
+        return len(self.readQ), self.readQ_bytes
+
+    def export_state(self):
+        """Returns everything needed to continue this session elsewhere, see import_state().
+        Messages decrypted ahead must have been read first.
+        """
+        if self.readQ or self.pushback_msg:
+            raise ValueError("unread messages pending, read them before exporting state")
+        return {
+            'key': self.key.hex(),
+            'role': self.role.name,
+            'session_nonce': self.session_nonce.hex(),
+            'read_nonce': self.read_nonce.value,
+            'write_nonce': self.write_nonce.value,
+            'last_flag': self.last_flag,
+        }
+
+    @classmethod
+    def import_state(cls, channel, state, **kwargs):
+        """Returns channel on top of 'channel' continuing a session from export_state(); no handshake needed."""
+        enc_channel = cls(channel, bytes.fromhex(state['key']), Role[state['role']],
+                          session_nonce=bytes.fromhex(state['session_nonce']), **kwargs)
+        enc_channel.read_nonce.value = state['read_nonce']
+        enc_channel.write_nonce.value = state['write_nonce']
+        enc_channel.last_flag = state['last_flag']
+        return enc_channel
+
     async def read(self):
+        if self.readQ:
+            return self._pop()
         if self.pushback_msg:
             raw = self.pushback_msg
             self.pushback_msg = None
-        else:
-            raw = await self.channel.read()
+            return self.open(raw)
+        if self.executor is None:
+            return self.open(await self.channel.read())
+
+        raws = await self.channel.read_available()
+        if len(raws) == 1:
+            return self.open(raws[0])
+        opened = await self.open_many(raws)
+        self.readQ.extend(opened)
+        self.readQ_bytes += sum(len(clear) for clear, _ in opened)
+        return self._pop()
+
+    def _pop(self):
+        clear, self.last_flag = self.readQ.popleft()
+        self.readQ_bytes -= len(clear)
+        return clear
+
+    async def write(self, message, *args, is_last=False):
+        if self.executor is None:
+            msg_list = self.seal((message,) + args, is_last=is_last)
+            await self.channel.write(msg_list[0], *msg_list[1:], is_last=is_last)
+            return
+
+        async with self.write_lock:
+            msg_list = await self.seal_many((message,) + args, is_last=is_last)
+            await self.channel.write(msg_list[0], *msg_list[1:], is_last=is_last)
 
+    def open(self, raw):
+        """Unwraps and decrypts one EncryptedPacket, advances the read nonce."""
         clear = self.decrypt(self.unwrap(raw))
         self.read_nonce.advance()
         return clear
 
-    async def write(self, message, *args, is_last=False):
-        msgs = (message,) + args
+    async def open_many(self, raws):
+        """Unwraps and decrypts EncryptedPackets in order, advances the read nonce;
+        returns list of (clear, last_flag). Large batches are decrypted in the executor.
+        """
+        jobs, flags = [], []
+        for raw in raws:
+            jobs.append((self.unwrap(raw), bytes(self.read_nonce)))
+            flags.append(self.last_flag)
+            self.read_nonce.advance()
+
+        if self.executor is None or sum(len(body) for body, _ in jobs) < self.parallel_threshold:
+            clears = self._decrypt_chunk(jobs)
+        else:
+            chunks = await asyncio.gather(*[self.loop.run_in_executor(self.executor, self._decrypt_chunk, chunk)
+                                            for chunk in split_chunks(jobs, self.parallel_chunk)])
+            clears = [clear for chunk in chunks for clear in chunk]
+        return list(zip(clears, flags))
+
+    def _decrypt_chunk(self, jobs):
+        return [self.decrypt(body, nonce) for body, nonce in jobs]
+
+    def seal(self, msgs, is_last=False):
+        """Encrypts and wraps 'msgs', advances the write nonce; returns list of EncryptedPacket bytes."""
         msg_list = []
         for i, msg in enumerate(msgs):
             msg_list.append(self.wrap(self.encrypt(msg), is_last=(is_last and int(i) == len(msgs)-1)))
             self.write_nonce.advance()
-        await self.channel.write(msg_list[0], *msg_list[1:], is_last=is_last)
+        return msg_list
+
+    async def seal_many(self, msgs, is_last=False):
+        """Like seal(), but batches of at least 'parallel_threshold' bytes are encrypted in the executor."""
+        if self.executor is None or sum(len(msg) for msg in msgs) < self.parallel_threshold:
+            return self.seal(msgs, is_last=is_last)
+
+        jobs = []
+        for msg in msgs:
+            jobs.append((msg, bytes(self.write_nonce)))
+            self.write_nonce.advance()
+        chunks = await asyncio.gather(*[self.loop.run_in_executor(self.executor, self._encrypt_chunk, chunk)
+                                        for chunk in split_chunks(jobs, self.parallel_chunk)])
+        encrypted = [body for chunk in chunks for body in chunk]
+        last = len(encrypted) - 1
+        return [self.wrap(body, is_last=(is_last and i == last)) for i, body in enumerate(encrypted)]
+
+    def _encrypt_chunk(self, jobs):
+        return [self.encrypt(msg, nonce) for msg, nonce in jobs]
 
-    def encrypt(self, clear):
-        return self.saltlib.crypto_box_afternm(clear, bytes(self.write_nonce), self.key)
+    def encrypt(self, clear, nonce=None):
+        return self.saltlib.crypto_box_afternm(clear, nonce or bytes(self.write_nonce), self.key)
 
-    def decrypt(self, encrypted):
+    def decrypt(self, encrypted, nonce=None):
         try:
-            return self.saltlib.crypto_box_open_afternm(encrypted, bytes(self.read_nonce), self.key)
+            return self.saltlib.crypto_box_open_afternm(encrypted, nonce or bytes(self.read_nonce), self.key)
         except BadEncryptedDataException:
             raise BadPeer("invalid ciphertext, could not be decrypted")
 
@@ -95,3 +237,24 @@ class EncryptedChannelV2(ByteChannel):
         self.last_flag = bool(ep.data.Header.LastFlag)
         return ep.Body
 
+
+
+class EncryptedChannelV2Sync(EncryptedChannelV2):
+    """Blocking EncryptedChannelV2 on top of a channel with read_sync()/write_sync(), e.g. SocketChannel.
+    Never touches an event loop.
+    """
+    def __init__(self, channel, key, role, session_nonce=bytes(TTPacket.SESSION_NONCE_SIZE)):
+        self.loop = None
+        self._init_state(channel, key, role, session_nonce)
+
+    def read_sync(self):
+        if self.pushback_msg:
+            raw = self.pushback_msg
+            self.pushback_msg = None
+        else:
+            raw = self.channel.read_sync()
+        return self.open(raw)
+
+    def write_sync(self, message, *args, is_last=False):
+        msg_list = self.seal((message,) + args, is_last=is_last)
+        self.channel.write_sync(msg_list[0], *msg_list[1:], is_last=is_last)
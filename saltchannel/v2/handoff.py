@@ -0,0 +1,96 @@
+"""Moving an established session to another process without a new handshake.
+The socket is passed over a Unix domain socket (SCM_RIGHTS) together with the session state
+and any bytes already received but not yet read.
+
+    # acceptor, after handshake
+    handoff = await detach(session.app_channel)
+    send_handoff(unix_sock, handoff)
+
+    # worker
+    app_channel = await attach(recv_handoff(unix_sock), loop=loop)
+
+Use a SOCK_SEQPACKET Unix socket (e.g. socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)),
+so that every handoff is one message.
+"""
+import os
+import json
+import socket
+
+from ..channel import AsyncioChannel
+from ..util.time import NullTimeChecker, NullTimeKeeper
+from ..streams import SaltChannelStreamReader, SaltChannelStreamWriter, SaltChannelStreamReaderProtocol
+from .app_channel_v2 import AppChannelV2
+
+MAX_HANDOFF_SIZE = 256 * 1024
+
+
+class Handoff:
+    """Established session: socket file descriptor, exported state and received unread bytes."""
+    def __init__(self, fd, state, buffered=b''):
+        self.fd = fd
+        self.state = state
+        self.buffered = buffered
+
+    def to_bytes(self):
+        return json.dumps({'state': self.state, 'buffered': self.buffered.hex()}).encode()
+
+    @classmethod
+    def from_bytes(cls, fd, data):
+        d = json.loads(data.decode())
+        return cls(fd, d['state'], bytes.fromhex(d['buffered']))
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+async def detach(app_channel):
+    """Detaches AppChannelV2 running over AsyncioChannel from this process' event loop.
+    Pending writes are flushed, the channel must not be used anymore. Returns Handoff
+    owning a duplicate of the socket.
+    """
+    state = app_channel.export_state()
+    clear_channel = app_channel.channel.channel
+    if not isinstance(clear_channel, AsyncioChannel):
+        raise ValueError("only sessions over AsyncioChannel can be handed off")
+    reader, writer = clear_channel.reader, clear_channel.writer
+    transport = writer.transport
+    transport.set_write_buffer_limits(0)  # drain() returns only once everything is sent
+    await writer.drain()
+    transport.pause_reading()  # nothing more goes into the reader buffer
+    buffered = bytes(reader._buffer)
+    fd = os.dup(transport.get_extra_info('socket').fileno())
+    transport.abort()  # closes our descriptor only, the peer keeps the connection
+    return Handoff(fd, state, buffered)
+
+
+async def attach(handoff, loop, time_keeper=None, time_checker=None):
+    """Returns AppChannelV2 continuing the handed off session on 'loop'; takes over handoff.fd."""
+    sock = socket.socket(fileno=handoff.fd)
+    handoff.fd = None
+    reader = SaltChannelStreamReader(loop=loop)
+    reader.feed_data(handoff.buffered)  # before the transport may deliver anything newer
+    protocol = SaltChannelStreamReaderProtocol(reader, loop=loop)
+    transport, _ = await loop.create_connection(lambda: protocol, sock=sock)
+    writer = SaltChannelStreamWriter(transport, protocol, reader, loop)
+    channel = AsyncioChannel(reader, writer, loop=loop)
+    return AppChannelV2.import_state(channel, handoff.state, time_keeper or NullTimeKeeper(),
+                                     time_checker or NullTimeChecker(), loop=loop)
+
+
+def send_handoff(unix_sock, handoff):
+    """Sends 'handoff' with its socket over Unix domain socket; closes our copy of the socket."""
+    data = handoff.to_bytes()
+    if len(data) > MAX_HANDOFF_SIZE:
+        raise ValueError("handoff too large: {} bytes".format(len(data)))
+    socket.send_fds(unix_sock, [data], [handoff.fd])
+    handoff.close()
+
+
+def recv_handoff(unix_sock):
+    """Receives Handoff sent by send_handoff(); blocking."""
+    data, fds, _, _ = socket.recv_fds(unix_sock, MAX_HANDOFF_SIZE, 1)
+    if not fds:
+        raise EOFError("no session received")
+    return Handoff.from_bytes(fds[0], data)
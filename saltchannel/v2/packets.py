@@ -263,6 +263,7 @@ class AppPacket(Packet):
 class MultiAppPacket(Packet):
     TYPE = PacketType.TYPE_MULTIAPP_PACKET.value
     MAX_SIZE = 65535
+    LENGTH = struct.Struct('<H')  # message length field
 
     class _MultiAppPacketBody(SmartStructure):
         class _MultiAppPacketHeader(SmartStructure):
@@ -275,7 +276,57 @@ class MultiAppPacket(Packet):
                     ('Time', c_uint32),
                     ('Count', c_uint16)]
 
-    def _opt_factory(self, body=None, msgs=None):  # msgs is dict of bytearrays
+    class _MultiAppPacketBodyOpt:
+        """Messages with their encoded size (length fields included), kept up to date by append()."""
+        def __init__(self, msgs=None):
+            self.Message = list(msgs) if msgs else []
+            self.nbytes = MultiAppPacket.LENGTH.size * len(self.Message) + sum(map(len, self.Message))
+
+        def append(self, msg):
+            self.Message.append(msg)
+            self.nbytes += MultiAppPacket.LENGTH.size + len(msg)
+
+        def from_bytes(self, src, count=None, validate=True, zero_copy=False):
+            """Splits 'src' into 'count' messages, checking every length field on the way.
+            With zero_copy the messages are memoryview slices of 'src' (.tobytes() copies one out).
+            """
+            self.Message = []
+            self.nbytes = 0
+            if not count:
+                return
+            view = memoryview(src) if zero_copy else src
+            unpack_from = MultiAppPacket.LENGTH.unpack_from
+            append = self.Message.append
+            end = len(src)
+            offset = 0
+            for _ in range(count):
+                start = offset + 2
+                if start > end:
+                    raise BadPeer("MultiAppPacket truncated, {} of {} messages".format(len(self.Message), count))
+                offset = start + unpack_from(src, offset)[0]
+                if offset > end:
+                    raise BadPeer("MultiAppPacket truncated, message {} needs {} bytes, {} left"
+                                  .format(len(self.Message), offset - start, end - start))
+                append(view[start:offset])
+            self.nbytes = offset
+
+        def parts(self, head=b''):
+            """Returns list of 'head' followed by length fields and messages, interleaved."""
+            parts = [head] * (2 * len(self.Message) + 1)
+            parts[1::2] = map(MultiAppPacket.LENGTH.pack, map(len, self.Message))
+            parts[2::2] = self.Message
+            return parts
+
+        def __bytes__(self):
+            return b''.join(self.parts())
+
+        def __sizeof__(self):
+            return self.nbytes
+
+        def __len__(self):
+            return self.nbytes
+
+    def _opt_factory(self, body=None, msgs=None):  # msgs is list of bytes-like messages
         if not body:
             return Packet._EmptyBodyOpt()
 
@@ -283,52 +334,39 @@ class MultiAppPacket(Packet):
             if len(msgs) < 1:
                 raise BadPeer("'Count' field size requested is too small: ", len(msgs))
 
-        class _MultiAppPacketBodyOpt:
-            def __init__(self, msgs=None):
-                self.Message = msgs
+        return MultiAppPacket._MultiAppPacketBodyOpt(msgs=msgs)
 
-            def from_bytes(self, src, count=None, validate=True):
-                self.Message = []
-                if not count:
-                    return
-                # deserialize manually now
-                cnt = offset = 0
-                while cnt < count:
-                    length_field = c_uint16.from_buffer_copy(src, offset)
-                    offset += sizeof(c_uint16)
-                    self.Message.append(src[offset:offset+length_field.value])
-                    offset += length_field.value
-                    cnt += 1
-
-            def __bytes__(self):
-                raw = bytearray()
-                for msg in self.Message:
-                    raw.extend(b''.join([c_uint16(len(msg)), bytes(msg)]))
-                return bytes(raw)
-
-            def __sizeof__(self):
-                return len(bytes(self))
-
-            def __len__(self):
-                return len(bytes(self))
-
-        return _MultiAppPacketBodyOpt(msgs=msgs)
-
-
-    def __init__(self, src_buf=None, validate=True):
+    def __init__(self, src_buf=None, validate=True, zero_copy=False):
         super().__init__()
         self.data = MultiAppPacket._MultiAppPacketBody()
         self.data.Header.PacketType = type(self).TYPE
         if src_buf:
-            self.from_bytes(src_buf, validate=validate)
+            self.from_bytes(src_buf, validate=validate, zero_copy=zero_copy)
 
-    def from_bytes(self, src, validate=True):
+    def from_bytes(self, src, validate=True, zero_copy=False):
+        """With zero_copy opt.Message holds memoryview slices of 'src' instead of copies;
+        'src' must then stay unchanged while they are in use.
+        """
         self.data.from_bytes(src)
         self.opt = self._opt_factory(body=src, msgs=None)
-        self.opt.from_bytes(src[self.data.size:], count=self.data.Count)
+        body = memoryview(src)[self.data.size:] if zero_copy else src[self.data.size:]
+        self.opt.from_bytes(body, count=self.data.Count, zero_copy=zero_copy)
         if validate:
             self.validate()
 
+    def append(self, msg):
+        """Adds 'msg', updating Count and size."""
+        if not isinstance(self.opt, MultiAppPacket._MultiAppPacketBodyOpt):
+            self.create_opt_fields(msgs=None)
+        self.opt.append(msg)
+        self.data.Count += 1
+
+    def __bytes__(self):
+        """One join: the output is allocated once at its final size and every message copied once."""
+        if not isinstance(self.opt, MultiAppPacket._MultiAppPacketBodyOpt):
+            return bytes(self.data)
+        return b''.join(self.opt.parts(head=bytes(self.data)))
+
     def validate(self):
         super().validate()
         if self.data.Count < 1:
@@ -1,13 +1,16 @@
 import asyncio
+import time
+
 from ..saltlib import SaltLib
 from ..saltlib.saltlib_base import SaltLibBase
 import saltchannel.util as util
 from ..util.time import NullTimeChecker, NullTimeKeeper
+from ..util.metrics import NullMetrics
 from . import packets
 
 import saltchannel.saltlib.exceptions
-from .encrypted_channel_v2 import EncryptedChannelV2, Role
-from .app_channel_v2 import AppChannelV2
+from .encrypted_channel_v2 import EncryptedChannelV2, EncryptedChannelV2Sync, Role
+from .app_channel_v2 import AppChannelV2, AppChannelV2Sync
 
 
 class SaltClientSession(metaclass=util.Syncizer):
@@ -15,8 +18,10 @@ class SaltClientSession(metaclass=util.Syncizer):
     Asyncio-based implementation
     """
     def __init__(self, sig_keypair, clear_channel, loop=None):
-        self.loop = loop or asyncio.get_event_loop()
+        self.loop = util.force_event_loop(loop=loop)
+        self._init_session(sig_keypair, clear_channel)
 
+    def _init_session(self, sig_keypair, clear_channel):
         self.saltlib = SaltLib()
         self.sig_keypair = sig_keypair
 
@@ -26,6 +31,7 @@ class SaltClientSession(metaclass=util.Syncizer):
 
         self.time_keeper = NullTimeKeeper()  # singleton
         self.time_checker = NullTimeChecker()  # singleton
+        self.metrics = NullMetrics()  # singleton
 
         self.session_key = b''
 
@@ -40,35 +46,81 @@ class SaltClientSession(metaclass=util.Syncizer):
         self.m3 = None
         self.m4 = None
 
+        self.stage_times = {}  # per-stage durations of the last handshake, seconds
+        self.io_wait = 0.0  # time spent waiting for peer data during the last handshake, seconds
+
     async def handshake(self):
         self.validate()
+        self.stage_times = {}
+        self.io_wait = 0.0
+        t_start = time.perf_counter()
+        try:
+            await self._handshake()
+        except saltchannel.exceptions.ComException as e:
+            self.metrics.count_failure(e)
+            raise
+        self._record('io_wait', self.io_wait)
+        self._record('handshake', time.perf_counter() - t_start)
+
+    async def _handshake(self):
+        t0 = time.perf_counter()
         await self.do_m1()
+        t0 = self._stage_done('m1', t0)
 
         (success, recv_chunk) = await self.do_m2()
+        t0 = self._stage_done('m2', t0)
         if not success:
             return
 
         self.create_encrypted_channel()
+        t0 = self._stage_done('key_agreement', t0)
         await self.do_m3()
+        t0 = self._stage_done('m3', t0)
         self.validate_signature1()
+        t0 = self._stage_done('m3_verify', t0)
         await self.do_m4()
+        self._stage_done('m4', t0)
+
+    def _stage_done(self, stage, t0):
+        t1 = time.perf_counter()
+        self._record(stage, t1 - t0)
+        return t1
+
+    def _record(self, stage, seconds):
+        self.stage_times[stage] = seconds
+        self.metrics.record(stage, seconds)
+
+    async def _read(self, channel):
+        t0 = time.perf_counter()
+        data = await channel.read()
+        self.io_wait += time.perf_counter() - t0
+        return data
 
     async def do_m1(self):
         """Creates and writes M1 message."""
+        await self.clear_channel.write(self.create_m1())
+
+    def create_m1(self):
+        """Returns raw M1 message, keeps its hash."""
         self.m1 = packets.M1Packet()
+        if self.wanted_server_sig_key:
+            self.m1.data.Header.ServerSigKeyIncluded = 1
         self.m1.create_opt_fields()
+        if self.wanted_server_sig_key:
+            self.m1.ServerSigKey = self.wanted_server_sig_key
         self.m1.data.Time = self.time_keeper.get_first_time()
         self.m1.ClientEncKey = self.enc_keypair.pub
 
         m1_raw = bytes(self.m1)
         self.m1_hash = self.saltlib.sha512(m1_raw)
-
-        await self.clear_channel.write(m1_raw)
-
+        return m1_raw
 
     async def do_m2(self):
         """Read m2 with fallback to raw chunk if no M2 packet type detected in Header."""
-        clear_chunk = await self.clear_channel.read()
+        clear_chunk = await self._read(self.clear_channel)
+        return self.process_m2(clear_chunk)
+
+    def process_m2(self, clear_chunk):
         self.m2 = packets.M2Packet(src_buf=clear_chunk)
         if self.m2.data.Header.PacketType != packets.PacketType.TYPE_M2.value:
             self.m2 = None
@@ -83,23 +135,29 @@ class SaltClientSession(metaclass=util.Syncizer):
         return (True, None)
 
     async def do_m3(self):
-        chunk = await self.enc_channel.read()
+        self.process_m3(await self._read(self.enc_channel))
+
+    def process_m3(self, chunk):
         assert(len(chunk) == 2+4+32+64)
         self.m3 = packets.M3Packet(src_buf=chunk)
         self.time_checker.check_time(self.m3.data.Time)
+        if self.wanted_server_sig_key and self.m3.ServerSigKey != self.wanted_server_sig_key:
+            raise saltchannel.exceptions.BadPeer("unexpected server signing key")
 
     async def do_m4(self):
+        self.create_m4()
+        if self.buffer_M4:
+            self.app_channel.buffered_m4 = self.m4
+        else:
+            await self.enc_channel.write(bytes(self.m4))
+
+    def create_m4(self):
         self.m4 = packets.M4Packet()
         self.m4.data.Time = self.time_keeper.get_time()
         self.m4.ClientSigKey = self.sig_keypair.pub
         self.m4.Signature2 = self.saltlib.sign(b''.join([packets.M4Packet.SIG2_PREFIX,self.m1_hash, self.m2_hash]),
                                                self.sig_keypair.sec)[:SaltLibBase.crypto_sign_BYTES]
 
-        if self.buffer_M4:
-            self.app_channel.buffered_m4 = self.m4
-        else:
-            await self.enc_channel.write(bytes(self.m4))
-
     def validate_signature1(self):
         """Validates M3/Signature1."""
         try:
@@ -109,11 +167,59 @@ class SaltClientSession(metaclass=util.Syncizer):
             raise saltchannel.exceptions.BadPeer("invalid signature")
 
     def create_encrypted_channel(self):
+        self.compute_session_key()
+        self.enc_channel = EncryptedChannelV2(self.clear_channel, self.session_key, Role.CLIENT, loop=self.loop)
+        self.app_channel = AppChannelV2(self.enc_channel, self.time_keeper, self.time_checker, loop=self.loop)
+
+    def compute_session_key(self):
         self.session_key = self.saltlib.compute_shared_key(self.enc_keypair.sec, self.m2.ServerEncKey)
-        self.enc_channel = EncryptedChannelV2(self.clear_channel, self.session_key, Role.CLIENT)
-        self.app_channel = AppChannelV2(self.enc_channel, self.time_keeper, self.time_checker)
 
     def validate(self):
         """Check if current instance's state is valid for handshake to start"""
         if not self.enc_keypair:
-            raise ValueError("'enc_keypair' must be set before calling handshake()")
\ No newline at end of file
+            raise ValueError("'enc_keypair' must be set before calling handshake()")
+
+
+class SaltClientSessionSync(SaltClientSession):
+    """Blocking client session over a channel with read_sync()/write_sync(), e.g. SocketChannel.
+    Handshake and the resulting app_channel (AppChannelV2Sync) never touch an event loop.
+    Only handshake_sync() is available.
+    """
+    def __init__(self, sig_keypair, clear_channel):
+        self.loop = None
+        self._init_session(sig_keypair, clear_channel)
+
+    def handshake_sync(self):
+        self.validate()
+        self.stage_times = {}
+        self.io_wait = 0.0
+        t_start = time.perf_counter()
+        try:
+            self.clear_channel.write_sync(self.create_m1())
+            (success, recv_chunk) = self.process_m2(self._read_sync(self.clear_channel))
+            if not success:
+                return
+            self.create_encrypted_channel()
+            self.process_m3(self._read_sync(self.enc_channel))
+            self.validate_signature1()
+            self.create_m4()
+            if self.buffer_M4:
+                self.app_channel.buffered_m4 = self.m4
+            else:
+                self.enc_channel.write_sync(bytes(self.m4))
+        except saltchannel.exceptions.ComException as e:
+            self.metrics.count_failure(e)
+            raise
+        self._record('io_wait', self.io_wait)
+        self._record('handshake', time.perf_counter() - t_start)
+
+    def _read_sync(self, channel):
+        t0 = time.perf_counter()
+        data = channel.read_sync()
+        self.io_wait += time.perf_counter() - t0
+        return data
+
+    def create_encrypted_channel(self):
+        self.compute_session_key()
+        self.enc_channel = EncryptedChannelV2Sync(self.clear_channel, self.session_key, Role.CLIENT)
+        self.app_channel = AppChannelV2Sync(self.enc_channel, self.time_keeper, self.time_checker)
@@ -1,8 +1,10 @@
 import asyncio
+import time
 
 from ..saltlib import SaltLib
 from ..saltlib.saltlib_base import SaltLibBase
 from ..util.time import NullTimeChecker, NullTimeKeeper
+from ..util.metrics import NullMetrics
 from .packets import *
 from saltchannel.a1a2.packets import *
 import saltchannel.util as util
@@ -10,6 +12,7 @@ import saltchannel.util as util
 import saltchannel.saltlib.exceptions
 from .encrypted_channel_v2 import EncryptedChannelV2, Role
 from .app_channel_v2 import AppChannelV2
+from . import static_packets
 
 
 class SaltServerSession(metaclass=util.Syncizer):
@@ -17,11 +20,15 @@ class SaltServerSession(metaclass=util.Syncizer):
     Asyncio-based implementation
     """
 
-    def __init__(self, sig_keypair, clear_channel, loop=None):
+    def __init__(self, sig_keypair, clear_channel, loop=None, identities=None):
+        """identities - optional ServerIdentityRegistry; the session then answers for each of its
+                     identities and sig_keypair (default: identities.default) is selected by M1/A1.
+        """
         self.loop = util.force_event_loop(loop=loop)
         
         self.saltlib = SaltLib()
-        self.sig_keypair = sig_keypair
+        self.identities = identities
+        self.sig_keypair = sig_keypair or (identities.default if identities is not None else None)
 
         self.clear_channel = clear_channel
         self.app_channel = None  # AppChannelV2
@@ -29,6 +36,7 @@ class SaltServerSession(metaclass=util.Syncizer):
 
         self.time_keeper = NullTimeKeeper()  # singleton
         self.time_checker = NullTimeChecker()  # singleton
+        self.metrics = NullMetrics()  # singleton
 
         self.enc_keypair = None
 
@@ -37,19 +45,54 @@ class SaltServerSession(metaclass=util.Syncizer):
         self.m2 = None
         self.m2_hash = b''
         self.m4 = None
-        self.a2 = None
+        self._a2 = None
+        self._a2_raw = None
 
         self.is_done = False
 
-        self.buffer_m2 = False
+        self.buffer_m2 = True  # send M2 and M3 with a single write
+        self.sign_executor = None  # if set, Signature1 is computed there while key agreement runs
+        self.signature1 = None
         self.client_sig_key = None
+        self.stage_times = {}  # per-stage durations of the last handshake, seconds
+        self.io_wait = 0.0  # time spent waiting for peer data during the last handshake, seconds
+
+    @property
+    def a2(self):
+        return self._a2
+
+    @a2.setter
+    def a2(self, a2):
+        """A2Packet or its serialized bytes; pass bytes serialized once to share them among sessions."""
+        self._a2 = a2
+        self._a2_raw = None  # serialized on use, so that the packet may still be modified
+
+    def a2_bytes(self):
+        if self._a2_raw is None and self._a2:
+            self._a2_raw = bytes(self._a2)
+        return self._a2_raw
 
     async def handshake(self):
         self.validate()
+        self.stage_times = {}
+        self.io_wait = 0.0
+        t_start = time.perf_counter()
+        try:
+            await self._handshake()
+        except saltchannel.exceptions.ComException as e:
+            self.metrics.count_failure(e)
+            raise
+        self._record('io_wait', self.io_wait)
+        self._record('handshake', time.perf_counter() - t_start)
+
+    async def _handshake(self):
+        t0 = time.perf_counter()
         (valid_m1, resumed, recv_chunk) = await self.do_m1()
+        t0 = self._stage_done('m1', t0)
 
         if not valid_m1:
             await self.do_a2(recv_chunk)
+            self._stage_done('a2', t0)
             self.is_done = True
             return
 
@@ -59,26 +102,55 @@ class SaltServerSession(metaclass=util.Syncizer):
             return
 
         await self.do_m2()
+        t0 = self._stage_done('m2', t0)
         self.create_encrypted_channel()
+        t0 = self._stage_done('key_agreement', t0)
 
         await self.do_m3()
+        t0 = self._stage_done('m3', t0)
         await self.do_m4()
+        t0 = self._stage_done('m4', t0)
         self.validate_signature2()
+        self._stage_done('m4_verify', t0)
+
+    def _stage_done(self, stage, t0):
+        t1 = time.perf_counter()
+        self._record(stage, t1 - t0)
+        return t1
+
+    def _record(self, stage, seconds):
+        self.stage_times[stage] = seconds
+        self.metrics.record(stage, seconds)
+
+    async def _read(self, channel):
+        t0 = time.perf_counter()
+        data = await channel.read()
+        self.io_wait += time.perf_counter() - t0
+        return data
+
+    def find_identity(self, pub):
+        """Returns signing KeyPair this server answers for with public key 'pub' or None."""
+        if self.identities is not None:
+            return self.identities.get(pub)
+        return self.sig_keypair if self.sig_keypair and pub == self.sig_keypair.pub else None
 
     async def do_a2(self, data_chunk):
         a1 = A1Packet(src_buf=data_chunk)
-        if a1.AddressType == A1Packet.ADDRESS_TYPE_PUBKEY and a1.Address != self.sig_keypair.pub:
-            a2 = A2Packet(case=A2Packet.Case.A2_NO_SUCH_SERVER)
-        elif self.a2:
-            a2 = self.a2  # use injected a2
+        address = a1.Address if a1.data.AddressType == A1Packet.ADDRESS_TYPE_PUBKEY else None
+        if address is not None and self.find_identity(address) is None:
+            a2 = static_packets.a2_bytes(A2Packet.Case.A2_NO_SUCH_SERVER)
+        elif self._a2:
+            a2 = self.a2_bytes()  # use injected a2
+        elif self.identities is not None:
+            a2 = self.identities.a2_bytes(address)
         else:
-            a2 = A2Packet(case=A2Packet.Case.A2_DEFAUT)
+            a2 = static_packets.a2_bytes(A2Packet.Case.A2_DEFAUT)
 
-        await self.clear_channel.write(bytes(a2), is_last=True)
+        await self.clear_channel.write(a2, is_last=True)
 
     async def do_m1(self):
         """Returns tuple (valid_m1, resumed, read_chunk)"""
-        clear_chunk = await self.clear_channel.read()
+        clear_chunk = await self._read(self.clear_channel)
 
         try:
             self.m1 = M1Packet(src_buf=clear_chunk)
@@ -89,56 +161,73 @@ class SaltServerSession(metaclass=util.Syncizer):
         # M1 processing
         self.time_checker.report_first_time(self.m1.data.Time)
         self.m1_hash = self.saltlib.sha512(clear_chunk)
-        if self.m1.data.Header.ServerSigKeyIncluded and self.sig_keypair.pub != self.m1.ServerSigKey:
-            m2 = M2Packet()
-            m2.data.Time = self.time_keeper.get_first_time()
-            m2.data.Header.NoSuchServer = 1
-            await self.clear_channel.write(bytes(m2), is_last=True)
+        sig_keypair = self.find_identity(self.m1.ServerSigKey) if self.m1.data.Header.ServerSigKeyIncluded \
+            else self.sig_keypair
+        if sig_keypair is None:
+            m2_raw = static_packets.m2_no_such_server_bytes(self.time_keeper.get_first_time())
+            await self.clear_channel.write(m2_raw, is_last=True)
             raise saltchannel.exceptions.NoSuchServerException()
+        self.sig_keypair = sig_keypair
 
         return (True,False, None)
 
     async def do_m2(self):
+        """Creates M2 and starts Signature1 computation; M2 is written here only if not buffered."""
         self.m2 = M2Packet()
         self.m2.data.Time = self.time_keeper.get_first_time()
         self.m2.ServerEncKey = self.enc_keypair.pub
 
+        m2_raw = bytes(self.m2)
+        self.m2_hash = self.saltlib.sha512(m2_raw)
+        if self.sign_executor is None:
+            t0 = time.perf_counter()
+            self.signature1 = self.create_signature1()
+            self._stage_done('m3_sign', t0)
+        else:
+            self.signature1 = self.loop.run_in_executor(self.sign_executor, self._timed_signature1)
+
         if not self.buffer_m2:
-            await self.clear_channel.write(bytes(self.m2))  # check for copy overhead here
-            self.m2_hash = self.saltlib.sha512(bytes(self.m2)) # check for copy overhead here
+            await self.clear_channel.write(m2_raw)
 
     async def do_m3(self):
-        time = 0
         msg_list = []
 
         if self.buffer_m2:
-            time = self.time_keeper.get_first_time()
-            self.m2.data.Time = time
-            self.m2_hash = self.saltlib.sha512(bytes(self.m2))
             msg_list.append(bytes(self.m2))
-        else:
-            time = self.time_keeper.get_time()
+
+        if isinstance(self.signature1, asyncio.Future):
+            self.signature1, seconds = await self.signature1
+            self._record('m3_sign', seconds)  # here, metrics are not thread-safe
 
         p = M3Packet()
-        p.data.Time = time
+        p.data.Time = self.time_keeper.get_time()
         p.ServerSigKey = self.sig_keypair.pub
-        p.Signature1 = self.saltlib.sign(b''.join([M3Packet.SIG1_PREFIX, self.m1_hash, self.m2_hash]),
-                                         self.sig_keypair.sec)[:SaltLibBase.crypto_sign_BYTES]
+        p.Signature1 = self.signature1
 
         msg_list.append(self.enc_channel.wrap(self.enc_channel.encrypt(bytes(p)), is_last=False))
         self.enc_channel.write_nonce.advance()
 
         await self.clear_channel.write(msg_list[0], *(msg_list[1:]))
 
+    def create_signature1(self):
+        """Returns M3/Signature1; depends on M1 and M2 hashes only."""
+        return self.saltlib.sign(b''.join([M3Packet.SIG1_PREFIX, self.m1_hash, self.m2_hash]),
+                                 self.sig_keypair.sec)[:SaltLibBase.crypto_sign_BYTES]
+
+    def _timed_signature1(self):
+        """Returns (Signature1, seconds taken); runs in sign_executor."""
+        t0 = time.perf_counter()
+        return self.create_signature1(), time.perf_counter() - t0
+
     async def do_m4(self):
-        self.m4 = M4Packet(src_buf=await self.enc_channel.read())
+        self.m4 = M4Packet(src_buf=await self._read(self.enc_channel))
         self.time_checker.check_time(self.m4.data.Time)
         self.client_sig_key = self.m4.ClientSigKey
 
     def create_encrypted_channel(self):
         self.session_key = self.saltlib.compute_shared_key(self.enc_keypair.sec, self.m1.ClientEncKey)
-        self.enc_channel = EncryptedChannelV2(self.clear_channel, self.session_key, Role.SERVER)
-        self.app_channel = AppChannelV2(self.enc_channel, self.time_keeper, self.time_checker)
+        self.enc_channel = EncryptedChannelV2(self.clear_channel, self.session_key, Role.SERVER, loop=self.loop)
+        self.app_channel = AppChannelV2(self.enc_channel, self.time_keeper, self.time_checker, loop=self.loop)
 
     def validate_signature2(self):
         """Validates M4/Signature2."""
@@ -0,0 +1,158 @@
+"""Many server signing identities behind one listener (virtual hosting).
+SaltServerSession(identities=...) picks the key pair requested by M1 ServerSigKey
+or the A1 address; lookups are O(1) both in memory and in the keystore file.
+"""
+import os
+import mmap
+import struct
+
+from ..util.key_pair import KeyPair
+from ..a1a2.packets import A2Packet
+from . import static_packets
+
+
+class MmapKeyStore:
+    """Read-only open addressing hash table of signing key pairs in a memory-mapped file.
+    Slots hold the 64-byte secret key (seed + public key); an all-zero slot is empty.
+    The slot is found from the first 8 bytes of the public key, with linear probing.
+    Build the file with MmapKeyStore.create().
+    """
+    MAGIC = b'SCKS'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHHQQ')  # magic, version, slot size, capacity, count
+    HEADER_SIZE = 64
+    SLOT_SIZE = 64
+    PUB_OFFSET = 32  # public key is the second half of the secret key
+    EMPTY_PUB = bytes(SLOT_SIZE - PUB_OFFSET)
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, slot_size, self.capacity, self.count = self.HEADER.unpack_from(self.mm, 0)
+        if magic != self.MAGIC or version != self.VERSION or slot_size != self.SLOT_SIZE:
+            self.mm.close()
+            raise ValueError("not a keystore file: {}".format(path))
+        if len(self.mm) < self.HEADER_SIZE + self.capacity * self.SLOT_SIZE:
+            self.mm.close()
+            raise ValueError("truncated keystore file: {}".format(path))
+        self.mask = self.capacity - 1
+
+    @classmethod
+    def _slot(cls, pub, mask):
+        return int.from_bytes(pub[:8], 'little') & mask
+
+    @classmethod
+    def create(cls, path, keypairs, load_factor=0.5):
+        """Writes keystore file with all 'keypairs' (iterable of KeyPair)."""
+        keypairs = list(keypairs)
+        capacity = 1
+        while capacity * load_factor < max(len(keypairs), 1):
+            capacity *= 2
+        mask = capacity - 1
+        table = bytearray(capacity * cls.SLOT_SIZE)
+        empty = bytes(cls.SLOT_SIZE)
+        count = 0
+        for kp in keypairs:
+            if len(kp.sec) != cls.SLOT_SIZE or kp.sec[cls.PUB_OFFSET:] != kp.pub or not any(kp.pub):
+                raise ValueError("not a signing key pair: {}".format(kp.pub.hex()))
+            i = cls._slot(kp.pub, mask)
+            while True:
+                slot = table[i * cls.SLOT_SIZE:(i + 1) * cls.SLOT_SIZE]
+                if slot == empty:
+                    table[i * cls.SLOT_SIZE:(i + 1) * cls.SLOT_SIZE] = kp.sec
+                    count += 1
+                    break
+                if slot[cls.PUB_OFFSET:] == kp.pub:
+                    break  # duplicate
+                i = (i + 1) & mask
+
+        tmp = '{}.tmp{}'.format(path, os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write(cls.HEADER.pack(cls.MAGIC, cls.VERSION, cls.SLOT_SIZE, capacity, count).ljust(cls.HEADER_SIZE, b'\0'))
+            f.write(table)
+        os.replace(tmp, path)  # readers never see a half-written file
+
+    def get(self, pub):
+        """Returns KeyPair for public signing key 'pub' or None."""
+        if len(pub) != self.SLOT_SIZE - self.PUB_OFFSET:
+            return None
+        mm = self.mm
+        i = self._slot(pub, self.mask)
+        for _ in range(self.capacity):
+            offset = self.HEADER_SIZE + i * self.SLOT_SIZE
+            stored = mm[offset + self.PUB_OFFSET:offset + self.SLOT_SIZE]
+            if stored == self.EMPTY_PUB:
+                return None
+            if stored == pub:
+                return KeyPair(sec=mm[offset:offset + self.SLOT_SIZE], pub=stored)
+            i = (i + 1) & self.mask
+        return None
+
+    def __contains__(self, pub):
+        return self.get(pub) is not None
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self.mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ServerIdentityRegistry:
+    """Signing key pairs a server answers for, indexed by public key.
+    Identities are added in memory with add() or looked up in an optional MmapKeyStore.
+    Serialized A2 responses are built once per identity; identities from the keystore
+    and A1 with ADDRESS_TYPE_ANY get the default A2.
+    The first identity added is the default one, used if M1 does not name a server.
+    """
+    def __init__(self, store=None, a2=None):
+        self.identities = {}  # pub -> KeyPair
+        self.a2_raw = {}  # pub -> serialized A2Packet
+        self.store = store
+        self.default = None
+        self.default_a2 = a2
+
+    @property
+    def default_a2(self):
+        return self._default_a2
+
+    @default_a2.setter
+    def default_a2(self, a2):
+        """Changing A2 config rebuilds the serialized default A2 (None: A2_DEFAUT)."""
+        self._default_a2 = a2
+        self.default_a2_raw = bytes(a2) if a2 else static_packets.a2_bytes(A2Packet.Case.A2_DEFAUT)
+
+    def add(self, sig_keypair, a2=None, default=False):
+        self.identities[sig_keypair.pub] = sig_keypair
+        if a2 is not None:
+            self.a2_raw[sig_keypair.pub] = bytes(a2)
+        else:
+            self.a2_raw.pop(sig_keypair.pub, None)
+        if default or self.default is None:
+            self.default = sig_keypair
+
+    def get(self, pub):
+        """Returns KeyPair for public signing key 'pub' or None."""
+        kp = self.identities.get(pub)
+        if kp is None and self.store is not None:
+            kp = self.store.get(pub)
+        return kp
+
+    def a2_bytes(self, pub=None):
+        """Returns serialized A2 of identity 'pub' (None for the default A2)."""
+        return self.a2_raw.get(pub, self.default_a2_raw)
+
+    def __contains__(self, pub):
+        return self.get(pub) is not None
+
+    def __len__(self):
+        """Number of distinct identities; those both added and in the keystore count once."""
+        if self.store is None:
+            return len(self.identities)
+        return len(self.store) + sum(1 for pub in self.identities if pub not in self.store)
@@ -0,0 +1,23 @@
+"""Serialized packets which are the same for every connection.
+Built on first use and shared by all sessions of the process; bytes are immutable,
+so they are written as they are.
+"""
+import functools
+
+from ..a1a2.packets import A2Packet
+from .packets import M2Packet
+
+
+@functools.lru_cache(maxsize=None)
+def a2_bytes(case):
+    """Returns serialized A2Packet(case=case), e.g. A2_DEFAUT or A2_NO_SUCH_SERVER."""
+    return bytes(A2Packet(case=case))
+
+
+@functools.lru_cache(maxsize=None)
+def m2_no_such_server_bytes(time):
+    """Returns serialized M2 with NoSuchServer set; 'time' is TimeKeeper.get_first_time()."""
+    m2 = M2Packet()
+    m2.data.Time = time
+    m2.data.Header.NoSuchServer = 1
+    return bytes(m2)
@@ -7,6 +7,7 @@ if sys.version_info[0] < 3:
 from setuptools import setup, find_packages
 from setuptools import Command
 from tests.saltlib import test_saltlib
+from tests import test_metrics_channel
 
 
 class BenchSaltLibCmd(Command):
@@ -26,6 +27,24 @@ class BenchSaltLibCmd(Command):
         print("Benchmarking....\n")
         self.suite.run_bench_suite()
 
+
+class BenchMetricsChannelCmd(Command):
+
+    description = 'Estimate per-message overhead of MetricsChannel'
+    user_options = [
+    ]
+
+    def initialize_options(self):
+        self.suite = test_metrics_channel.BenchMetricsChannel()
+        pass
+
+    def finalize_options(self):
+        pass
+
+    def run(self):
+        print("Benchmarking....\n")
+        self.suite.run_bench_suite()
+
 setup(
     name='salt-channel-python',
     version='0.0.1',
@@ -61,6 +80,7 @@ setup(
     #keywords='sample setuptools development',
     cmdclass={
         'benchmark_saltlib': BenchSaltLibCmd,
+        'benchmark_metrics_channel': BenchMetricsChannelCmd,
     },
     install_requires=[
         'pynacl',
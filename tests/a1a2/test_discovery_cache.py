@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+from unittest import TestCase, mock
+
+from saltchannel.a1a2.discovery_cache import DiscoveryCache
+from saltchannel.a1a2.packets import A1Packet, A2Packet
+
+
+class A2Channel:
+    """Answers A1 with a default A2; records the A1 packets and closes."""
+    def __init__(self, a1s):
+        self.a1s = a1s
+        self.closed = False
+
+    async def write(self, message, *args, is_last=False):
+        self.a1s.append(A1Packet(src_buf=message))
+
+    async def read(self):
+        return bytes(A2Packet(case=A2Packet.Case.A2_DEFAUT))
+
+    def close(self):
+        self.closed = True
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class BaseTest(TestCase):
+    def __init__(self, *args, **kwargs):
+        TestCase.__init__(self, *args, **kwargs)
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.clock = Clock()
+        self.probes = 0
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+        self.loop.close()
+
+    async def probe(self):
+        self.probes += 1
+        await asyncio.sleep(0)
+        return A2Packet(case=A2Packet.Case.A2_DEFAUT)
+
+    def lookup(self, cache, endpoint='host:1', address=b''):
+        return self.loop.run_until_complete(cache.lookup(endpoint, address, self.probe, loop=self.loop))
+
+
+class TestDiscoveryCache(BaseTest):
+
+    def test_ttl(self):
+        cache = DiscoveryCache(ttl=10, clock=self.clock)
+        a2 = self.lookup(cache)
+        self.assertEqual(bytes(a2), bytes(A2Packet(case=A2Packet.Case.A2_DEFAUT)))
+        self.assertEqual(self.probes, 1)
+
+        self.clock.now += 5
+        self.lookup(cache)  # fresh, no round trip
+        self.assertEqual(self.probes, 1)
+
+        self.clock.now += 10
+        self.assertIsNotNone(self.lookup(cache))  # stale: returned at once, refreshed in background
+        self.assertIsNotNone(self.lookup(cache))  # refresh already running
+        self.loop.run_until_complete(asyncio.sleep(0.01))
+        self.assertEqual(self.probes, 2)
+        self.assertTrue(cache.get('host:1')[1])
+        self.assertEqual(cache.refreshing, {})
+
+        self.lookup(cache, address=bytes(32))  # other address, other entry
+        self.assertEqual(self.probes, 3)
+
+    def test_parsed_once(self):
+        cache = DiscoveryCache(ttl=10, clock=self.clock)
+        a2 = self.lookup(cache)
+        self.assertIs(cache.get('host:1')[0], cache.get('host:1')[0])
+        self.assertIsNot(cache.get('host:1')[0], a2)
+
+        cache.put('host:1', b'', a2)
+        self.assertEqual(cache.packets, {})
+        self.assertIsNotNone(cache.get('host:1')[0])
+        cache.invalidate('host:1')
+        self.assertEqual(cache.packets, {})
+
+    def test_discover(self):
+        cache = DiscoveryCache(ttl=10, clock=self.clock)
+        a1s, channels = [], []
+
+        async def open_channel():
+            channels.append(A2Channel(a1s))
+            return channels[-1]
+
+        address = bytes(range(32))
+        for i in range(2):
+            a2 = self.loop.run_until_complete(
+                cache.discover('host:3', open_channel, address, loop=self.loop))
+            self.assertEqual(a2.data.Count, 1)
+        self.assertEqual(len(channels), 1)  # second call answered from the cache
+        self.assertTrue(channels[0].closed)
+        self.assertEqual(a1s[0].data.AddressType, A1Packet.ADDRESS_TYPE_PUBKEY)
+        self.assertEqual(bytes(a1s[0].Address), address)
+
+    def test_persistence(self):
+        path = os.path.join(self.tmpdir.name, 'a2.json')
+        cache = DiscoveryCache(ttl=10, path=path, clock=self.clock)
+        self.lookup(cache, 'host:2', bytes(range(32)))
+
+        cache2 = DiscoveryCache(ttl=10, path=path, clock=self.clock)
+        a2, fresh = cache2.get('host:2', bytes(range(32)))
+        self.assertTrue(fresh)
+        self.assertEqual(a2.data.Count, 1)
+
+        cache2.invalidate('host:2', bytes(range(32)))
+        self.assertEqual(DiscoveryCache(path=path).entries, {})
+
+    def test_concurrent_lookups(self):
+        cache = DiscoveryCache(ttl=10, clock=self.clock)
+
+        async def run():
+            return await asyncio.gather(*[cache.lookup('host:3', b'', self.probe, loop=self.loop) for _ in range(5)])
+        results = self.loop.run_until_complete(run())
+        self.assertEqual(self.probes, 1)
+        self.assertEqual(len({bytes(a2) for a2 in results}), 1)
+        self.assertEqual(cache.refreshing, {})
+
+    def test_failed_probe_shared(self):
+        cache = DiscoveryCache(ttl=10, clock=self.clock)
+
+        async def failing():
+            self.probes += 1
+            await asyncio.sleep(0)
+            raise ConnectionRefusedError()
+
+        async def run():
+            return await asyncio.gather(*[cache.lookup('host:4', b'', failing, loop=self.loop) for _ in range(3)],
+                                        return_exceptions=True)
+        with self.assertLogs('saltchannel.a1a2.discovery_cache', 'WARNING'):
+            results = self.loop.run_until_complete(run())
+        self.assertEqual(self.probes, 1)
+        self.assertTrue(all(isinstance(r, ConnectionRefusedError) for r in results))
+        self.assertEqual(cache.refreshing, {})
+
+    def test_save_off_loop(self):
+        path = os.path.join(self.tmpdir.name, 'a2.json')
+        cache = DiscoveryCache(ttl=10, path=path, clock=self.clock)
+        threads = []
+        write = cache._write
+
+        def record(*args):
+            threads.append(threading.current_thread())
+            write(*args)
+        with mock.patch.object(cache, '_write', side_effect=record):
+            self.lookup(cache, 'host:5')
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.current_thread())
+        self.assertIn(('host:5', b''), DiscoveryCache(path=path).entries)
+
+        cache._write(0, {'version': 0})  # older snapshot than the one written, ignored
+        self.assertIn(('host:5', b''), DiscoveryCache(path=path).entries)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import unittest
+from unittest import TestCase
+
+from saltchannel.bench import BenchSuite, CompressionBench, InProcessPair, compare
+from saltchannel.bench.suite import wanted
+
+
+class BaseTest(TestCase):
+    def __init__(self, *args, **kwargs):
+        TestCase.__init__(self, *args, **kwargs)
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+
+class TestSuite(BaseTest):
+
+    def test_tiny_suite_compare(self):
+        results = BenchSuite(InProcessPair(self.loop), scale=0.01).run(only=['hand', 'app_lat'])
+        self.assertEqual(sorted(name.split('/')[2] for name in results), ['app_latency'] * 5 + ['handshake'])
+        self.assertEqual(compare(results, results), [])  # no regression against itself
+
+        name = next(name for name in results if name.endswith('/handshake'))
+        slower = {name: {metric: value * 2 for metric, value in metrics.items()}
+                  for name, metrics in results.items()}
+        regressions = compare(slower, results, tolerance=0.1)
+        self.assertIn((name, 'p99_us', results[name]['p99_us'], slower[name]['p99_us']), regressions)
+        self.assertEqual(compare(slower, results, tolerance=1.5), [])  # within tolerance
+
+    def test_compare_throughput(self):
+        baseline = {'a': {'msgs_per_sec': 1000.0, 'gain': 2.0}}
+        self.assertEqual(compare({'a': {'msgs_per_sec': 950.0, 'gain': 1.0}}, baseline), [])
+        self.assertEqual(compare({'a': {'msgs_per_sec': 800.0}}, baseline), [('a', 'msgs_per_sec', 1000.0, 800.0)])
+        self.assertEqual(compare({'b': {'msgs_per_sec': 1.0}}, baseline), [])  # not in baseline
+
+    def test_wanted(self):
+        self.assertTrue(wanted('compression', None))
+        self.assertTrue(wanted('compression', ['comp']))
+        self.assertFalse(wanted('compression', ['handshake']))
+        self.assertFalse(wanted('multiapp', ['multiapp_packet']))
+        self.assertEqual(CompressionBench.synthetic(count=200, dict_size=256).run(only=['multi']), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import unittest
+from unittest import TestCase
+
+from saltchannel.channel import ByteChannel
+from saltchannel.dev.netem_channel import NetemChannel, NetemProfile, NETEM_PROFILES
+from saltchannel.dev.tunnel import AsyncTunnel
+from saltchannel.util.crypto_test_data import CryptoTestData
+from saltchannel.v2.salt_client_session import SaltClientSession
+from saltchannel.v2.salt_server_session import SaltServerSession
+
+
+class RecordingChannel(ByteChannel):
+    """Records the arguments of every write()."""
+    def __init__(self, loop=None):
+        super().__init__(loop=loop)
+        self.writes = []
+
+    async def read(self):
+        await asyncio.Event().wait()
+
+    async def write(self, msg, *args, is_last=False):
+        self.writes.append(((msg,) + args, is_last))
+
+    def close(self):
+        pass
+
+
+class BaseTest(TestCase):
+    def __init__(self, *args, **kwargs):
+        TestCase.__init__(self, *args, **kwargs)
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.tunnel = AsyncTunnel(loop=self.loop)
+
+    def tearDown(self):
+        async def cancel(tasks):  # link and reader tasks of closed channels
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self.loop.run_until_complete(cancel(asyncio.all_tasks(self.loop)))
+        self.loop.close()
+
+    def run_async(self, coro):
+        return self.loop.run_until_complete(asyncio.wait_for(coro, 10))
+
+    async def timed_read(self, channel, count):
+        """Returns [(seconds since start, msg)] of 'count' messages."""
+        t0 = self.loop.time()
+        result = []
+        while len(result) < count:
+            for msg in await channel.read_available():
+                result.append((self.loop.time() - t0, msg))
+        return result
+
+
+class TestNetemChannel(BaseTest):
+
+    def test_delay(self):
+        channel = NetemChannel(self.tunnel.channel1, tx=NetemProfile(delay=0.05), loop=self.loop)
+
+        async def run():
+            await channel.write(b'a', b'b')
+            return await self.timed_read(self.tunnel.channel2, 2)
+        received = self.run_async(run())
+        self.assertEqual([msg for _, msg in received], [b'a', b'b'])
+        self.assertGreaterEqual(received[0][0], 0.045)
+
+    def test_rx_delay(self):
+        channel = NetemChannel(self.tunnel.channel1, rx=NetemProfile(delay=0.05), loop=self.loop)
+
+        async def run():
+            await self.tunnel.channel2.write(b'to client')
+            return await self.timed_read(channel, 1)
+        (elapsed, msg), = self.run_async(run())
+        self.assertEqual(msg, b'to client')
+        self.assertGreaterEqual(elapsed, 0.045)
+
+    def test_bandwidth(self):
+        channel = NetemChannel(self.tunnel.channel1, tx=NetemProfile(bandwidth=100000), loop=self.loop)
+        msgs = [bytes([i]) * 1000 for i in range(10)]
+
+        async def run():
+            await channel.write(*msgs)
+            return await self.timed_read(self.tunnel.channel2, len(msgs))
+        received = self.run_async(run())
+        self.assertEqual([msg for _, msg in received], msgs)
+        self.assertGreaterEqual(received[-1][0], 0.095)
+
+    def test_jitter_keeps_order(self):
+        channel = NetemChannel(self.tunnel.channel1, tx=NetemProfile(delay=0.01, jitter=0.01), loop=self.loop)
+        msgs = [bytes([i]) for i in range(50)]
+
+        async def run():
+            for msg in msgs:
+                await channel.write(msg)
+            return await self.timed_read(self.tunnel.channel2, len(msgs))
+        self.assertEqual([msg for _, msg in self.run_async(run())], msgs)
+
+    def test_seeded(self):
+        profile = NetemProfile(delay=0.01, jitter=0.005, bandwidth=1000000, chunk_size=100)
+
+        def arrivals(seed):
+            channel = NetemChannel(AsyncTunnel(loop=self.loop).channel1, tx=profile, seed=seed, loop=self.loop)
+            self.run_async(channel.write(*[bytes(70)] * 20))
+            times = [t for t, _ in channel.tx.queue]
+            channel.tx.cancel()
+            return [t - times[0] for t in times]
+        self.assertEqual(arrivals(7), arrivals(7))
+        self.assertNotEqual(arrivals(7), arrivals(8))
+
+    def test_chunks(self):
+        channel = NetemChannel(self.tunnel.channel1, tx=NetemProfile(bandwidth=10000, chunk_size=100),
+                               loop=self.loop)
+
+        async def run():
+            await channel.write(bytes(40), bytes(40), bytes(40))  # 1st chunk holds two, 2nd the third
+            first = await self.tunnel.channel2.read_available()
+            second = await self.tunnel.channel2.read_available()
+            return len(first), len(second), self.loop.time() - t0
+        t0 = self.loop.time()
+        first, second, elapsed = self.run_async(run())
+        self.assertEqual((first, second), (2, 1))
+        self.assertGreaterEqual(elapsed, 0.019)
+
+    def test_close_delivers_pending(self):
+        channel = NetemChannel(self.tunnel.channel1, tx=NetemProfile(delay=0.02), loop=self.loop)
+
+        async def run():
+            await channel.write(b'last')
+            channel.close()
+            msg = await self.tunnel.channel2.read()
+            with self.assertRaises(asyncio.IncompleteReadError):
+                await self.tunnel.channel2.read()
+            return msg
+        self.assertEqual(self.run_async(run()), b'last')
+
+    def test_is_last(self):
+        orig = RecordingChannel(loop=self.loop)
+        channel = NetemChannel(orig, tx=NetemProfile(delay=0.01), loop=self.loop)
+
+        async def run():
+            await channel.write(b'a', b'b')
+            await channel.write(b'c', b'd', is_last=True)
+            await channel.write(b'e')
+            await channel.drain()
+        self.run_async(run())
+        self.assertEqual(orig.writes, [((b'a', b'b', b'c', b'd'), True), ((b'e',), False)])
+
+    def test_sessions(self):
+        profile = NETEM_PROFILES['lan']
+        channel = NetemChannel(self.tunnel.channel1, tx=profile, rx=profile, seed=1, loop=self.loop)
+        client = SaltClientSession(CryptoTestData.aSig, channel, loop=self.loop)
+        client.enc_keypair = CryptoTestData.aEnc
+        server = SaltServerSession(CryptoTestData.bSig, self.tunnel.channel2, loop=self.loop)
+        server.enc_keypair = CryptoTestData.bEnc
+
+        async def run():
+            await asyncio.gather(client.handshake(), server.handshake())
+            await server.app_channel.write(b'hello')
+            msg = await client.app_channel.read()
+            channel.close()
+            await channel.drain()
+            return msg
+        self.assertEqual(self.run_async(run()), b'hello')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import shutil
+import asyncio
+import tempfile
+import unittest
+from unittest import TestCase
+
+from saltchannel.dev.mitm_channel import MitmEventType
+from saltchannel.dev.trace import TraceChannel, TraceRecord, TraceWriter, read_trace, replay
+from saltchannel.dev.tunnel import AsyncTunnel
+from saltchannel.util.crypto_test_data import CryptoTestData
+from saltchannel.v2.salt_client_session import SaltClientSession
+from saltchannel.v2.salt_server_session import SaltServerSession
+
+
+class BaseTest(TestCase):
+    def __init__(self, *args, **kwargs):
+        TestCase.__init__(self, *args, **kwargs)
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.loop.close()
+        shutil.rmtree(self.tmpdir)
+
+    def run_async(self, coro):
+        return self.loop.run_until_complete(asyncio.wait_for(coro, 10))
+
+    async def sessions(self):
+        tunnel = AsyncTunnel(loop=self.loop)
+        client = SaltClientSession(CryptoTestData.aSig, tunnel.channel1, loop=self.loop)
+        client.enc_keypair = CryptoTestData.aEnc
+        server = SaltServerSession(CryptoTestData.bSig, tunnel.channel2, loop=self.loop)
+        server.enc_keypair = CryptoTestData.bEnc
+        await asyncio.gather(client.handshake(), server.handshake())
+        return client, server
+
+
+class TestTrace(BaseTest):
+
+    def test_capture(self):
+        path = os.path.join(self.tmpdir, 'app.sctr')
+
+        async def run():
+            client, server = await self.sessions()
+            writer = TraceWriter(path, loop=self.loop)
+            channel = TraceChannel(client.app_channel, writer, loop=self.loop)
+            await channel.write(b'request')
+            await server.app_channel.write(b'reply', b'more')
+            msgs = [await channel.read()] + await channel.read_available()
+            await channel.write(b'a', b'b', b'c')
+            await writer.close()
+            return msgs, writer
+        msgs, writer = self.run_async(run())
+        self.assertEqual(msgs, [b'reply', b'more'])
+        records = list(read_trace(path))
+        self.assertEqual([(r.type, r.data) for r in records], [
+            (MitmEventType.WRITE, b'request'),
+            (MitmEventType.READ, b'reply'),
+            (MitmEventType.READ, b'more'),
+            (MitmEventType.WRITE, b'a'),
+            (MitmEventType.WRITE_WITH_PREVIOUS, b'b'),
+            (MitmEventType.WRITE_WITH_PREVIOUS, b'c')])
+        self.assertEqual([r.time for r in records], sorted(r.time for r in records))
+        self.assertEqual(writer.written_records, 6)
+        self.assertEqual(writer.written_bytes, os.path.getsize(path))
+
+    def test_background_flush(self):
+        f = io.BytesIO()
+        writer = TraceWriter(f, loop=self.loop, flush_size=100, flush_interval=0.01)
+
+        async def run():
+            writer.record(MitmEventType.WRITE, bytes(200))  # over flush_size
+            writer.record(MitmEventType.WRITE, b'x')
+            await asyncio.sleep(0.05)
+        self.run_async(run())
+        self.assertEqual([r.data for r in read_trace(io.BytesIO(f.getvalue()))], [bytes(200), b'x'])
+
+    def test_truncated(self):
+        f = io.BytesIO()
+        writer = TraceWriter(f, loop=self.loop)
+        writer.record(MitmEventType.READ, b'abc')
+        self.run_async(writer.flush())
+        with self.assertRaises(ValueError):
+            list(read_trace(io.BytesIO(f.getvalue()[:-1])))
+        with self.assertRaises(ValueError):
+            list(read_trace(io.BytesIO(b'not a trace file')))
+
+    def test_replay(self):
+        records = [TraceRecord(0.0, MitmEventType.WRITE, b'req'),
+                   TraceRecord(0.02, MitmEventType.READ, b'resp'),
+                   TraceRecord(0.04, MitmEventType.WRITE, b'batch1'),
+                   TraceRecord(0.04, MitmEventType.WRITE_WITH_PREVIOUS, b'batch2')]
+
+        async def run():
+            client, server = await self.sessions()
+            t0 = self.loop.time()
+            stats = await replay(records, client.app_channel, server.app_channel, speed=2.0, loop=self.loop)
+            return stats, self.loop.time() - t0
+        stats, elapsed = self.run_async(run())
+        self.assertEqual(stats['msgs'], 4)
+        self.assertEqual(stats['bytes'], 19)
+        self.assertGreaterEqual(elapsed, 0.019)  # 0.04 seconds of trace at double speed
+
+    def test_replay_fast(self):
+        records = [TraceRecord(i, MitmEventType.WRITE, bytes([i % 256]) * 10) for i in range(100)]
+
+        async def run():
+            client, server = await self.sessions()
+            return await replay(records, client.app_channel, server.app_channel, speed=float('inf'),
+                                loop=self.loop)
+        self.assertEqual(self.run_async(run())['msgs'], 100)
+
+    def test_replay_speed(self):
+        records = [TraceRecord(0.0, MitmEventType.WRITE, b'req')]
+        for speed in (0, -1.0, float('nan')):
+            with self.assertRaises(ValueError):
+                self.run_async(replay(records, None, None, speed=speed, loop=self.loop))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import unittest
+from unittest import TestCase
+
+from saltchannel.dev.tunnel import AsyncTunnel, Tunnel, TunnelMP
+from saltchannel.util.crypto_test_data import CryptoTestData
+from saltchannel.v2.salt_client_session import SaltClientSession
+from saltchannel.v2.salt_server_session import SaltServerSession
+
+
+class BaseTest(TestCase):
+    def __init__(self, *args, **kwargs):
+        TestCase.__init__(self, *args, **kwargs)
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def run_async(self, coro):
+        return self.loop.run_until_complete(asyncio.wait_for(coro, 10))
+
+
+class TestAsyncTunnel(BaseTest):
+
+    def test_sessions(self):
+        tunnel = AsyncTunnel(loop=self.loop)
+        client = SaltClientSession(CryptoTestData.aSig, tunnel.channel1, loop=self.loop)
+        client.enc_keypair = CryptoTestData.aEnc
+        server = SaltServerSession(CryptoTestData.bSig, tunnel.channel2, loop=self.loop)
+        server.enc_keypair = CryptoTestData.bEnc
+
+        async def run():
+            await asyncio.gather(client.handshake(), server.handshake())
+            await client.app_channel.write(b'hello', b'world')
+            return [await server.app_channel.read(), await server.app_channel.read()]
+        self.assertEqual(self.run_async(run()), [b'hello', b'world'])
+        self.assertEqual(client.session_key, server.session_key)
+
+    def test_zero_copy(self):
+        tunnel = AsyncTunnel(loop=self.loop)
+        buf = bytearray(b'payload')
+        tunnel.channel1.write_sync(buf)
+        self.assertIs(tunnel.channel2.read_sync(), buf)
+
+    def test_bounded(self):
+        tunnel = AsyncTunnel(maxsize=2, loop=self.loop)
+
+        async def run():
+            writer = self.loop.create_task(tunnel.channel1.write(b'1', b'2', b'3', b'4'))
+            await asyncio.sleep(0)
+            self.assertFalse(writer.done())  # waits for room
+            self.assertEqual(tunnel._q2.qsize(), 2)
+            msgs = [await tunnel.channel2.read() for _ in range(4)]
+            await writer
+            return msgs
+        self.assertEqual(self.run_async(run()), [b'1', b'2', b'3', b'4'])
+
+    def test_close(self):
+        for maxsize in (0, 1):
+            tunnel = AsyncTunnel(maxsize=maxsize, loop=self.loop)
+
+            async def run():
+                await tunnel.channel1.write(b'last')
+                tunnel.channel1.close()
+                self.assertEqual(await tunnel.channel2.read_available(), [b'last'])
+                with self.assertRaises(asyncio.IncompleteReadError):
+                    await tunnel.channel2.read()
+                with self.assertRaises(ConnectionResetError):
+                    await tunnel.channel2.write(b'x')
+            self.run_async(run())
+
+    def test_close_wakes_writer(self):
+        for closing in ('reader', 'writer'):
+            tunnel = AsyncTunnel(maxsize=1, loop=self.loop)
+
+            async def run():
+                writer = self.loop.create_task(tunnel.channel1.write(b'1', b'2'))
+                await asyncio.sleep(0)
+                self.assertFalse(writer.done())  # queue full, the peer does not read
+                (tunnel.channel2 if closing == 'reader' else tunnel.channel1).close()
+                with self.assertRaises(ConnectionResetError):
+                    await writer
+                self.assertEqual(tunnel.channel1.puts, set())
+            self.run_async(run())
+
+    def test_close_wakes_reader(self):
+        tunnel = AsyncTunnel(loop=self.loop)
+
+        async def run():
+            reader = self.loop.create_task(tunnel.channel2.read())
+            await asyncio.sleep(0)
+            tunnel.channel1.close()
+            with self.assertRaises(asyncio.IncompleteReadError):
+                await reader
+        self.run_async(run())
+
+
+class TestSyncTunnels(TestCase):
+
+    def test_several_messages(self):
+        for tunnel in (Tunnel(), TunnelMP()):
+            tunnel.channel1.write(b'a', b'b')
+            self.assertEqual([tunnel.channel2.read(), tunnel.channel2.read()], [b'a', b'b'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+import unittest
+from unittest import TestCase, mock
+
+from saltchannel import loadgen
+from saltchannel.util.metrics import MetricsRegistry
+
+
+class BaseTest(TestCase):
+    def __init__(self, *args, **kwargs):
+        TestCase.__init__(self, *args, **kwargs)
+
+    def setUp(self):
+        self.server_loop = asyncio.new_event_loop()
+        cfg = loadgen.parse_args(['--serve', '--port', '0'])
+        self.server = self.server_loop.run_until_complete(loadgen.serve(cfg, self.server_loop))
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.thread = threading.Thread(target=self.server_loop.run_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server_loop.call_soon_threadsafe(self.server_loop.stop)
+        self.thread.join()
+        self.server.close()
+        self.server_loop.run_until_complete(self.server.wait_closed())
+        self.server_loop.close()
+
+    def run_load(self, *args):
+        cfg = loadgen.parse_args(['--port', str(self.port), '--processes', '1', '--timeout', '10'] + list(args))
+        metrics = MetricsRegistry()
+        metrics.merge_snapshot(loadgen.run_process(cfg, 0))
+        return loadgen.report(cfg, metrics, 1.0)
+
+
+class TestLoadgen(BaseTest):
+
+    def test_counts(self):
+        result = self.run_load('--clients', '3', '--duration', '0.1', '--msg-rate', '0')
+        self.assertEqual(result['handshakes'], 3)
+        self.assertGreaterEqual(result['messages'], 3)
+        self.assertEqual(result['errors'], {})
+        self.assertEqual(result['error_rate'], 0.0)
+
+    def test_unexpected_errors_counted(self):
+        with mock.patch.object(loadgen.LoadClient, 'send_messages', side_effect=KeyError('boom')):
+            result = self.run_load('--clients', '2', '--duration', '0.1')
+        self.assertEqual(result['handshakes'], 2)
+        self.assertEqual(result['errors'], {'KeyError': 2})
+        self.assertEqual(result['error_rate'], 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
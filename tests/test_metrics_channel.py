@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import socket
+import time
+import unittest
+from collections import deque
+from unittest import TestCase
+
+from saltchannel.channel import ByteChannel, AsyncioChannel
+from saltchannel.dev.client_server_a import open_saltchannel_connection
+from saltchannel.exceptions import BadPeer
+from saltchannel.metrics_channel import MetricsChannel, StatsAggregator
+from saltchannel.v2.encrypted_channel_v2 import EncryptedChannelV2, Role
+
+
+class LoopbackChannel(ByteChannel):
+    """Everything written is read back."""
+    def __init__(self, loop=None):
+        super().__init__(loop=loop)
+        self.q = deque()
+        self.last_flag = False
+
+    async def read(self):
+        return self.q.popleft()
+
+    async def write(self, msg, *args, is_last=False):
+        self.q.append(msg)
+        self.q.extend(args)
+
+
+class BaseTest(TestCase):
+    def __init__(self, *args, **kwargs):
+        TestCase.__init__(self, *args, **kwargs)
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+
+class TestMetricsChannel(BaseTest):
+
+    def test_MetricsChannel_counters(self):
+        ch = MetricsChannel(LoopbackChannel(loop=self.loop), sample_every=2, loop=self.loop)
+
+        self.loop.run_until_complete(ch.write(b'123', b'45', b''))
+        self.loop.run_until_complete(ch.write(b'6789'))
+        for msg in [b'123', b'45', b'', b'6789']:
+            self.assertEqual(self.loop.run_until_complete(ch.read()), msg)
+
+        s = ch.stats.snapshot()
+        self.assertEqual(s['write_msgs'], 4)
+        self.assertEqual(s['write_bytes'], 9)
+        self.assertEqual(s['write_batches'], 2)
+        self.assertEqual(s['max_batch'], 3)
+        self.assertEqual(s['mean_batch'], 2.0)
+        self.assertEqual(s['read_msgs'], 4)
+        self.assertEqual(s['read_bytes'], 9)
+        self.assertEqual(s['read_latency']['count'] + s['write_latency']['count'], 3)
+        self.assertFalse(ch.last_flag)  # taken from decorated channel
+
+    def test_MetricsChannel_mac_failures(self):
+        key = bytes(32)
+        writer = EncryptedChannelV2(LoopbackChannel(loop=self.loop), key, Role.CLIENT, loop=self.loop)
+        reader = EncryptedChannelV2(writer.channel, bytes([1]*32), Role.SERVER, loop=self.loop)
+        ch = MetricsChannel(reader, loop=self.loop)
+
+        self.loop.run_until_complete(writer.write(b'secret'))
+        with self.assertRaises(BadPeer):
+            self.loop.run_until_complete(ch.read())
+        self.assertEqual(ch.stats.mac_failures, 1)
+        self.assertEqual(ch.stats.read_msgs, 0)
+
+    def test_MetricsChannel_read_ahead(self):
+        writer = EncryptedChannelV2(LoopbackChannel(loop=self.loop), bytes(32), Role.CLIENT, loop=self.loop)
+        reader = EncryptedChannelV2(writer.channel, bytes(32), Role.SERVER, loop=self.loop)
+        reader.readQ.extend([(b'ab', False), (b'c', False)])  # as if decrypted ahead
+        reader.readQ_bytes = 3
+        self.assertEqual(MetricsChannel(reader, loop=self.loop).read_ahead, (2, 3))
+        self.assertEqual(MetricsChannel(LoopbackChannel(loop=self.loop), loop=self.loop).read_ahead, (0, 0))
+
+    def test_StatsAggregator(self):
+        agg = StatsAggregator()
+        s1 = agg.new_stats()
+        s2 = agg.new_stats()
+        s1.write_batches, s1.batched_msgs, s1.max_batch = 2, 8, 7
+        s2.write_batches, s2.batched_msgs, s2.max_batch = 5, 0, 0
+        agg.release(s1)
+
+        snapshot = agg.snapshot()
+        self.assertEqual(snapshot['write_msgs'], 15)
+        self.assertEqual(snapshot['max_batch'], 7)
+        self.assertEqual(snapshot['sessions'], 2)
+        self.assertEqual(snapshot['live_sessions'], 1)
+
+
+class BenchMetricsChannel:
+    """Per-message overhead of MetricsChannel decorating both ends of an EncryptedChannelV2 pair.
+    Run-to-run noise of a whole encrypted round trip is larger than the 2% budget, so the
+    decorator's own cost is measured over a bare LoopbackChannel, where it is a large part of
+    the time, and related to the cost of the encrypted pair without it. Every figure is the
+    best of 'repeat' short runs, which filters out preemption; variants run interleaved.
+    """
+    MAX_OVERHEAD = 0.02
+
+    def __init__(self, msg_size=64, count=2000, sample_every=64):
+        self.msg_size = msg_size
+        self.count = count
+        self.sample_every = sample_every
+        self.loop = asyncio.new_event_loop()
+
+    def _pair(self, encrypted, decorate):
+        writer = LoopbackChannel(loop=self.loop)
+        reader = writer
+        if encrypted:
+            writer = EncryptedChannelV2(writer, bytes(32), Role.CLIENT, loop=self.loop)
+            reader = EncryptedChannelV2(reader, bytes(32), Role.SERVER, loop=self.loop)
+        if decorate:
+            writer = MetricsChannel(writer, sample_every=self.sample_every, loop=self.loop)
+            reader = MetricsChannel(reader, sample_every=self.sample_every, loop=self.loop)
+        return writer, reader
+
+    async def _send_recv(self, writer, reader):
+        msg = bytes(self.msg_size)
+        t0 = time.perf_counter()
+        for _ in range(self.count):
+            await writer.write(msg)
+            await reader.read()
+        return (time.perf_counter() - t0) / self.count
+
+    def run_bench_single(self, encrypted, decorate):
+        return self.loop.run_until_complete(self._send_recv(*self._pair(encrypted, decorate)))
+
+    def run_bench_suite(self, repeat=50):
+        variants = [(False, False), (False, True), (True, False)]
+        best = {v: float('inf') for v in variants}
+        for _ in range(repeat):
+            for v in variants:
+                best[v] = min(best[v], self.run_bench_single(*v))
+        cost = best[(False, True)] - best[(False, False)]
+        base = best[(True, False)]
+        overhead = cost / base
+        print(" EncryptedChannelV2 write+read: {:.3f} us/msg".format(base * 1000000))
+        print(" MetricsChannel on both ends: {:.3f} us/msg".format(cost * 1000000))
+        print(" overhead: {:.2f}% (budget {:.0f}%)".format(100 * overhead, 100 * self.MAX_OVERHEAD))
+        return overhead
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+import signal
+import tempfile
+import time
+import multiprocessing
+import unittest
+from unittest import TestCase, mock
+
+from saltchannel.channel import AsyncioChannel
+from saltchannel.dev.client_server_a import open_saltchannel_connection
+from saltchannel.prefork import PreforkServer
+from saltchannel.util.crypto_test_data import CryptoTestData
+from saltchannel.v2.salt_client_session import SaltClientSession
+
+
+async def echo(session):
+    while True:
+        await session.app_channel.write(await session.app_channel.read())
+
+
+class BaseTest(TestCase):
+    def __init__(self, *args, **kwargs):
+        TestCase.__init__(self, *args, **kwargs)
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.server = PreforkServer(echo, CryptoTestData.bSig, workers=2, interval=0.05)
+        self.server.RESTART_DELAY = 0
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+        self.loop.close()
+
+    async def client(self):
+        reader, writer = await open_saltchannel_connection('127.0.0.1', self.server.port, loop=self.loop)
+        channel = AsyncioChannel(reader, writer, loop=self.loop)
+        session = SaltClientSession(CryptoTestData.aSig, channel, loop=self.loop)
+        session.enc_keypair = CryptoTestData.aEnc
+        await session.handshake()
+        await session.app_channel.write(b'ping')
+        msg = await session.app_channel.read()
+        channel.close()
+        return msg
+
+    def run_clients(self, count):
+        async def clients():
+            return await asyncio.gather(*[self.client() for _ in range(count)])
+        return self.loop.run_until_complete(clients())
+
+    def wait_for(self, condition, timeout=10):
+        deadline = time.monotonic() + timeout
+        while not condition() and time.monotonic() < deadline:
+            self.server.poll(timeout=0.05)
+        self.assertTrue(condition())
+
+
+class TestPreforkServer(BaseTest):
+
+    def test_serve_and_aggregate(self):
+        self.assertNotEqual(self.server.port, 0)
+        self.assertEqual(self.run_clients(8), [b'ping'] * 8)
+
+        def handshakes():
+            h = self.server.metrics().stages.get('handshake')
+            return h.count if h else 0
+        self.wait_for(lambda: handshakes() == 8)
+
+    def test_restart_worker(self):
+        self.run_clients(4)
+        proc = self.server.procs[0][0]
+        os.kill(proc.pid, signal.SIGKILL)
+        self.wait_for(lambda: self.server.restarts == 1 and self.server.procs[0][0].is_alive())
+        self.assertIsNot(self.server.procs[0][0], proc)
+        self.assertEqual(self.run_clients(4), [b'ping'] * 4)
+
+        self.server.stop()
+        self.assertEqual(self.server.procs, {})
+        self.assertGreaterEqual(self.server.metrics().stages['handshake'].count, 4)
+
+    def test_restart_delay(self):
+        self.server.RESTART_DELAY = 0.5
+        self.server.procs[0] = self.server.procs[0][:2] + (time.monotonic(),)  # just started
+        os.kill(self.server.procs[0][0].pid, signal.SIGKILL)
+        self.wait_for(lambda: 0 in self.server.restart_at)
+        t0 = time.monotonic()
+        self.server.poll(timeout=0.05)
+        self.assertLess(time.monotonic() - t0, 0.3)  # no sleeping through the delay
+        self.assertEqual(self.server.restarts, 0)
+        self.assertEqual(self.run_clients(2), [b'ping'] * 2)  # the other worker serves meanwhile
+        self.wait_for(lambda: self.server.restarts == 1 and 0 in self.server.procs)
+
+
+def supervise(conn):
+    server = PreforkServer(echo, CryptoTestData.bSig, workers=2, interval=0.05)
+    server.start()
+    conn.send([proc.pid for proc, _, _ in server.procs.values()])
+    server.serve_forever()
+
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+class TestPreforkLifecycle(TestCase):
+
+    def test_sigterm_stops_workers(self):
+        ctx = multiprocessing.get_context('fork')
+        conn, child_conn = ctx.Pipe()
+        supervisor = ctx.Process(target=supervise, args=(child_conn,))
+        supervisor.start()
+        self.assertTrue(conn.poll(10))
+        pids = conn.recv()
+        os.kill(supervisor.pid, signal.SIGTERM)
+        supervisor.join(10)
+        self.assertEqual(supervisor.exitcode, 0)
+        deadline = time.monotonic() + 5
+        while any(alive(pid) for pid in pids) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertFalse(any(alive(pid) for pid in pids))
+
+    def test_failed_start_reaps_workers(self):
+        server = PreforkServer(echo, CryptoTestData.bSig, workers=2)
+        server.START_TIMEOUT = 0.2
+        with mock.patch('saltchannel.prefork._worker_main', lambda *args, **kwargs: time.sleep(30)):
+            with self.assertRaises(RuntimeError):
+                server.start()
+        self.assertEqual(server.procs, {})
+        self.assertIsNone(server.reserved)
+
+    def test_stop_finishes_open_sessions(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        path = os.path.join(tmpdir.name, 'closed')
+
+        async def handler(session):
+            try:
+                await echo(session)
+            finally:
+                await asyncio.sleep(0)  # cleanup needing the loop
+                with open(path, 'a') as f:
+                    f.write('x')
+
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        server = PreforkServer(handler, CryptoTestData.bSig, workers=1)
+        server.start()
+
+        async def connect():
+            reader, writer = await open_saltchannel_connection('127.0.0.1', server.port, loop=loop)
+            channel = AsyncioChannel(reader, writer, loop=loop)
+            session = SaltClientSession(CryptoTestData.aSig, channel, loop=loop)
+            session.enc_keypair = CryptoTestData.aEnc
+            await session.handshake()
+            await session.app_channel.write(b'ping')
+            await session.app_channel.read()
+            return channel
+        channel = loop.run_until_complete(connect())  # left open
+        server.stop()
+        channel.close()
+        with open(path) as f:
+            self.assertEqual(f.read(), 'x')
+
+
+if __name__ == '__main__':
+    unittest.main()
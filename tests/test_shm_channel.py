@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+import os
+import select
+import asyncio
+import multiprocessing
+import unittest
+from unittest import TestCase, mock
+
+from saltchannel.shm_channel import ShmPipe, ShmRing, supported
+from saltchannel.util.crypto_test_data import CryptoTestData
+from saltchannel.v2.salt_client_session import SaltClientSession
+from saltchannel.v2.salt_server_session import SaltServerSession
+
+
+def echo_child(pipe, count):
+    loop = asyncio.new_event_loop()
+    channel = pipe.channel(1, loop=loop)
+
+    async def echo():
+        for _ in range(count):
+            await channel.write(await channel.read())
+        channel.close()
+    loop.run_until_complete(echo())
+    loop.close()
+
+
+@unittest.skipUnless(supported(), "needs x86 store ordering")
+class BaseTest(TestCase):
+    def __init__(self, *args, **kwargs):
+        TestCase.__init__(self, *args, **kwargs)
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.pipe = None
+
+    def tearDown(self):
+        if self.pipe is not None:
+            self.pipe.close()
+            self.pipe.unlink()
+        self.loop.close()
+
+    def channels(self, capacity=1 << 16):
+        self.pipe = ShmPipe(capacity)
+        return self.pipe.channel(0, loop=self.loop), self.pipe.channel(1, loop=self.loop)
+
+    def run_async(self, coro):
+        return self.loop.run_until_complete(asyncio.wait_for(coro, 10))
+
+
+class TestShmChannel(BaseTest):
+
+    def test_read_write(self):
+        c0, c1 = self.channels()
+        c0.write_sync(b'hello', b'', bytearray(b'world'))
+        self.assertEqual(c1.read_sync(), b'hello')
+        self.assertEqual(c1.read_available_sync(), [b'', b'world'])
+        c1.write_sync(b'back')
+        self.assertEqual(c0.read_sync(), b'back')
+
+    def test_wraparound(self):
+        c0, c1 = self.channels(capacity=64)
+        for i in range(100):
+            msg = bytes([i % 256]) * (i % 40)
+            c0.write_sync(msg)
+            self.assertEqual(c1.read_sync(), msg)
+
+    def test_backpressure(self):
+        c0, c1 = self.channels(capacity=256)
+        msgs = [bytes([i % 256]) * 50 for i in range(200)]
+
+        async def writer():
+            for msg in msgs:
+                await c0.write(msg)
+
+        async def reader():
+            return [await c1.read() for _ in msgs]
+
+        async def run():
+            return await asyncio.gather(writer(), reader())
+        _, received = self.run_async(run())
+        self.assertEqual(received, msgs)
+
+    def test_reader_wakeup(self):
+        c0, c1 = self.channels()
+        c1.IDLE_TIMEOUT = 5  # must be woken up by the writer, not by the timeout
+
+        async def late_write():
+            await asyncio.sleep(0.05)
+            await c0.write(b'late')
+
+        async def run():
+            return await asyncio.gather(late_write(), c1.read())
+        _, msg = self.run_async(run())
+        self.assertEqual(msg, b'late')
+
+    def test_too_large(self):
+        c0, _ = self.channels(capacity=64)
+        with self.assertRaises(ValueError):
+            c0.write_sync(bytes(61))
+
+    def test_capacity(self):
+        with self.assertRaises(ValueError):
+            ShmRing(100)
+
+    def test_attach(self):
+        ring = ShmRing(1 << 10)
+        try:
+            with self.assertRaises(ValueError):
+                ShmRing(name=ring.name)
+            fds = tuple(tuple(os.dup(fd) for fd in pair) for pair in ring.wakeup_fds)
+            peer = ShmRing(name=ring.name, wakeup_fds=fds)
+            peer._set(peer.READER_WAITING, 1, peer.U32)  # the peer consumer sleeps
+            self.assertEqual(ring.put([b'ping']), 1)
+            self.assertTrue(select.select([peer.data_ready.rfd], [], [], 0)[0])  # signalled the creator's fd
+            self.assertEqual(peer.get(), [b'ping'])
+            peer.close()
+        finally:
+            ring.close()
+            ring.unlink()
+
+    def test_unsupported_platform(self):
+        with mock.patch('saltchannel.shm_channel.platform.machine', return_value='aarch64'):
+            self.assertFalse(supported())
+            with self.assertRaises(RuntimeError):
+                ShmRing(1 << 10)
+
+    def test_close(self):
+        c0, c1 = self.channels()
+        c0.write_sync(b'last')
+        c0.close()
+        self.assertEqual(c1.read_sync(), b'last')
+        with self.assertRaises(asyncio.IncompleteReadError):
+            c1.read_sync()
+        with self.assertRaises(ConnectionResetError):
+            c0.write_sync(b'more')
+
+    def test_close_wakes_writer(self):
+        c0, c1 = self.channels(capacity=64)
+        c0.IDLE_TIMEOUT = 5  # must be woken up by the close, not by the timeout
+
+        async def run():
+            writer = self.loop.create_task(c0.write(*[bytes(20)] * 4))
+            await asyncio.sleep(0.01)
+            self.assertFalse(writer.done())  # ring full, the peer does not read
+            c1.close()
+            with self.assertRaises(ConnectionResetError):
+                await asyncio.wait_for(writer, 1)
+        self.run_async(run())
+
+    def test_close_after_empty_get(self):
+        c0, c1 = self.channels()
+        get = c1.rx.get
+        calls = []
+
+        def racing_get(*args):  # the producer writes and closes right after the first get()
+            calls.append(1)
+            if len(calls) == 1:
+                c0.tx.put([b'last'])
+                c0.tx.close_producer()
+                return []
+            return get(*args)
+        with mock.patch.object(c1.rx, 'get', side_effect=racing_get):
+            self.assertEqual(c1.read_sync(), b'last')
+        with self.assertRaises(asyncio.IncompleteReadError):
+            c1.read_sync()
+
+    def test_sessions(self):
+        c0, c1 = self.channels()
+        client = SaltClientSession(CryptoTestData.aSig, c0, loop=self.loop)
+        client.enc_keypair = CryptoTestData.aEnc
+        server = SaltServerSession(CryptoTestData.bSig, c1, loop=self.loop)
+        server.enc_keypair = CryptoTestData.bEnc
+
+        async def run():
+            await asyncio.gather(client.handshake(), server.handshake())
+            await client.app_channel.write(b'hello')
+            return await server.app_channel.read()
+        self.assertEqual(self.run_async(run()), b'hello')
+
+    @unittest.skipUnless('fork' in multiprocessing.get_all_start_methods(), "needs fork")
+    def test_between_processes(self):
+        self.pipe = ShmPipe(1 << 12)
+        msgs = [bytes([i % 256]) * (i % 300) for i in range(500)]
+        child = multiprocessing.get_context('fork').Process(target=echo_child, args=(self.pipe, len(msgs)))
+        child.start()
+        channel = self.pipe.channel(0, loop=self.loop)
+
+        async def run():
+            received = []
+            for i in range(0, len(msgs), 10):
+                await channel.write(*msgs[i:i + 10])
+                while len(received) < i + 10:
+                    received.extend(await channel.read_available())
+            with self.assertRaises(asyncio.IncompleteReadError):
+                await channel.read()
+            return received
+        self.assertEqual(self.run_async(run()), msgs)
+        child.join(10)
+        self.assertEqual(child.exitcode, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
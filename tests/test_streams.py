@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import socket
+import asyncio
+import tempfile
+import multiprocessing
+import unittest
+from unittest import TestCase, mock
+
+from saltchannel.channel import AsyncioChannel, SocketChannel
+from saltchannel.streams import (open_saltchannel_unix_connection, start_saltchannel_unix_server,
+                                 open_saltchannel_socket)
+from saltchannel.util.crypto_test_data import CryptoTestData
+from saltchannel.v2.salt_client_session import SaltClientSession
+from saltchannel.v2.salt_server_session import SaltServerSession
+
+
+def echo_child(sock, count):
+    channel = SocketChannel(sock)
+    for _ in range(count):
+        channel.write_sync(channel.read_sync())
+
+
+class BaseTest(TestCase):
+    def __init__(self, *args, **kwargs):
+        TestCase.__init__(self, *args, **kwargs)
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.loop.close()
+        shutil.rmtree(self.tmpdir)
+
+    def run_async(self, coro):
+        return self.loop.run_until_complete(asyncio.wait_for(coro, 10))
+
+    async def handshake(self, client_channel, server_channel):
+        client = SaltClientSession(CryptoTestData.aSig, client_channel, loop=self.loop)
+        client.enc_keypair = CryptoTestData.aEnc
+        server = SaltServerSession(CryptoTestData.bSig, server_channel, loop=self.loop)
+        server.enc_keypair = CryptoTestData.bEnc
+        await asyncio.gather(client.handshake(), server.handshake())
+        return client, server
+
+
+class TestStreams(BaseTest):
+
+    def test_unix_socket(self):
+        path = os.path.join(self.tmpdir, 'salt.sock')
+
+        async def run():
+            accepted = asyncio.Queue()
+
+            def on_client(reader, writer):
+                accepted.put_nowait(AsyncioChannel(reader, writer, loop=self.loop))
+
+            server = await start_saltchannel_unix_server(on_client, path, loop=self.loop)
+            reader, writer = await open_saltchannel_unix_connection(path, loop=self.loop)
+            client, session = await self.handshake(AsyncioChannel(reader, writer, loop=self.loop),
+                                                   await accepted.get())
+            await client.app_channel.write(b'hello', b'world')
+            msgs = [await session.app_channel.read(), await session.app_channel.read()]
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            return msgs
+        self.assertEqual(self.run_async(run()), [b'hello', b'world'])
+
+    def test_socketpair(self):
+        async def run():
+            channels = []
+            for sock in socket.socketpair():
+                reader, writer = await open_saltchannel_socket(sock, loop=self.loop)
+                channels.append(AsyncioChannel(reader, writer, loop=self.loop))
+            client, server = await self.handshake(*channels)
+            await server.app_channel.write(b'from server')
+            msg = await client.app_channel.read()
+            for channel in channels:
+                channel.close()
+            return msg
+        self.assertEqual(self.run_async(run()), b'from server')
+
+    def test_write_msgs(self):
+        async def run():
+            ends = [await open_saltchannel_socket(sock, loop=self.loop) for sock in socket.socketpair()]
+            reader, writer = ends[0][0], ends[1][1]
+            with mock.patch.object(writer.transport, 'write', wraps=writer.transport.write) as write:
+                writer.write_msgs(b'a', b'', bytearray(b'ccc'))
+            msgs = await reader.read_msgs()
+            while len(msgs) < 3:
+                msgs += await reader.read_msgs()
+            for _, w in ends:
+                w.close()
+            return msgs, write.call_count
+        msgs, writes = self.run_async(run())
+        self.assertEqual(msgs, [b'a', b'', b'ccc'])
+        self.assertEqual(writes, 1)
+
+    @unittest.skipUnless('fork' in multiprocessing.get_all_start_methods(), "needs fork")
+    def test_socketpair_child(self):
+        parent_sock, child_sock = socket.socketpair()
+        msgs = [b'', b'a', bytes(range(256)) * 300]
+        child = multiprocessing.get_context('fork').Process(target=echo_child, args=(child_sock, len(msgs)))
+        child.start()
+        child_sock.close()
+
+        async def run():
+            reader, writer = await open_saltchannel_socket(parent_sock, loop=self.loop)
+            channel = AsyncioChannel(reader, writer, loop=self.loop)
+            await channel.write(*msgs)
+            received = [await channel.read() for _ in msgs]
+            channel.close()
+            return received
+        self.assertEqual(self.run_async(run()), msgs)
+        child.join(10)
+        self.assertEqual(child.exitcode, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
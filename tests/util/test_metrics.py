@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+from unittest import TestCase
+
+from saltchannel.exceptions import BadPeer, NoSuchServerException
+from saltchannel.util.metrics import Histogram, MetricsRegistry, NullMetrics
+
+
+class BaseTest(TestCase):
+    def __init__(self, *args, **kwargs):
+        TestCase.__init__(self, *args, **kwargs)
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+
+class TestHistogram(BaseTest):
+
+    def test_Histogram_exact_small_values(self):
+        h = Histogram(precision=5)
+        for v in range(1, 51):
+            h.record(v)
+
+        self.assertEqual(h.count, 50)
+        self.assertEqual(h.min, 1)
+        self.assertEqual(h.max, 50)
+        self.assertEqual(h.percentile(50), 25)
+        self.assertEqual(h.percentile(100), 50)
+        self.assertAlmostEqual(h.mean, 25.5)
+
+    def test_Histogram_relative_error(self):
+        h = Histogram(precision=5)
+        values = [7, 100, 1234, 99999, 12345678]
+        for v in values:
+            h.record(v)
+
+        for i, v in enumerate(values):
+            p = 100.0 * (i + 1) / len(values)
+            self.assertGreaterEqual(h.percentile(p), v)
+            self.assertLessEqual(h.percentile(p), v * (1 + 2**-5))
+
+    def test_Histogram_merge_and_snapshot(self):
+        h1 = Histogram()
+        h2 = Histogram()
+        for v in range(100):
+            h1.record(v)
+            h2.record(v + 1000)
+
+        h1.merge(Histogram.from_snapshot(h2.snapshot()))
+        self.assertEqual(h1.count, 200)
+        self.assertEqual(h1.min, 0)
+        self.assertEqual(h1.max, 1099)
+        self.assertEqual(h1.percentile(50), 99)
+
+    def test_Histogram_invalid_input(self):
+        with self.assertRaises(ValueError):
+            Histogram().record(-1)
+
+
+class TestMetricsRegistry(BaseTest):
+
+    def test_MetricsRegistry_snapshot(self):
+        m = MetricsRegistry()
+        m.record('m1', 0.001)
+        m.record('m1', 0.003)
+        m.count_failure(BadPeer())
+        m.count_failure(NoSuchServerException())
+        m.count_failure(BadPeer())
+
+        snapshot = m.snapshot()
+        self.assertEqual(snapshot['unit'], 'us')
+        self.assertEqual(snapshot['stages']['m1']['count'], 2)
+        self.assertEqual(snapshot['stages']['m1']['min'], 1000)
+        self.assertEqual(snapshot['failures'], {'BadPeer': 2, 'NoSuchServerException': 1})
+
+        m2 = MetricsRegistry().merge_snapshot(snapshot).merge_snapshot(snapshot)
+        self.assertEqual(m2.snapshot()['stages']['m1']['count'], 4)
+        self.assertEqual(m2.failures['BadPeer'], 4)
+
+    def test_NullMetrics_singleton(self):
+        self.assertIs(NullMetrics(), NullMetrics())
+        NullMetrics().record('m1', 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
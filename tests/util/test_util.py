@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+import unittest
+from unittest import TestCase
+
+import saltchannel.util as util
+
+
+class Echo(metaclass=util.Syncizer):
+    def __init__(self, loop=None):
+        self.loop = util.force_event_loop(loop=loop)
+
+    async def echo(self, value):
+        await asyncio.sleep(0)
+        return value, threading.current_thread().name
+
+    async def slow(self, seconds):
+        await asyncio.sleep(seconds)
+        return seconds
+
+
+class BaseTest(TestCase):
+    def __init__(self, *args, **kwargs):
+        TestCase.__init__(self, *args, **kwargs)
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+
+class TestSyncizer(BaseTest):
+
+    def test_sync_with_local_loop(self):
+        loop = asyncio.new_event_loop()
+        self.assertEqual(Echo(loop=loop).echo_sync(1), (1, threading.current_thread().name))
+        loop.close()
+
+    def test_sync_with_background_loop(self):
+        self.assertIs(util.background_loop(), util.background_loop())
+        e = Echo(loop=util.background_loop())
+        results = []
+
+        def worker(i):
+            results.extend(e.echo_sync(i) for _ in range(10))
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(sorted(v for v, _ in results), sorted(list(range(8)) * 10))
+        self.assertEqual({name for _, name in results}, {'saltchannel-loop'})
+
+    def test_sync_from_running_loop(self):
+        e = Echo(loop=util.background_loop())
+
+        async def caller():
+            return e.echo_sync(7)  # blocks this loop, but must not fail
+
+        loop = asyncio.new_event_loop()
+        self.assertEqual(loop.run_until_complete(caller())[0], 7)
+        loop.close()
+
+    def test_sync_with_local_loop_from_running_loop(self):
+        own_loop = asyncio.new_event_loop()
+        e = Echo(loop=own_loop)
+
+        async def caller():
+            return e.echo_sync(8)  # 'own_loop' is not running, but this thread runs another one
+
+        loop = asyncio.new_event_loop()
+        (value, first), (_, second) = loop.run_until_complete(caller()), loop.run_until_complete(caller())
+        self.assertEqual(value, 8)
+        self.assertTrue(first.startswith('saltchannel-run-sync'))
+        self.assertEqual(first, second)  # the same worker thread each time
+        loop.close()
+        self.assertEqual(e.echo_sync(9)[0], 9)  # and still usable from plain code
+        own_loop.close()
+
+    def test_sync_with_local_loop_from_threads(self):
+        loop = asyncio.new_event_loop()
+        e = Echo(loop=loop)
+        results, errors = [], []
+
+        def worker():
+            try:
+                results.append(e.slow_sync(0.05))
+            except RuntimeError as ex:  # the loop is already running in another thread
+                errors.append(ex)
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(5)
+        self.assertFalse(any(t.is_alive() for t in threads))  # none hangs
+        self.assertEqual(len(results) + len(errors), 4)
+        self.assertGreaterEqual(len(results), 1)
+        loop.close()
+
+    def test_sync_from_own_loop_fails(self):
+        e = Echo(loop=util.background_loop())
+
+        async def caller():
+            return e.echo_sync(7)
+
+        with self.assertRaises(RuntimeError):
+            asyncio.run_coroutine_threadsafe(caller(), util.background_loop()).result()
+
+
+if __name__ == '__main__':
+    unittest.main()
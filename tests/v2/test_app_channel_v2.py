@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import socket
+import unittest
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+from saltchannel.channel import ByteChannel, AsyncioChannel
+from saltchannel.dev.client_server_a import open_saltchannel_connection
+from saltchannel.util.time import NullTimeChecker, NullTimeKeeper
+from saltchannel.v2.app_channel_v2 import AppChannelV2
+from saltchannel.v2.encrypted_channel_v2 import EncryptedChannelV2, Role
+
+
+class LoopbackChannel(ByteChannel):
+    """Everything written is read back; records pause/resume calls."""
+    def __init__(self, loop=None):
+        super().__init__(loop=loop)
+        self.q = deque()
+        self.paused = False
+        self.calls = []
+        self.last_flag = False
+
+    async def read(self):
+        msg, self.last_flag = self.q.popleft()
+        return msg
+
+    async def write(self, msg, *args, is_last=False):
+        msgs = (msg,) + args
+        self.q.extend((m, is_last and i == len(msgs) - 1) for i, m in enumerate(msgs))
+
+    def pause_reading(self):
+        self.paused = True
+        self.calls.append('pause')
+
+    def resume_reading(self):
+        self.paused = False
+        self.calls.append('resume')
+
+
+class BurstChannel(LoopbackChannel):
+    """LoopbackChannel whose read_available() returns everything written so far."""
+    async def read_available(self):
+        msgs = [m for m, _ in self.q]
+        self.q.clear()
+        return msgs
+
+
+class BaseTest(TestCase):
+    def __init__(self, *args, **kwargs):
+        TestCase.__init__(self, *args, **kwargs)
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.channel = LoopbackChannel(loop=self.loop)
+        self.app = AppChannelV2(self.channel, NullTimeKeeper(), NullTimeChecker(), loop=self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def read(self):
+        return self.loop.run_until_complete(self.app.read())
+
+
+class TestBackpressure(BaseTest):
+
+    def test_message_watermarks(self):
+        self.app.set_read_queue_limits(high_msgs=6, low_msgs=2)
+        msgs = [bytes([i]) for i in range(10)]
+        self.app.write_many_sync(msgs)  # one MultiAppPacket
+
+        self.assertEqual(self.read(), msgs[0])
+        self.assertTrue(self.channel.paused)  # 9 queued
+        for msg in msgs[1:8]:
+            self.assertEqual(self.read(), msg)
+        self.assertEqual(self.channel.calls, ['pause', 'resume'])  # 2 left
+        self.assertEqual(self.app.pause_count, 1)
+        self.assertEqual(self.app.read_many_sync(2), msgs[8:])
+        self.assertEqual(self.app.readQ_bytes, 0)
+
+    def test_byte_watermarks(self):
+        self.app.set_read_queue_limits(high_bytes=1000)
+        self.app.write_many_sync([bytes(100)] * 5)
+        self.read()
+        self.assertFalse(self.channel.paused)  # 400 bytes queued
+
+        self.app.read_many_sync(4)
+        self.app.write_many_sync([bytes(400)] * 4)
+        self.read()
+        self.assertTrue(self.channel.paused)  # 1200 bytes queued
+        self.read()
+        self.assertTrue(self.channel.paused)  # 800 bytes queued, low watermark is 500
+        self.read()
+        self.assertFalse(self.channel.paused)
+
+    def test_decrypt_ahead_counts(self):
+        channel = BurstChannel(loop=self.loop)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            peer = AppChannelV2(EncryptedChannelV2(channel, bytes(32), Role.CLIENT, loop=self.loop),
+                                NullTimeKeeper(), NullTimeChecker(), loop=self.loop)
+            app = AppChannelV2(EncryptedChannelV2(channel, bytes(32), Role.SERVER, loop=self.loop,
+                                                  executor=executor, parallel_threshold=0),
+                               NullTimeKeeper(), NullTimeChecker(), loop=self.loop)
+            app.set_read_queue_limits(high_msgs=6, low_msgs=2)
+            msgs = [bytes([i]) * 10 for i in range(10)]
+            for msg in msgs:  # the peer sends ten packets before the first read
+                self.loop.run_until_complete(peer.write(msg))
+
+            self.assertEqual(self.loop.run_until_complete(app.read()), msgs[0])
+            self.assertEqual(len(app.readQ), 0)
+            self.assertEqual(app.channel.read_ahead[0], 9)  # still encoded AppPackets
+            self.assertTrue(channel.paused)
+            for msg in msgs[1:8]:
+                self.assertEqual(self.loop.run_until_complete(app.read()), msg)
+            self.assertEqual(channel.calls, ['pause', 'resume'])
+            self.assertEqual(self.loop.run_until_complete(app.read_many(2)), msgs[8:])
+            self.assertEqual(app.channel.read_ahead, (0, 0))
+
+    def test_no_limits(self):
+        self.app.write_many_sync([b'x'] * 1000)
+        self.read()
+        self.assertEqual(self.channel.calls, [])
+
+
+class TestZeroCopy(BaseTest):
+
+    def test_multiapp_views(self):
+        self.app.zero_copy = True
+        msgs = [b'a' * 10, b'', b'b' * 300]
+        self.app.write_many_sync(msgs)
+        got = self.app.read_many_sync(3)
+        self.assertTrue(all(isinstance(m, memoryview) for m in got))
+        self.assertEqual([m.tobytes() for m in got], msgs)
+        self.assertIs(got[0].obj, got[2].obj)  # all slices of one decrypted buffer
+
+    def test_app_packet_view(self):
+        self.app.zero_copy = True
+        self.app.write_sync(b'single')
+        msg = self.read()
+        self.assertIsInstance(msg, memoryview)
+        self.assertEqual(msg.tobytes(), b'single')
+
+    def test_default_copies(self):
+        self.app.write_many_sync([b'x', b'y'])
+        got = self.app.read_many_sync(2)
+        self.assertEqual(got, [b'x', b'y'])
+        self.assertTrue(all(isinstance(m, bytes) for m in got))
+
+
+class TestBatches(BaseTest):
+
+    def test_read_batch(self):
+        self.app.write_many_sync([b'a', b'b', b'c', b'd'])
+        self.app.write_sync(b'e')
+        self.assertEqual(self.loop.run_until_complete(self.app.read_batch(max_count=3)), [b'a', b'b', b'c'])
+        self.assertEqual(self.app.read_batch_sync(), [b'd'])  # only what is already decoded
+        self.assertEqual(self.app.read_batch_sync(), [b'e'])  # next packet
+
+    def test_read_batch_max_bytes(self):
+        self.app.write_many_sync([bytes(100), bytes(100), bytes(100)])
+        self.assertEqual(len(self.app.read_batch_sync(max_bytes=250)), 2)
+        self.app.write_many_sync([bytes(300), bytes(1)])
+        self.assertEqual(len(self.app.read_batch_sync(max_bytes=250)), 1)  # the last one queued
+        self.assertEqual(len(self.app.read_batch_sync(max_bytes=10)), 1)  # always at least one
+        self.assertEqual(self.app.read_batch_sync(max_bytes=10), [bytes(1)])
+
+    def test_read_batch_max_count_zero(self):
+        self.app.write_many_sync([b'a', b'b'])
+        with self.assertRaises(ValueError):
+            self.app.read_batch_sync(max_count=0, max_bytes=100)
+        self.assertEqual(self.app.read_batch_sync(max_count=1, max_bytes=100), [b'a'])  # nothing consumed
+
+    def test_write_many_empty(self):
+        with self.assertRaises(ValueError):
+            self.app.write_many_sync([])
+
+    def test_async_for(self):
+        self.app.write_many_sync([b'1', b'2'])
+        self.app.write_sync(b'3', is_last=True)
+
+        async def consume():
+            return [msg async for msg in self.app]
+        self.assertEqual(self.loop.run_until_complete(consume()), [b'1', b'2', b'3'])
+
+    def test_no_sync_dunders(self):
+        self.assertFalse(hasattr(AppChannelV2, '__anext___sync'))
+        self.assertTrue(hasattr(AppChannelV2, 'read_batch_sync'))
+
+
+class TestTransportPause(BaseTest):
+
+    def test_stream_reader(self):
+        async def run():
+            channels = []
+            for sock in socket.socketpair():
+                reader, writer = await open_saltchannel_connection(sock=sock, loop=self.loop)
+                channels.append(AsyncioChannel(reader, writer, loop=self.loop))
+            ch1, ch2 = channels
+            transport = ch2.writer.transport
+
+            ch2.pause_reading()
+            self.assertFalse(transport.is_reading())
+            await ch1.write(b'held back')
+            await asyncio.sleep(0.01)
+            self.assertEqual(len(ch2.reader._buffer), 0)
+            ch2.reader._maybe_resume_transport()  # the reader's own flow control must not resume
+            self.assertFalse(transport.is_reading())
+
+            ch2.resume_reading()
+            self.assertTrue(transport.is_reading())
+            self.assertEqual(await ch2.read(), b'held back')
+            self.assertEqual(ch2.reader.pause_count, 1)
+            ch1.close()
+            ch2.close()
+        self.loop.run_until_complete(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
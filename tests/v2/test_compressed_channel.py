@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+import os
+import asyncio
+import unittest
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+from saltchannel.channel import ByteChannel
+from saltchannel.exceptions import BadPeer
+from saltchannel.a1a2.packets import A2Packet
+from saltchannel.util.time import NullTimeChecker, NullTimeKeeper
+from saltchannel.v2.app_channel_v2 import AppChannelV2
+from saltchannel.v2.compressed_channel import (CompressedChannel, HELLO, compression_a2, compression_prot, select_prot,
+                                               supported_prots, start_compression, accept_compression)
+
+ZDICT = b'{"sensor": "temperature", "unit": "celsius", "value": 21.5, "status": "ok"}'
+READING = b'{"sensor": "temperature", "unit": "celsius", "value": 22.25, "status": "ok"}'
+
+
+class LoopbackChannel(ByteChannel):
+    def __init__(self, loop=None):
+        super().__init__(loop=loop)
+        self.q = deque()
+        self.last_flag = False
+
+    async def read(self):
+        return self.q.popleft()
+
+    async def write(self, msg, *args, is_last=False):
+        self.q.append(msg)
+        self.q.extend(args)
+
+
+class BaseTest(TestCase):
+    def __init__(self, *args, **kwargs):
+        TestCase.__init__(self, *args, **kwargs)
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.wire = LoopbackChannel(loop=self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def channel(self, **kwargs):
+        return CompressedChannel(self.wire, loop=self.loop, **kwargs)
+
+
+class TestCompressedChannel(BaseTest):
+
+    def test_roundtrip(self):
+        ch = self.channel()
+        msgs = [b'', b'short', READING * 10, os.urandom(1000)]
+        ch.write_sync(*msgs)
+        flags = [raw[0] for raw in self.wire.q]
+        self.assertEqual(flags, [CompressedChannel.FLAG_RAW, CompressedChannel.FLAG_RAW,
+                                 CompressedChannel.FLAG_DEFLATE, CompressedChannel.FLAG_RAW])
+        self.assertEqual([ch.read_sync() for _ in msgs], msgs)
+        self.assertLess(ch.wire_bytes, ch.raw_bytes)
+
+    def test_preset_dictionary(self):
+        plain = self.channel()
+        with_dict = self.channel(zdict=ZDICT)
+        packed = with_dict.compress(READING)
+        self.assertEqual(packed[0], CompressedChannel.FLAG_DEFLATE_DICT)
+        self.assertLess(len(packed), len(READING) // 3)
+        self.assertLess(len(packed), len(plain.compress(READING)) // 2)
+        self.assertEqual(with_dict.decompress(packed), READING)
+        with self.assertRaises(BadPeer):
+            plain.decompress(packed)  # no dictionary here
+
+    def test_limits(self):
+        ch = self.channel(max_size=1000)
+        with self.assertRaises(BadPeer):
+            ch.decompress(self.channel().compress(bytes(1001)))
+        self.assertEqual(len(ch.decompress(self.channel().compress(bytes(1000)))), 1000)
+        for bad in (b'', b'\x07abc', b'\x01\xff\xff\xff', self.channel().compress(bytes(100))[:-2]):
+            with self.assertRaises(BadPeer):
+                ch.decompress(bad)
+
+    def test_executor(self):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            ch = self.channel(executor=executor, executor_threshold=1000)
+            msgs = [READING * 100, b'small', READING * 200]
+            ch.write_sync(*msgs)
+            self.assertEqual([ch.read_sync() for _ in msgs], msgs)
+            self.assertEqual(ch.raw_bytes, sum(len(msg) for msg in msgs))
+            self.assertEqual(ch.wire_bytes, sum(len(ch.compress(msg)) for msg in msgs))
+
+    def test_over_app_channel(self):
+        app = AppChannelV2(self.wire, NullTimeKeeper(), NullTimeChecker(), loop=self.loop)
+        ch = self.channel(zdict=ZDICT)
+        ch.channel = app
+        ch.write_sync(READING, READING)
+        self.assertEqual(ch.read_sync(), READING)
+        self.assertEqual(ch.read_sync(), READING)
+
+
+class TestNegotiation(TestCase):
+
+    def test_a2(self):
+        a2 = A2Packet(src_buf=bytes(compression_a2(zdict=ZDICT)))
+        self.assertEqual(len(a2.Prot), 2)
+        self.assertEqual(select_prot(a2, [compression_prot(ZDICT)]), compression_prot(ZDICT))
+        self.assertEqual(select_prot(a2, [compression_prot(b'other'), compression_prot()]), compression_prot())
+        self.assertIsNone(select_prot(A2Packet(case=A2Packet.Case.A2_DEFAUT), [compression_prot()]))
+        self.assertNotEqual(compression_prot(ZDICT), compression_prot(b'other'))
+
+
+class TestHello(BaseTest):
+
+    def setUp(self):
+        super().setUp()
+        self.client = AppChannelV2(self.wire, NullTimeKeeper(), NullTimeChecker(), loop=self.loop)
+        self.server = AppChannelV2(self.wire, NullTimeKeeper(), NullTimeChecker(), loop=self.loop)
+
+    def accept(self, supported=None):
+        return self.loop.run_until_complete(accept_compression(self.server, supported or supported_prots(ZDICT),
+                                                               loop=self.loop))
+
+    def test_compressing_client(self):
+        channel = self.loop.run_until_complete(start_compression(self.client, compression_a2(zdict=ZDICT),
+                                                                 supported_prots(ZDICT), loop=self.loop))
+        self.assertIsInstance(channel, CompressedChannel)
+        self.assertEqual(channel.zdict, ZDICT)
+        channel.write_sync(READING)
+        server = self.accept()
+        self.assertIsInstance(server, CompressedChannel)
+        self.assertEqual(server.read_sync(), READING)
+
+    def test_plain_client(self):
+        self.client.write_sync(b'\x00plain first', b'second')
+        self.assertIs(self.accept(), self.server)  # stays plain, nothing lost
+        self.assertEqual(self.server.read_many_sync(2), [b'\x00plain first', b'second'])
+
+    def test_not_offered(self):
+        a2 = A2Packet(case=A2Packet.Case.A2_DEFAUT)
+        channel = self.loop.run_until_complete(start_compression(self.client, a2, supported_prots(), loop=self.loop))
+        self.assertIs(channel, self.client)
+        self.assertEqual(len(self.wire.q), 0)  # no hello
+
+    def test_unsupported_hello(self):
+        self.client.write_sync(HELLO + compression_prot(b'other'))
+        with self.assertRaises(BadPeer):
+            self.accept(supported_prots())
+
+
+if __name__ == '__main__':
+    unittest.main()
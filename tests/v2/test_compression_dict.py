@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+import os
+import asyncio
+import logging
+import tempfile
+import unittest
+from collections import deque
+from unittest import TestCase
+
+import saltchannel.util as util
+from saltchannel.channel import ByteChannel
+from saltchannel.exceptions import BadPeer
+from saltchannel.dev.mitm_channel import MitmChannel
+from saltchannel.bench.compression import CompressionBench, synthetic_readings
+from saltchannel.v2.compressed_channel import CompressedChannel, compression_prot
+from saltchannel.v2.compression_dict import CompressionDictionary, samples_from_mitm_log, train_dictionary
+
+
+class LoopbackChannel(ByteChannel, metaclass=util.Syncizer):
+    def __init__(self, loop=None):
+        super().__init__(loop=loop)
+        self.q = deque()
+
+    async def read(self):
+        return self.q.popleft()
+
+    async def write(self, msg, *args, is_last=False):
+        self.q.append(msg)
+        self.q.extend(args)
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+
+class BaseTest(TestCase):
+    def __init__(self, *args, **kwargs):
+        TestCase.__init__(self, *args, **kwargs)
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.samples = synthetic_readings(600)
+
+    def tearDown(self):
+        self.loop.close()
+
+
+class TestTraining(BaseTest):
+
+    def test_dictionary_helps(self):
+        zdict = train_dictionary(self.samples[:300], size=2048, dict_id=7)
+        self.assertEqual(zdict.dict_id, 7)
+        self.assertLessEqual(len(zdict), 2048)
+        self.assertGreater(len(zdict), 1000)
+
+        plain = CompressedChannel(None, min_size=0, loop=self.loop)
+        with_dict = CompressedChannel(None, min_size=0, zdict=zdict, loop=self.loop)
+        test = self.samples[300:]
+        plain_size = sum(len(plain.compress(s)) for s in test)
+        dict_size = sum(len(with_dict.compress(s)) for s in test)
+        self.assertLess(dict_size, plain_size * 0.6)
+
+    def test_deterministic(self):
+        self.assertEqual(train_dictionary(self.samples, size=512).data, train_dictionary(self.samples, size=512).data)
+
+    def test_mitm_log(self):
+        log = logging.getLogger('test_compression_dict')
+        log.setLevel(logging.INFO)
+        log.propagate = False
+        handler = ListHandler()
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+        log.addHandler(handler)
+        try:
+            ch = MitmChannel(LoopbackChannel(loop=self.loop), log=log, loop=self.loop)
+            ch.write_sync(self.samples[0], self.samples[1])
+            ch.read_sync()
+        finally:
+            log.removeHandler(handler)
+        self.assertEqual(len(handler.lines), 3)
+        self.assertEqual(list(samples_from_mitm_log(handler.lines)), [self.samples[0], self.samples[1], self.samples[0]])
+        self.assertEqual(list(samples_from_mitm_log(handler.lines, types=('READ',))), [self.samples[0]])
+
+
+class TestVersions(BaseTest):
+
+    def test_file(self):
+        zdict = CompressionDictionary(3, b'abc' * 100)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'd.scd')
+            zdict.save(path)
+            loaded = CompressionDictionary.load(path)
+        self.assertEqual((loaded.dict_id, loaded.data), (3, zdict.data))
+        for bad in (b'', b'XXXX' + bytes(6), zdict.to_bytes()[:-1]):
+            with self.assertRaises(ValueError):
+                CompressionDictionary.from_bytes(bad)
+        with self.assertRaises(ValueError):
+            CompressionDictionary(0, b'')
+
+    def test_in_band_id(self):
+        v1 = train_dictionary(self.samples[:200], size=1024, dict_id=1)
+        v2 = train_dictionary(self.samples[200:400], size=1024, dict_id=2)
+        self.assertNotEqual(compression_prot(v1), compression_prot(v2))
+        old_sender = CompressedChannel(None, zdict=v1, loop=self.loop)
+        new_sender = CompressedChannel(None, zdict=v2, loop=self.loop)
+        receiver = CompressedChannel(None, zdict=v2, dictionaries=[v1], loop=self.loop)
+        msg = self.samples[500]
+        for sender in (old_sender, new_sender):
+            packed = sender.compress(msg)
+            self.assertEqual(packed[0], CompressedChannel.FLAG_DEFLATE_DICT_ID)
+            self.assertEqual(receiver.decompress(packed), msg)
+        with self.assertRaises(BadPeer):
+            new_sender.decompress(old_sender.compress(msg))  # v1 unknown there
+
+
+class TestBench(BaseTest):
+
+    def test_report(self):
+        bench = CompressionBench(self.samples[300:], train_dictionary(self.samples[:300], size=1024), repeat=1)
+        results = bench.run()
+        self.assertIn('compression/128', results)
+        for r in results.values():
+            self.assertLess(r['dict_ratio'], r['ratio'])
+            self.assertGreater(r['encode_mbytes_per_sec'], 0)
+        self.assertEqual(bench.run(only=['handshake']), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
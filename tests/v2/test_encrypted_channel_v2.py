@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import unittest
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+from saltchannel.channel import ByteChannel
+from saltchannel.dev.client_server_a import SaltChannelStreamReader
+from saltchannel.exceptions import BadPeer
+from saltchannel.v2.encrypted_channel_v2 import EncryptedChannelV2, Role, split_chunks
+
+
+class BufferChannel(ByteChannel):
+    """Everything written is read back; read_available() drains the buffer."""
+    def __init__(self, loop=None):
+        super().__init__(loop=loop)
+        self.q = deque()
+
+    async def read(self):
+        return self.q.popleft()
+
+    async def read_available(self):
+        msgs = list(self.q)
+        self.q.clear()
+        return msgs
+
+    async def write(self, msg, *args, is_last=False):
+        self.q.append(msg)
+        self.q.extend(args)
+
+
+class BaseTest(TestCase):
+    def __init__(self, *args, **kwargs):
+        TestCase.__init__(self, *args, **kwargs)
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(max_workers=4)
+
+    def tearDown(self):
+        self.executor.shutdown()
+        self.loop.close()
+
+    def pair(self, **kwargs):
+        writer = EncryptedChannelV2(BufferChannel(loop=self.loop), bytes(32), Role.CLIENT, loop=self.loop)
+        reader = EncryptedChannelV2(writer.channel, bytes(32), Role.SERVER, loop=self.loop,
+                                    executor=self.executor, **kwargs)
+        return writer, reader
+
+
+class TestParallelRead(BaseTest):
+
+    def test_in_order(self):
+        writer, reader = self.pair(parallel_threshold=0, parallel_chunk=100)
+        msgs = [bytes([i]) * (i * 10) for i in range(20)]
+        self.loop.run_until_complete(writer.write(*msgs[:10]))
+        self.loop.run_until_complete(writer.write(*msgs[10:], is_last=True))
+
+        for i, msg in enumerate(msgs):
+            self.assertEqual(self.loop.run_until_complete(reader.read()), msg)
+            self.assertEqual(reader.last_flag, i == len(msgs) - 1)
+
+        self.loop.run_until_complete(reader.write(b'back'))  # nonces still in step
+        self.assertEqual(self.loop.run_until_complete(writer.read()), b'back')
+
+    def test_below_threshold(self):
+        writer, reader = self.pair()
+        self.loop.run_until_complete(writer.write(b'1', b'2', b'3'))
+        self.assertEqual(self.loop.run_until_complete(reader.read()), b'1')
+        self.assertEqual(list(reader.readQ), [(b'2', False), (b'3', False)])
+
+    def test_bad_frame(self):
+        writer, reader = self.pair(parallel_threshold=0, parallel_chunk=1)
+        writer.write_nonce.advance()  # out of step
+        self.loop.run_until_complete(writer.write(b'1', b'2'))
+        with self.assertRaises(BadPeer):
+            self.loop.run_until_complete(reader.read())
+
+
+class TestParallelWrite(BaseTest):
+
+    def test_in_order(self):
+        writer, reader = self.pair(parallel_threshold=0, parallel_chunk=100)
+        writer.executor = self.executor
+        msgs = [bytes([i]) * (i * 10) for i in range(20)]
+        self.loop.run_until_complete(writer.write(*msgs, is_last=True))
+        self.assertEqual(writer.write_nonce.value, 1 + 2 * len(msgs))
+
+        for i, msg in enumerate(msgs):
+            self.assertEqual(self.loop.run_until_complete(reader.read()), msg)
+            self.assertEqual(reader.last_flag, i == len(msgs) - 1)
+
+    def test_concurrent_writes(self):
+        writer, reader = self.pair()
+        writer.executor = self.executor
+        writer.parallel_threshold = 1000
+        big = [bytes(1000)] * 4
+
+        async def write_both():
+            await asyncio.gather(writer.write(*big), writer.write(b'small'))
+        self.loop.run_until_complete(write_both())
+
+        for msg in big + [b'small']:  # small one must not overtake the batch
+            self.assertEqual(self.loop.run_until_complete(reader.read()), msg)
+
+
+class TestHelpers(BaseTest):
+
+    def test_split_chunks(self):
+        jobs = [(bytes(n), None) for n in (5, 5, 20, 1, 1)]
+        self.assertEqual([len(c) for c in split_chunks(jobs, 10)], [2, 1, 2])
+        self.assertEqual(split_chunks([], 10), [])
+
+    def test_stream_reader_read_msgs(self):
+        reader = SaltChannelStreamReader(loop=self.loop)
+        reader.feed_data(b'\x01\x00\x00\x00a\x02\x00\x00\x00bc\x00\x00\x00\x00\x03\x00\x00\x00de')
+        self.assertEqual(self.loop.run_until_complete(reader.read_msgs()), [b'a', b'bc', b''])
+        reader.feed_data(b'f')
+        self.assertEqual(self.loop.run_until_complete(reader.read_msgs()), [b'def'])
+
+
+if __name__ == '__main__':
+    unittest.main()
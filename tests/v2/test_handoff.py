@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import socket
+import unittest
+from unittest import TestCase
+
+from saltchannel.channel import AsyncioChannel
+from saltchannel.dev.client_server_a import open_saltchannel_connection
+from saltchannel.util.crypto_test_data import CryptoTestData
+from saltchannel.util.time import NullTimeChecker, NullTimeKeeper
+from saltchannel.v2.app_channel_v2 import AppChannelV2
+from saltchannel.v2.encrypted_channel_v2 import EncryptedChannelV2, Role
+from saltchannel.v2.handoff import attach, detach, recv_handoff, send_handoff
+from saltchannel.v2.salt_client_session import SaltClientSession
+from saltchannel.v2.salt_server_session import SaltServerSession
+
+
+class BaseTest(TestCase):
+    def __init__(self, *args, **kwargs):
+        TestCase.__init__(self, *args, **kwargs)
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    async def sessions(self):
+        channels = []
+        for sock in socket.socketpair():
+            reader, writer = await open_saltchannel_connection(sock=sock, loop=self.loop)
+            channels.append(AsyncioChannel(reader, writer, loop=self.loop))
+        client = SaltClientSession(CryptoTestData.aSig, channels[0], loop=self.loop)
+        client.enc_keypair = CryptoTestData.aEnc
+        server = SaltServerSession(CryptoTestData.bSig, channels[1], loop=self.loop)
+        server.enc_keypair = CryptoTestData.bEnc
+        await asyncio.gather(client.handshake(), server.handshake())
+        return client, server
+
+
+class TestExportState(BaseTest):
+
+    def test_roundtrip(self):
+        enc = EncryptedChannelV2(None, bytes(range(32)), Role.SERVER, loop=self.loop)
+        enc.read_nonce.advance()
+        app = AppChannelV2(enc, NullTimeKeeper(), NullTimeChecker(), loop=self.loop)
+
+        state = json.loads(json.dumps(app.export_state()))
+        app2 = AppChannelV2.import_state(None, state, NullTimeKeeper(), NullTimeChecker(), loop=self.loop)
+        self.assertEqual(app2.channel.key, enc.key)
+        self.assertEqual(app2.channel.role, Role.SERVER)
+        self.assertEqual(bytes(app2.channel.read_nonce), bytes(enc.read_nonce))
+        self.assertEqual(bytes(app2.channel.write_nonce), bytes(enc.write_nonce))
+
+    def test_pending_messages(self):
+        app = AppChannelV2(EncryptedChannelV2(None, bytes(32), Role.CLIENT, loop=self.loop),
+                           NullTimeKeeper(), NullTimeChecker(), loop=self.loop)
+        app.readQ.append(b'unread')
+        with self.assertRaises(ValueError):
+            app.export_state()
+
+
+class TestHandoff(BaseTest):
+
+    def test_handoff(self):
+        async def run():
+            client, server = await self.sessions()
+            await client.app_channel.write(b'before')
+            await client.app_channel.write(b'buffered')  # still in the server's reader buffer at handoff
+            self.assertEqual(await server.app_channel.read(), b'before')
+            await asyncio.sleep(0.01)
+
+            a, b = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+            send_handoff(a, await detach(server.app_channel))
+            moved = await attach(recv_handoff(b), loop=self.loop)
+            a.close()
+            b.close()
+
+            self.assertEqual(await moved.read(), b'buffered')
+            await client.app_channel.write(b'after')
+            self.assertEqual(await moved.read(), b'after')
+            await moved.write(b'reply', is_last=True)
+            self.assertEqual(await client.app_channel.read(), b'reply')
+            self.assertTrue(client.app_channel.last)
+            moved.channel.channel.close()
+            client.clear_channel.close()
+        self.loop.run_until_complete(run())
+
+    def test_handoff_pending_writes(self):
+        msgs = [bytes([i]) * 65536 for i in range(64)]
+
+        async def receive(channel, count):
+            return [await channel.read() for _ in range(count)]
+
+        async def run():
+            client, server = await self.sessions()
+            transport = server.clear_channel.writer.transport
+            transport.set_write_buffer_limits(high=1 << 24)  # write() returns with the data still buffered
+            await server.app_channel.write(*msgs)  # far more than the socket buffers hold
+            self.assertGreater(transport.get_write_buffer_size(), 0)
+            received, handoff = await asyncio.gather(receive(client.app_channel, len(msgs)),
+                                                     detach(server.app_channel))
+            moved = await attach(handoff, loop=self.loop)
+            await moved.write(b'after')
+            received += await receive(client.app_channel, 1)
+            moved.channel.channel.close()
+            client.clear_channel.close()
+            return received
+        self.assertEqual(self.loop.run_until_complete(asyncio.wait_for(run(), 10)), msgs + [b'after'])
+
+
+if __name__ == '__main__':
+    unittest.main()
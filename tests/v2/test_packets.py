@@ -388,6 +388,45 @@ class TestMultiAppPacket(BaseTest):
         self.assertEqual(mpb.opt.Message[0], b'\x04')
         self.assertEqual(mpb.opt.Message[1], b'\x05\x05')
 
+    def test_MultiAppPacket_zero_copy(self):
+        messages = [b'12', b'3456', b'', b'\x00', b'7']
+        mp = packets.MultiAppPacket()
+        mp.data.Count = len(messages)
+        mp.create_opt_fields(msgs=messages)
+        raw = bytes(mp)
+
+        mpb = packets.MultiAppPacket(src_buf=raw, zero_copy=True)
+        self.assertTrue(all(isinstance(m, memoryview) for m in mpb.opt.Message))
+        self.assertEqual([m.tobytes() for m in mpb.opt.Message], messages)
+        self.assertEqual(mpb.opt.Message[1].obj, raw)  # a view of the source, not a copy
+        self.assertEqual(bytes(mpb), raw)
+
+    def test_MultiAppPacket_truncated(self):
+        raw = bytes.fromhex('0b000df0ad7b020001000402000505')
+        for zero_copy in (False, True):
+            for cut in (1, 2, 4):
+                with self.assertRaises(BadPeer):
+                    packets.MultiAppPacket(src_buf=raw[:-cut], zero_copy=zero_copy)
+
+    def test_MultiAppPacket_size_tracking(self):
+        mp = packets.MultiAppPacket()
+        mp.data.Time = 0x7badf00d
+        mp.append(b'\x04')
+        self.assertEqual(mp.size, 8 + 3)
+        mp.append(memoryview(b'\x05\x05'))
+        self.assertEqual(mp.data.Count, 2)
+        self.assertEqual(mp.size, 15)
+        self.assertEqual(bytes(mp), bytes.fromhex('0b000df0ad7b020001000402000505'))
+
+        mpb = packets.MultiAppPacket(src_buf=bytes(mp))
+        self.assertEqual(mpb.size, 15)
+
+        messages = [bytes([i % 256]) * i for i in range(300)]
+        mpc = packets.MultiAppPacket()
+        mpc.data.Count = len(messages)
+        mpc.create_opt_fields(msgs=messages)
+        self.assertEqual(mpc.size, len(bytes(mpc)))
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
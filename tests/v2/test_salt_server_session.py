@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+from saltchannel.channel import ByteChannel
+from saltchannel.dev.tunnel import AsyncTunnel
+from saltchannel.util.crypto_test_data import CryptoTestData
+from saltchannel.util.metrics import MetricsRegistry
+from saltchannel.v2.salt_client_session import SaltClientSession
+from saltchannel.v2.salt_server_session import SaltServerSession
+
+
+class RecordingChannel(ByteChannel):
+    """Passes everything to 'orig'; remembers how many messages every write() had."""
+    def __init__(self, orig, loop=None):
+        super().__init__(loop=loop)
+        self.orig = orig
+        self.writes = []
+
+    async def read(self):
+        return await self.orig.read()
+
+    async def write(self, msg, *args, is_last=False):
+        self.writes.append(1 + len(args))
+        await self.orig.write(msg, *args, is_last=is_last)
+
+
+class ThreadCheckingMetrics(MetricsRegistry):
+    """MetricsRegistry which remembers threads it was updated from."""
+    def __init__(self):
+        super().__init__()
+        self.threads = set()
+
+    def record(self, stage, seconds):
+        self.threads.add(threading.current_thread())
+        super().record(stage, seconds)
+
+
+class BaseTest(TestCase):
+    def __init__(self, *args, **kwargs):
+        TestCase.__init__(self, *args, **kwargs)
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        tunnel = AsyncTunnel(loop=self.loop)
+        self.server_channel = RecordingChannel(tunnel.channel2, loop=self.loop)
+        self.client = SaltClientSession(CryptoTestData.aSig, tunnel.channel1, loop=self.loop)
+        self.client.enc_keypair = CryptoTestData.aEnc
+        self.server = SaltServerSession(CryptoTestData.bSig, self.server_channel, loop=self.loop)
+        self.server.enc_keypair = CryptoTestData.bEnc
+
+    def tearDown(self):
+        self.loop.close()
+
+    def handshake(self):
+        async def run():
+            await asyncio.gather(self.client.handshake(), self.server.handshake())
+        self.loop.run_until_complete(asyncio.wait_for(run(), 10))
+        self.assertEqual(self.client.session_key, self.server.session_key)
+
+
+class TestSaltServerSession(BaseTest):
+
+    def test_m2_m3_one_write(self):
+        self.assertTrue(self.server.buffer_m2)  # default
+        self.handshake()
+        self.assertEqual(self.server_channel.writes, [2])
+
+    def test_m2_m3_separate_writes(self):
+        self.server.buffer_m2 = False
+        self.handshake()
+        self.assertEqual(self.server_channel.writes, [1, 1])
+
+    def test_sign_executor(self):
+        self.server.metrics = ThreadCheckingMetrics()
+        with ThreadPoolExecutor(1) as executor:
+            self.server.sign_executor = executor
+            self.handshake()
+        self.assertIn('m3_sign', self.server.stage_times)
+        self.assertEqual(self.server.metrics.stages['m3_sign'].count, 1)
+        self.assertEqual(self.server.metrics.threads, {threading.current_thread()})
+
+
+if __name__ == '__main__':
+    unittest.main()
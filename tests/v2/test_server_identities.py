@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+import socket
+import tempfile
+import unittest
+from unittest import TestCase
+
+from saltchannel.a1a2.a1_client_session import A1ClientSession
+from saltchannel.a1a2.packets import A1Packet, A2Packet
+from saltchannel.channel import AsyncioChannel
+from saltchannel.dev.client_server_a import open_saltchannel_connection
+from saltchannel.exceptions import NoSuchServerException
+from saltchannel.saltlib import SaltLib
+from saltchannel.util.crypto_test_data import CryptoTestData
+from saltchannel.v2.salt_client_session import SaltClientSession
+from saltchannel.v2.salt_server_session import SaltServerSession
+from saltchannel.v2.server_identities import MmapKeyStore, ServerIdentityRegistry
+
+
+class BaseTest(TestCase):
+    def __init__(self, *args, **kwargs):
+        TestCase.__init__(self, *args, **kwargs)
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.keys = [SaltLib().create_sig_keys() for _ in range(200)]
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+        self.loop.close()
+
+    def store(self, keys):
+        path = os.path.join(self.tmpdir.name, 'keys.db')
+        MmapKeyStore.create(path, keys)
+        return MmapKeyStore(path)
+
+    async def channels(self):
+        channels = []
+        for sock in socket.socketpair():
+            reader, writer = await open_saltchannel_connection(sock=sock, loop=self.loop)
+            channels.append(AsyncioChannel(reader, writer, loop=self.loop))
+        return channels
+
+    def handshake(self, identities, wanted=b''):
+        async def run():
+            client_ch, server_ch = await self.channels()
+            client = SaltClientSession(CryptoTestData.aSig, client_ch, loop=self.loop)
+            client.enc_keypair = CryptoTestData.aEnc
+            client.wanted_server_sig_key = wanted
+            server = SaltServerSession(None, server_ch, loop=self.loop, identities=identities)
+            server.enc_keypair = CryptoTestData.bEnc
+            try:
+                await asyncio.gather(client.handshake(), server.handshake())
+            finally:
+                client_ch.close()
+                server_ch.close()
+            return client, server
+        return self.loop.run_until_complete(run())
+
+    def a1a2(self, identities, address=None):
+        async def run():
+            client_ch, server_ch = await self.channels()
+            client = A1ClientSession(client_ch, loop=self.loop)
+            if address:
+                client.a1.data.AddressType = A1Packet.ADDRESS_TYPE_PUBKEY
+                client.a1.data.AddressSize = len(address)
+                client.a1.Address = address
+            server = SaltServerSession(None, server_ch, loop=self.loop, identities=identities)
+            server.enc_keypair = CryptoTestData.bEnc
+            await asyncio.gather(client.do_a1a2(), server.handshake())
+            client_ch.close()
+            server_ch.close()
+            return client.a2
+        return self.loop.run_until_complete(run())
+
+
+class TestMmapKeyStore(BaseTest):
+
+    def test_lookup(self):
+        with self.store(self.keys + self.keys[:5]) as store:  # duplicates are stored once
+            self.assertEqual(len(store), len(self.keys))
+            self.assertGreaterEqual(store.capacity, 2 * len(self.keys))
+            for kp in self.keys:
+                self.assertEqual(store.get(kp.pub), kp)
+            self.assertIsNone(store.get(CryptoTestData.bSig.pub))
+            self.assertIsNone(store.get(b'short'))
+            self.assertNotIn(bytes(32), store)
+
+    def test_bad_file(self):
+        path = os.path.join(self.tmpdir.name, 'bad.db')
+        with open(path, 'wb') as f:
+            f.write(bytes(128))
+        with self.assertRaises(ValueError):
+            MmapKeyStore(path)
+
+
+class TestVirtualHosting(BaseTest):
+
+    def test_select_identity(self):
+        identities = ServerIdentityRegistry(store=self.store(self.keys))
+        identities.add(CryptoTestData.bSig)
+        self.assertEqual(len(identities), len(self.keys) + 1)
+        identities.add(self.keys[3])  # also in the keystore
+        self.assertEqual(len(identities), len(self.keys) + 1)
+
+        for kp in (self.keys[17], CryptoTestData.bSig):
+            client, server = self.handshake(identities, wanted=kp.pub)
+            self.assertEqual(server.sig_keypair, kp)
+            self.assertEqual(client.m3.ServerSigKey, kp.pub)
+
+        client, server = self.handshake(identities)  # no ServerSigKey in M1: default identity
+        self.assertEqual(server.sig_keypair, CryptoTestData.bSig)
+
+    def test_no_such_server(self):
+        identities = ServerIdentityRegistry()
+        identities.add(CryptoTestData.bSig)
+        with self.assertRaises(NoSuchServerException):
+            self.handshake(identities, wanted=CryptoTestData.cSig.pub)
+
+    def test_a2_per_identity(self):
+        custom = A2Packet(case=A2Packet.Case.A2_DEFAUT)
+        custom.Prot[0].P2 = (type(custom.Prot[0].P2))(*b'ECHO------')
+        identities = ServerIdentityRegistry(store=self.store(self.keys))
+        identities.add(CryptoTestData.bSig)
+        identities.add(CryptoTestData.cSig, a2=custom)
+
+        self.assertEqual(bytes(self.a1a2(identities, CryptoTestData.cSig.pub)), bytes(custom))
+        default = bytes(A2Packet(case=A2Packet.Case.A2_DEFAUT))
+        self.assertEqual(bytes(self.a1a2(identities, self.keys[3].pub)), default)
+        self.assertEqual(bytes(self.a1a2(identities)), default)
+        self.assertEqual(self.a1a2(identities, CryptoTestData.dSig.pub).data.Header.NoSuchServer, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
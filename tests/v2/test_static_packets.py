@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import unittest
+from unittest import TestCase
+
+from saltchannel.a1a2.packets import A2Packet
+from saltchannel.util.crypto_test_data import CryptoTestData
+from saltchannel.v2 import static_packets
+from saltchannel.v2.packets import M2Packet
+from saltchannel.v2.salt_server_session import SaltServerSession
+from saltchannel.v2.server_identities import ServerIdentityRegistry
+
+
+def echo_a2():
+    a2 = A2Packet(case=A2Packet.Case.A2_DEFAUT)
+    a2.Prot[0].P2 = (type(a2.Prot[0].P2))(*b'ECHO------')
+    return a2
+
+
+class TestStaticPackets(TestCase):
+
+    def test_cached_bytes(self):
+        for case in (A2Packet.Case.A2_DEFAUT, A2Packet.Case.A2_NO_SUCH_SERVER):
+            raw = static_packets.a2_bytes(case)
+            self.assertEqual(raw, bytes(A2Packet(case=case)))
+            self.assertIs(static_packets.a2_bytes(case), raw)
+
+        m2 = M2Packet(src_buf=static_packets.m2_no_such_server_bytes(1))
+        self.assertEqual(m2.data.Header.NoSuchServer, 1)
+        self.assertEqual(m2.data.Time, 1)
+
+    def test_session_a2_invalidation(self):
+        session = SaltServerSession(CryptoTestData.bSig, None)
+        self.assertIsNone(session.a2_bytes())
+        session.a2 = A2Packet(case=A2Packet.Case.A2_DEFAUT)
+        self.assertEqual(session.a2_bytes(), static_packets.a2_bytes(A2Packet.Case.A2_DEFAUT))
+        session.a2 = echo_a2()
+        self.assertEqual(session.a2_bytes(), bytes(echo_a2()))
+        session.a2 = bytes(echo_a2())  # pre-serialized
+        self.assertEqual(session.a2_bytes(), bytes(echo_a2()))
+
+    def test_registry_a2_invalidation(self):
+        identities = ServerIdentityRegistry()
+        identities.add(CryptoTestData.bSig, a2=echo_a2())
+        self.assertEqual(identities.a2_bytes(), static_packets.a2_bytes(A2Packet.Case.A2_DEFAUT))
+        self.assertEqual(identities.a2_bytes(CryptoTestData.bSig.pub), bytes(echo_a2()))
+
+        identities.default_a2 = echo_a2()
+        self.assertEqual(identities.a2_bytes(), bytes(echo_a2()))
+        identities.add(CryptoTestData.bSig)  # back to the default
+        identities.default_a2 = None
+        self.assertEqual(identities.a2_bytes(CryptoTestData.bSig.pub), static_packets.a2_bytes(A2Packet.Case.A2_DEFAUT))
+
+
+if __name__ == '__main__':
+    unittest.main()
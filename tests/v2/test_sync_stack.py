@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import socket
+import threading
+import unittest
+from unittest import mock
+from unittest import TestCase
+
+import saltchannel.util as util
+from saltchannel.channel import SocketChannel
+from saltchannel.util.crypto_test_data import CryptoTestData
+from saltchannel.util.time import NullTimeChecker, NullTimeKeeper
+from saltchannel.v2.app_channel_v2 import AppChannelV2Sync
+from saltchannel.v2.encrypted_channel_v2 import EncryptedChannelV2Sync, Role
+from saltchannel.v2.salt_client_session import SaltClientSessionSync
+from saltchannel.v2.salt_server_session import SaltServerSession
+
+
+def echo_server(sock, result):
+    """Asyncio server session in its own thread, echoes app messages until b'bye'."""
+    loop = asyncio.new_event_loop()
+    session = SaltServerSession(CryptoTestData.bSig, SocketChannel(sock), loop=loop)
+    session.enc_keypair = CryptoTestData.bEnc
+    session.handshake_sync()
+    result['session_key'] = session.session_key
+    while True:
+        msg = session.app_channel.read_sync()
+        session.app_channel.write_sync(msg)
+        if msg == b'bye':
+            break
+    loop.close()
+
+
+class BaseTest(TestCase):
+    def __init__(self, *args, **kwargs):
+        TestCase.__init__(self, *args, **kwargs)
+
+    def setUp(self):
+        self.sock1, self.sock2 = socket.socketpair()
+        self.sock1.settimeout(10)  # do not hang if the other peer fails
+        self.sock2.settimeout(10)
+
+    def tearDown(self):
+        self.sock1.close()
+        self.sock2.close()
+
+
+class TestSyncStack(BaseTest):
+
+    def test_channels_roundtrip(self):
+        stacks = []
+        for sock, role in ((self.sock1, Role.CLIENT), (self.sock2, Role.SERVER)):
+            enc = EncryptedChannelV2Sync(SocketChannel(sock), bytes(32), role)
+            stacks.append(AppChannelV2Sync(enc, NullTimeKeeper(), NullTimeChecker()))
+        client, server = stacks
+
+        client.write_sync(b'one')
+        client.write_many_sync([b'two', b'three'], is_last=True)
+        self.assertEqual(server.read_many_sync(3), [b'one', b'two', b'three'])
+        self.assertTrue(server.last)
+        server.write_sync(b'four')
+        self.assertEqual(client.read_sync(), b'four')
+
+        client.write_many_sync([b'five', b'six'])
+        client.write_sync(b'seven', is_last=True)
+        self.assertEqual(server.read_batch_sync(), [b'five', b'six'])
+        self.assertEqual(list(server), [b'seven'])
+
+    def test_client_handshake(self):
+        result = {}
+        server = threading.Thread(target=echo_server, args=(self.sock2, result))
+        server.start()
+
+        client_thread = threading.current_thread()
+        force_event_loop = util.force_event_loop
+
+        def no_loop_in_client(loop=None):
+            self.assertIsNot(threading.current_thread(), client_thread, "event loop used by client")
+            return force_event_loop(loop=loop)
+
+        with mock.patch('saltchannel.util.force_event_loop', side_effect=no_loop_in_client):
+            session = SaltClientSessionSync(CryptoTestData.aSig, SocketChannel(self.sock1))
+            session.enc_keypair = CryptoTestData.aEnc
+            session.handshake_sync()
+            app = session.app_channel
+            app.write_sync(b'hello', b'world')
+            self.assertEqual(app.read_many_sync(2), [b'hello', b'world'])
+            app.write_sync(b'bye')
+            self.assertEqual(app.read_sync(), b'bye')
+
+        server.join()
+        self.assertIsInstance(app, AppChannelV2Sync)
+        self.assertIsNone(session.loop)
+        self.assertEqual(result['session_key'], session.session_key)
+        self.assertIn('handshake', session.stage_times)
+
+
+if __name__ == '__main__':
+    unittest.main()